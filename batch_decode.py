@@ -0,0 +1,147 @@
+import numpy as np
+from capture import CAPTURE_MAGIC, CAPTURE_VERSIONS, FILE_HEADER, RECORD, RECORD_FD
+
+
+# Vectorized batch decoding for offline analysis.
+# Frames come in as arrays (timestamps, ids, data[N, 8] or data[N, 64] for CAN FD); for every
+# message the 8-byte payload windows its signals start in are viewed once as a little-endian
+# and a big-endian uint64, and each DBC signal is extracted for all frames of its message with
+# one shift, one mask, sign extension and scale/offset over the whole column.
+# Results are columnar: {message name: {"timestamp": array, signal name: array, ...}}.
+# Value tables (choices) are not applied; columns hold the numeric values.
+
+# Same layout as capture.RECORD / RECORD_FD, so captures can be memory-mapped without parsing
+CAPTURE_DTYPE = np.dtype([("timestamp_us", "<u8"), ("can_id", "<u4"), ("msg_type", "u1"), ("dlc", "u1"),
+                          ("channel", "u1"), ("pad", "u1"), ("data", "u1", (8,))])
+CAPTURE_DTYPE_FD = np.dtype([("timestamp_us", "<u8"), ("can_id", "<u4"), ("msg_type", "u1"), ("dlc", "u1"),
+                             ("channel", "u1"), ("pad", "u1"), ("data", "u1", (64,))])
+assert CAPTURE_DTYPE.itemsize == RECORD.size and CAPTURE_DTYPE_FD.itemsize == RECORD_FD.size
+CAPTURE_DTYPES = {RECORD.size: CAPTURE_DTYPE, RECORD_FD.size: CAPTURE_DTYPE_FD}  # record size -> dtype
+
+
+def load_capture(path, channel=None):
+    # Memory-maps a .cancap file -> (timestamps, ids, data, dlcs); nothing is copied unless filtered
+    with open(path, "rb") as f:
+        magic, version, record_size = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != CAPTURE_MAGIC or version not in CAPTURE_VERSIONS or record_size not in CAPTURE_DTYPES:
+        raise ValueError(f"{path} is not a supported capture file")
+    records = np.memmap(path, dtype=CAPTURE_DTYPES[record_size], mode="r", offset=FILE_HEADER.size)
+    if channel is not None:
+        records = records[records["channel"] == channel]
+    return records["timestamp_us"], records["can_id"], records["data"], records["dlc"]
+
+
+class _SignalColumn:
+    __slots__ = ("name", "big_endian", "window", "shift", "mask", "length", "signed", "is_float", "scale", "offset",
+                 "integer", "multiplexer_ids")
+
+    def __init__(self, signal, span=8):
+        # span: payload bytes of the message (at least 8); the signal is read from the 8 bytes at `window`
+        self.name = signal.name
+        self.length = signal.length
+        self.mask = np.uint64((1 << signal.length) - 1)
+        if signal.byte_order == "little_endian":
+            self.big_endian = False
+            self.window = min(signal.start // 8, span - 8)
+            self.shift = signal.start - 8 * self.window
+        else:
+            # Motorola start bit -> shift within the window viewed as one big-endian uint64
+            self.big_endian = True
+            msb_position = 8 * (signal.start // 8) + (7 - signal.start % 8)
+            self.window = min(msb_position // 8, span - 8)
+            self.shift = 64 - (msb_position - 8 * self.window) - signal.length
+        self.signed = signal.is_signed
+        self.is_float = signal.is_float
+        self.scale = signal.scale
+        self.offset = signal.offset
+        # Keep integer columns when the DBC scaling cannot produce fractions, like cantools does
+        self.integer = (not signal.is_float and isinstance(signal.scale, int) and isinstance(signal.offset, int))
+        self.multiplexer_ids = tuple(signal.multiplexer_ids) if signal.multiplexer_ids else None
+
+    @property
+    def fits(self):
+        return 0 <= self.shift and self.shift + self.length <= 64
+
+    def extract(self, little, big):
+        raw = ((big if self.big_endian else little) >> np.uint64(self.shift)) & self.mask
+        if self.is_float:
+            values = raw.astype(np.uint32).view(np.float32) if self.length == 32 else raw.view(np.float64)
+            return values.astype(np.float64) * self.scale + self.offset
+        if self.signed and self.length < 64:
+            values = raw.astype(np.int64)
+            values -= ((values >> (self.length - 1)) & 1) << self.length
+        elif self.signed:
+            values = raw.view(np.int64)
+        else:
+            values = raw.astype(np.int64) if self.length < 64 else raw
+        if self.integer:
+            if self.scale != 1:
+                values = values * self.scale
+            return values + self.offset if self.offset else values
+        return values * float(self.scale) + float(self.offset)
+
+
+class BatchDecoder:
+    def __init__(self, db):
+        self.messages = {}  # frame_id -> (message, [columns], multiplexer column or None, payload span)
+        self.skipped = []  # Names of the messages that cannot be batch decoded
+        for message in db.messages:
+            span = max(message.length, 8)
+            columns = [_SignalColumn(signal, span) for signal in message.signals]
+            if not all(column.fits for column in columns):
+                self.skipped.append(message.name)  # A signal does not fit the uint64 view of any 8-byte window
+                continue
+            multiplexer = next((column for column, signal in zip(columns, message.signals)
+                                if signal.is_multiplexer), None)
+            self.messages[message.frame_id] = (message, columns, multiplexer, span)
+
+    def decode(self, timestamps, ids, data, dlcs=None, frame_ids=None, channels=None):
+        # timestamps: (N,), ids: (N,), data: (N, 8) or (N, 64) uint8, dlcs: optional (N,) payload lengths to
+        # skip short frames, channels: optional (N,), adds a "channel" column after the timestamps
+        ids = np.asarray(ids)
+        timestamps = np.asarray(timestamps)
+        if not len(ids):
+            return {}
+        payload = np.ascontiguousarray(data, dtype=np.uint8).reshape(len(ids), -1)
+
+        # One stable sort groups the frames by ID and keeps each group in time order
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        results = {}
+        for frame_id in (frame_ids if frame_ids is not None else self.messages):
+            entry = self.messages.get(frame_id)
+            if entry is None:
+                continue
+            message, columns, multiplexer, span = entry
+            if span > payload.shape[1]:
+                continue  # CAN FD message in classic 8-byte records
+            start, stop = np.searchsorted(sorted_ids, [frame_id, frame_id + 1])
+            if start == stop:
+                continue
+            rows = order[start:stop]
+            if dlcs is not None:
+                rows = rows[np.asarray(dlcs)[rows] >= message.length]
+                if not len(rows):
+                    continue
+            decoded = {"timestamp": timestamps[rows]}
+            if channels is not None:
+                decoded["channel"] = np.asarray(channels)[rows]
+            results[message.name] = self._decode_message(decoded, columns, multiplexer, payload[rows])
+        return results
+
+    @staticmethod
+    def _decode_message(decoded, columns, multiplexer, frames):
+        # frames: (n, width) payloads of one message; each window is converted to uint64 once
+        views = {}
+        for column in columns:
+            if column.window not in views:
+                window = np.ascontiguousarray(frames[:, column.window:column.window + 8])
+                views[column.window] = (window.view("<u8").ravel(), window.view(">u8").ravel().astype(np.uint64))
+        mux_values = multiplexer.extract(*views[multiplexer.window]) if multiplexer is not None else None
+        for column in columns:
+            values = column.extract(*views[column.window])
+            if column.multiplexer_ids is not None and mux_values is not None:
+                # Signals of other multiplexer values are NaN
+                values = np.where(np.isin(mux_values, column.multiplexer_ids), values, np.nan)
+            decoded[column.name] = values
+        return decoded
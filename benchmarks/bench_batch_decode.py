@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+import cantools
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from batch_decode import BatchDecoder
+
+
+# Offline decoding: per-frame decode_message loop vs. vectorized BatchDecoder
+# Usage: python benchmarks/bench_batch_decode.py path/to/file.dbc [frames]
+
+
+def make_frames(db, count):
+    # Random payloads are not valid for multiplexed messages, so only plain messages are used
+    frame_ids = [message.frame_id for message in db.messages
+                 if not message.is_multiplexed() and message.length <= 8]
+    rng = np.random.default_rng(1234)
+    timestamps = np.arange(count, dtype=np.uint64) * 1000
+    ids = np.array(frame_ids, dtype=np.uint32)[rng.integers(0, len(frame_ids), count)]
+    data = rng.integers(0, 256, (count, 8), dtype=np.uint8)
+    return timestamps, ids, data
+
+
+def bench_loop(db, timestamps, ids, data):
+    start = time.perf_counter()
+    for frame_id, payload in zip(ids.tolist(), map(bytes, data)):
+        values = db.decode_message(frame_id, payload, decode_choices=False)
+    return time.perf_counter() - start
+
+
+def bench_batch(decoder, timestamps, ids, data):
+    start = time.perf_counter()
+    columns = decoder.decode(timestamps, ids, data)
+    return time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_batch_decode.py path/to/file.dbc [frames]")
+        sys.exit(1)
+    db = cantools.database.load_file(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+
+    decoder = BatchDecoder(db)
+    timestamps, ids, data = make_frames(db, count)
+    # The per-frame loop is timed on a slice and scaled, a full run takes minutes on big inputs
+    loop_count = min(count, 200000)
+    loop_time = bench_loop(db, timestamps[:loop_count], ids[:loop_count], data[:loop_count]) * count / loop_count
+    batch_time = bench_batch(decoder, timestamps, ids, data)
+
+    print(f"Frames:              {count:,}")
+    print(f"decode_message loop: {loop_time:.3f} s  ({count / loop_time:,.0f} frames/s)")
+    print(f"BatchDecoder:        {batch_time:.3f} s  ({count / batch_time:,.0f} frames/s)")
+    print(f"Speedup:             {loop_time / batch_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
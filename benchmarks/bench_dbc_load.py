@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+# Startup cost of a DBC: cantools.database.load_file + DecoderTable vs. dbc_cache.load_database
+# with an empty (cold) and a filled (warm) cache. Every run is a fresh process, so the in-process
+# code cache of decoder_table.py does not carry over.
+# Usage: python benchmarks/bench_dbc_load.py path/to/file.dbc [runs]
+
+
+def child(mode, path, cache_dir):
+    import cantools
+    from decoder_table import DecoderTable
+    from dbc_cache import load_database
+    start = time.perf_counter()
+    if mode == "plain":
+        db = cantools.database.load_file(path)
+    else:
+        db = load_database(path, cache_dir=cache_dir)
+    DecoderTable(db)
+    print(time.perf_counter() - start)
+
+
+def run(mode, path, cache_dir):
+    output = subprocess.run([sys.executable, __file__, "--child", mode, path, cache_dir],
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.split()[-1])
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_dbc_load.py path/to/file.dbc [runs]")
+        sys.exit(1)
+    path = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        plain = min(run("plain", path, cache_dir) for _ in range(runs))
+        cold = []
+        for _ in range(runs):
+            for name in os.listdir(cache_dir):
+                os.remove(os.path.join(cache_dir, name))
+            cold.append(run("cached", path, cache_dir))
+        warm = min(run("cached", path, cache_dir) for _ in range(runs))
+
+    print(f"DBC:                    {path} ({os.path.getsize(path):,} bytes)")
+    print(f"load_file + table:      {plain:.3f} s")
+    print(f"load_database, cold:    {min(cold):.3f} s  (parse + cache write)")
+    print(f"load_database, warm:    {warm:.3f} s")
+    print(f"Warm speedup:           {plain / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(*sys.argv[2:5])
+    else:
+        main()
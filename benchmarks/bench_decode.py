@@ -0,0 +1,68 @@
+import os
+import random
+import sys
+import time
+
+import cantools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from decoder_table import DecoderTable
+
+
+# Micro-benchmark: precompiled DecoderTable vs. the old get_message_by_frame_id + decode_message path
+# Usage: python benchmarks/bench_decode.py path/to/file.dbc [frames]
+
+
+def make_frames(db, count):
+    # Random payloads are not valid for multiplexed messages, which use cantools on both paths anyway
+    frame_ids = [message.frame_id for message in db.messages if not message.is_multiplexed()]
+    rng = random.Random(1234)
+    return [(rng.choice(frame_ids), bytes(rng.getrandbits(8) for _ in range(8))) for _ in range(count)]
+
+
+def bench_cantools(db, frames):
+    start = time.perf_counter()
+    for frame_id, data in frames:
+        name = db.get_message_by_frame_id(frame_id).name
+        values = db.decode_message(frame_id, data)
+    return time.perf_counter() - start
+
+
+def bench_table(table, frames):
+    lookup = table.lookup
+    start = time.perf_counter()
+    for frame_id, data in frames:
+        decoder = lookup(frame_id)
+        name = decoder.name
+        values = decoder.decode(data)
+    return time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_decode.py path/to/file.dbc [frames]")
+        sys.exit(1)
+    db = cantools.database.load_file(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+
+    build_start = time.perf_counter()
+    table = DecoderTable(db)
+    build_time = time.perf_counter() - build_start
+
+    frames = make_frames(db, count)
+    # Warm up both paths once
+    bench_cantools(db, frames[:1000])
+    bench_table(table, frames[:1000])
+
+    old_time = bench_cantools(db, frames)
+    new_time = bench_table(table, frames)
+
+    print(f"Messages in DBC:     {len(table)}")
+    print(f"Table build time:    {build_time * 1000:.1f} ms")
+    print(f"decode_message path: {old_time:.3f} s  ({count / old_time:,.0f} frames/s, {old_time / count * 1e6:.2f} us/frame)")
+    print(f"DecoderTable path:   {new_time:.3f} s  ({count / new_time:,.0f} frames/s, {new_time / count * 1e6:.2f} us/frame)")
+    print(f"Speedup:             {old_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
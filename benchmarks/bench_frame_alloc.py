@@ -0,0 +1,204 @@
+import ctypes
+import gc
+import os
+import queue
+import sys
+import time
+import tracemalloc
+
+import cantools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from PCANBasic import *
+from bus_backend import VirtualBus
+from decoder_table import DecoderTable
+from monitor_engine import MonitorEngine
+
+
+# Per-frame allocations of the receive path, measured with tracemalloc.
+#   old: a new TPCANMsg/TPCANTimestamp per Read (like PCANBasic.Read), bytes(msg.DATA), a queue tuple
+#        per frame and, on the UI side, a new_values list with a hex string for every frame
+#   new: MonitorEngine with the backend's reused receive buffer, one payload bytes object per frame,
+#        the per-ID snapshot store and hex strings only for the IDs rendered at each UI tick
+# Both decode with the same DecoderTable, so the difference is the frame handling alone. Frames come
+# from a VirtualBus queue filled before each measured batch.
+#   transient: bytes live at the peak of each frame above the level before it (tracemalloc peak)
+#   retained:  blocks/bytes still allocated after a batch when the UI does not drain in between
+#   gen0 GCs:  collections triggered while processing, a measure of allocation pressure
+# Usage: python benchmarks/bench_frame_alloc.py path/to/file.dbc [frames]
+
+BATCH = 10000
+UI_TICK_FRAMES = 500  # One UI tick per 500 frames, i.e. 50 ms at 10000 frames/s
+
+
+def fill(bus, source, target, frames):
+    for can_id, data in frames:
+        msg = TPCANMsg()
+        msg.ID = can_id
+        msg.MSGTYPE = PCAN_MESSAGE_STANDARD.value
+        msg.LEN = len(data)
+        msg.DATA[:len(data)] = data
+        bus.Write(source, msg)
+    return len(frames)
+
+
+class OldPath:
+    def __init__(self, bus, handle, table):
+        self.bus = bus
+        self.handle = handle
+        self.table = table
+        self.update_queue = queue.Queue()
+        self.last_received_times = {}
+
+    def read(self):
+        # PCANBasic.Read: a new message and timestamp per call
+        status, filled, timestamp = self.bus.Read(self.handle)
+        msg = TPCANMsg()
+        ctypes.memmove(ctypes.byref(msg), ctypes.byref(filled), ctypes.sizeof(msg))
+        new_timestamp = TPCANTimestamp()
+        ctypes.memmove(ctypes.byref(new_timestamp), ctypes.byref(timestamp), ctypes.sizeof(timestamp))
+        return status, msg, new_timestamp
+
+    def frame(self):
+        status, msg, timestamp = self.read()
+        decoder = self.table.lookup(msg.ID)
+        can_data = bytes(msg.DATA)
+        parsed_data = decoder.decode_dict(can_data)
+        current_time = timestamp.micros + timestamp.millis * 1000 + timestamp.millis_overflow * 0x100000 * 1000
+        cycle_time = (current_time - self.last_received_times.get(msg.ID, current_time)) // 1000
+        self.last_received_times[msg.ID] = current_time
+        self.update_queue.put((msg, parsed_data, decoder.name, cycle_time))
+
+    def ui_tick(self):
+        while not self.update_queue.empty():
+            msg, parsed_data, name, cycle_time = self.update_queue.get_nowait()
+            new_values = [name, hex(msg.ID), "STD", msg.LEN, " ".join([f"{b:02X}" for b in msg.DATA]), cycle_time, 1]
+
+
+class NewPath:
+    def __init__(self, engine, channel):
+        self.engine = engine
+        self.channel = channel
+        self.read = engine.backend.Read
+        self.rendered = {}
+
+    def frame(self):
+        status, msg, timestamp = self.read(self.channel.handle)
+        self.engine.process_message(msg, timestamp, self.channel)
+
+    def ui_tick(self):
+        for snapshot in self.engine.snapshot_store.take_changed():
+            key = (snapshot.channel, snapshot.can_id)
+            rendered = self.rendered.get(key)
+            if rendered is None or rendered[0] != snapshot.data:
+                self.rendered[key] = (snapshot.data, snapshot.data[:snapshot.length].hex(" ").upper())
+
+
+def measure(path, bus, source, frames, count):
+    # -> (transient bytes/frame, retained blocks/frame, retained bytes/frame, gen0 collections/100k frames, us/frame)
+    # Both paths expose frame() and ui_tick(); one batch warms up the caches and the snapshot store
+    for _ in range(fill(bus, source, path_handle(path), frames)):
+        path.frame()
+    path.ui_tick()
+
+    # Time without tracing
+    elapsed = 0.0
+    processed = 0
+    while processed < count:
+        batch = fill(bus, source, path_handle(path), frames[:min(BATCH, count - processed)])
+        start = time.perf_counter()
+        for n in range(batch):
+            path.frame()
+            if n % UI_TICK_FRAMES == UI_TICK_FRAMES - 1:
+                path.ui_tick()
+        elapsed += time.perf_counter() - start
+        processed += batch
+
+    # Allocation pressure: gen0 collections while processing
+    collections = 0
+    processed = 0
+    while processed < count:
+        batch = fill(bus, source, path_handle(path), frames[:min(BATCH, count - processed)])
+        path.ui_tick()
+        gc.collect()
+        before = gc.get_stats()[0]["collections"]
+        for n in range(batch):
+            path.frame()
+            if n % UI_TICK_FRAMES == UI_TICK_FRAMES - 1:
+                path.ui_tick()
+        collections += gc.get_stats()[0]["collections"] - before
+        processed += batch
+
+    tracemalloc.start()
+    # Transient: peak of every single frame
+    batch = fill(bus, source, path_handle(path), frames[:BATCH])
+    transient = 0
+    for n in range(batch):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        path.frame()
+        transient += tracemalloc.get_traced_memory()[1] - base
+        if n % UI_TICK_FRAMES == UI_TICK_FRAMES - 1:
+            path.ui_tick()
+    path.ui_tick()
+
+    # Retained: a whole batch without a UI tick
+    batch = fill(bus, source, path_handle(path), frames[:BATCH])
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    for _ in range(batch):
+        path.frame()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    path.ui_tick()
+    # Frames queued by fill() are freed as they are read; that is the test bus, not the receive path
+    skip = ("<frozen", tracemalloc.__file__, sys.modules[VirtualBus.__module__].__file__)
+    diff = [stat for stat in after.compare_to(before, "filename") if not stat.traceback[0].filename.startswith(skip)]
+    retained_blocks = sum(stat.count_diff for stat in diff)
+    retained_bytes = sum(stat.size_diff for stat in diff)
+    return (transient / batch, retained_blocks / batch, retained_bytes / batch, collections * 100000 / count,
+            elapsed / count * 1e6)
+
+
+def path_handle(path):
+    return path.handle if isinstance(path, OldPath) else path.channel.handle
+
+
+def make_frames(db, count):
+    # Payload bytes follow a counter so every frame differs, like real signals do
+    messages = [message for message in db.messages if not message.is_multiplexed() and message.length <= 8]
+    return [(messages[n % len(messages)].frame_id,
+             bytes((n + i) & 0xFF for i in range(messages[n % len(messages)].length))) for n in range(count)]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_frame_alloc.py path/to/file.dbc [frames]")
+        sys.exit(1)
+    db = cantools.database.load_file(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    frames = make_frames(db, BATCH)
+
+    bus = VirtualBus(rate=0)
+    (_, source), (_, target) = bus.get_available_channels()[:2]
+    bus.Initialize(source, PCAN_BAUD_500K)
+
+    bus.Initialize(target, PCAN_BAUD_500K)
+    old = measure(OldPath(bus, target, DecoderTable(db)), bus, source, frames, count)
+    bus.Uninitialize(target)
+
+    engine = MonitorEngine(db, bus)
+    engine.initialize(target, PCAN_BAUD_500K)
+    new = measure(NewPath(engine, next(iter(engine.channels.values()))), bus, source, frames, count)
+    engine.close()
+
+    print(f"Frames:                     {count:,}")
+    print(f"{'':28}{'old':>12}{'new':>12}")
+    for label, index, fmt in (("Transient bytes/frame", 0, "{:12.0f}"), ("Retained blocks/frame", 1, "{:12.2f}"),
+                              ("Retained bytes/frame", 2, "{:12.0f}"), ("Gen0 GCs/100k frames", 3, "{:12.0f}"),
+                              ("Time us/frame", 4, "{:12.2f}")):
+        print(f"{label:28}" + fmt.format(old[index]) + fmt.format(new[index]))
+
+
+if __name__ == "__main__":
+    main()
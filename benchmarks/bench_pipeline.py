@@ -0,0 +1,80 @@
+import os
+import random
+import sys
+import time
+
+import cantools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from decoder_table import DecoderTable
+from snapshot_store import SnapshotStore
+from decode_pipeline import DecodePipeline
+
+
+# Throughput of the multiprocess decode pipeline vs. decoding in the receive thread
+# Usage: python benchmarks/bench_pipeline.py path/to/file.dbc [frames] [max_workers]
+
+
+def make_frames(db, count):
+    frame_ids = [message.frame_id for message in db.messages if not message.is_multiplexed()]
+    rng = random.Random(1234)
+    payloads = [bytes(rng.getrandbits(8) for _ in range(8)) for _ in range(256)]
+    # 1 ms apart per frame, like a busy bus
+    return [(i * 1000, rng.choice(frame_ids), payloads[i & 0xFF]) for i in range(count)]
+
+
+def bench_thread(db, frames):
+    table = DecoderTable(db)
+    store = SnapshotStore()
+    start = time.perf_counter()
+    for timestamp_us, frame_id, data in frames:
+        decoder = table.lookup(frame_id)
+        store.update(frame_id, 0, 8, data, decoder, decoder.decode(data), timestamp_us)
+    return time.perf_counter() - start
+
+
+def bench_pipeline(db, frames, workers):
+    table = DecoderTable(db)
+    pipeline = DecodePipeline(db, SnapshotStore(), table, workers=workers)
+    pipeline.start()
+    count = len(frames)
+    start = time.perf_counter()
+    submitted = 0
+    for timestamp_us, frame_id, data in frames:
+        # Back off instead of dropping when the workers fall behind
+        while True:
+            dropped = pipeline.dropped
+            pipeline.submit(timestamp_us, frame_id, 0, 8, data)
+            if pipeline.dropped == dropped:
+                break
+            time.sleep(0.0005)
+        submitted += 1
+        if submitted % 1024 == 0:
+            pipeline.flush()
+    pipeline.flush()
+    while pipeline.decoded + pipeline.errors + pipeline.unknown < count:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    pipeline.stop()
+    return elapsed
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_pipeline.py path/to/file.dbc [frames] [max_workers]")
+        sys.exit(1)
+    db = cantools.database.load_file(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 500000
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1
+
+    frames = make_frames(db, count)
+    thread_time = bench_thread(db, frames)
+    print(f"Receive thread:  {thread_time:.3f} s  ({count / thread_time:,.0f} frames/s)")
+    for workers in range(1, max_workers + 1):
+        elapsed = bench_pipeline(db, frames, workers)
+        print(f"{workers} worker(s):     {elapsed:.3f} s  ({count / elapsed:,.0f} frames/s, "
+              f"{thread_time / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import cantools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from decoder_table import DecoderTable
+from signal_plot import SignalPlotter
+
+
+# Live plot data: up to 12 signals of the DBC at 100 Hz per message, fed straight into SignalPlotter.record
+# for the given number of simulated hours (hardware timestamps, no sleeping). Reports the cost per plotted
+# and per ignored frame, the memory held after the first minute and at the end, and the time to build
+# one redraw (envelope of every trace at 1000 px, 1 minute span) at 100 Hz and at 10 kHz per message.
+# Usage: python benchmarks/bench_plot.py path/to/file.dbc [hours]
+
+WIDTH = 1000  # Plot width in pixels
+SPAN_US = 60_000_000
+
+
+def make_plotter(db, rate_hz):
+    table = DecoderTable(db)
+    plotter = SignalPlotter(lambda channel, can_id: table.entries.get(can_id), span_us=SPAN_US, columns=WIDTH)
+    messages = [message for message in db.messages if not message.is_multiplexed()]
+    for message in messages:
+        for signal in message.signals:
+            if len(plotter.traces) < 12:
+                plotter.add(0, message.frame_id, signal.name)
+    frame_ids = sorted({trace.can_id for trace in plotter.traces})
+    rng = random.Random(1234)
+    payloads = [bytes(rng.getrandbits(8) for _ in range(64)) for _ in range(256)]
+    return plotter, frame_ids, payloads, 1_000_000 // rate_hz
+
+
+def feed(plotter, frame_ids, payloads, period_us, start_us, seconds):
+    # -> (timestamp after the last frame, frames fed, seconds spent)
+    record = plotter.record
+    frames = 0
+    timestamp_us = start_us
+    started = time.perf_counter()
+    for step in range(seconds * 1_000_000 // period_us):
+        timestamp_us = start_us + step * period_us
+        for can_id in frame_ids:
+            record(timestamp_us, can_id, 0, 8, payloads[(step + can_id) & 0xFF], 0)
+            frames += 1
+    return timestamp_us + period_us, frames, time.perf_counter() - started
+
+
+def redraw_ms(plotter, runs=20):
+    # Envelope and canvas coordinates of every trace, like CANBusMonitor.update_plot
+    start = time.perf_counter()
+    for _ in range(runs):
+        for trace in plotter.traces:
+            coords = []
+            for column, minimum, maximum in trace.envelope(plotter.newest_us):
+                coords += (column, maximum, column, minimum)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_plot.py path/to/file.dbc [hours]")
+        sys.exit(1)
+    db = cantools.database.load_file(sys.argv[1])
+    hours = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    # Memory: traced from the start, so it includes the rings of the traces
+    tracemalloc.start()
+    plotter, frame_ids, payloads, period_us = make_plotter(db, 100)
+    timestamp_us, frames, _ = feed(plotter, frame_ids, payloads, period_us, 0, 60)
+    memory_first_minute = tracemalloc.get_traced_memory()[0]
+    timestamp_us, more_frames, _ = feed(plotter, frame_ids, payloads, period_us, timestamp_us, int(hours * 3600) - 60)
+    frames += more_frames
+    memory_end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Times without tracing
+    timed, timed_ids, timed_payloads, _ = make_plotter(db, 100)
+    _, timed_frames, elapsed = feed(timed, timed_ids, timed_payloads, period_us, 0, 60)
+    redraw_first_minute = redraw_ms(timed)
+    feed(timed, timed_ids, timed_payloads, period_us, 60_000_000, 540)
+    redraw_ten_minutes = redraw_ms(timed)
+    start = time.perf_counter()
+    for n in range(100000):
+        timed.record(n, 0x7FF, 0, 8, payloads[0], 0)  # Not plotted
+    ignored_us = (time.perf_counter() - start) / 100000 * 1e6
+
+    fast, fast_ids, fast_payloads, fast_period_us = make_plotter(db, 10000)
+    feed(fast, fast_ids, fast_payloads, fast_period_us, 0, 60)
+    redraw_fast = redraw_ms(fast)
+
+    samples = sum(trace.count for trace in plotter.traces)
+    print(f"Traces:                     {len(plotter.traces)} signals in {len(frame_ids)} messages at 100 Hz")
+    print(f"Simulated:                  {hours:g} h, {frames:,} frames, {samples:,} samples")
+    print(f"Plotted frame:              {elapsed / timed_frames * 1e6:.2f} us")
+    print(f"Ignored frame:              {ignored_us:.2f} us")
+    print(f"Memory after 1 min:         {memory_first_minute / 1e6:.1f} MB")
+    print(f"Memory at the end:          {memory_end / 1e6:.1f} MB")
+    print(f"Redraw, 100 Hz, 1 min:      {redraw_first_minute:.2f} ms")
+    print(f"Redraw, 100 Hz, 10 min:     {redraw_ten_minutes:.2f} ms")
+    print(f"Redraw, 10 kHz, 1 min:      {redraw_fast:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import time
+
+import cantools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from PCANBasic import *
+from bus_backend import VirtualBus
+from tx_sequence import SequencePlayer, compile_sequence
+
+
+# Transmit throughput of a scripted burst on a VirtualBus without rate limit.
+#   per frame: what a hand-written loop does, encode the signals with cantools, fill a new TPCANMsg and
+#              Write it, one call per frame
+#   sequence:  the same frames compiled once into a TransmitSequence and sent by SequencePlayer, which
+#              hands every batch of due steps to WriteMany
+# Also reports a burst of one raw ("#HEX") frame and the compile time of the script.
+# Usage: python benchmarks/bench_sequence.py path/to/file.dbc [frames]
+
+
+def pick_message(db):
+    return next(message for message in db.messages
+                if not message.is_multiplexed() and not message.is_extended_frame and message.length <= 8)
+
+
+def signal_values(message, n):
+    # Counter values inside every signal's range, so each frame differs
+    values = {}
+    for signal in message.signals:
+        low = signal.minimum if signal.minimum is not None else 0
+        high = signal.maximum if signal.maximum is not None else low + 1
+        values[signal.name] = low + (high - low) * (n % 100) / 100 if high > low else low
+        if not signal.is_float and signal.scale == 1 and signal.offset == 0:
+            values[signal.name] = int(values[signal.name])
+    return values
+
+
+def per_frame(bus, handle, message, count):
+    start = time.perf_counter()
+    for n in range(count):
+        data = message.encode(signal_values(message, n % 16), strict=False)
+        msg = TPCANMsg()
+        msg.ID = message.frame_id
+        msg.MSGTYPE = PCAN_MESSAGE_STANDARD.value
+        msg.LEN = len(data)
+        msg.DATA[:len(data)] = data
+        bus.Write(handle, msg)
+    return time.perf_counter() - start
+
+
+def script(message, count):
+    # 16 distinct frames, repeated back to back
+    lines = [f"repeat {count // 16}"]
+    for n in range(16):
+        values = ",".join(f"{name}={value}" for name, value in signal_values(message, n).items())
+        lines.append(f"send {message.frame_id:x} {values}")
+    lines.append("end")
+    return "\n".join(lines)
+
+
+def play(bus, handle, sequence):
+    done = threading.Event()
+    player = SequencePlayer(lambda msgs: bus.WriteMany(handle, msgs), sequence, on_done=lambda _: done.set())
+    start = time.perf_counter()
+    player.start()
+    done.wait()
+    return time.perf_counter() - start, player
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_sequence.py path/to/file.dbc [frames]")
+        sys.exit(1)
+    db = cantools.database.load_file(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    count -= count % 16
+    message = pick_message(db)
+
+    bus = VirtualBus(rate=0)
+    (_, source), (_, target) = bus.get_available_channels()[:2]
+    bus.Initialize(source, PCAN_BAUD_500K)
+    bus.Initialize(target, PCAN_BAUD_500K)
+
+    # The target's receive queue overflows; bus.written counts the frames the bus took
+    elapsed_per_frame = per_frame(bus, source, message, count)
+    written_per_frame = bus.written
+
+    start = time.perf_counter()
+    sequence = compile_sequence(script(message, count), db)
+    compile_s = time.perf_counter() - start
+    elapsed_sequence, player = play(bus, source, sequence)
+    written_sequence = bus.written - written_per_frame
+
+    raw = compile_sequence(f"burst {count} {message.frame_id:x} #{bytes(range(message.length)).hex()}", db)
+    elapsed_raw, _ = play(bus, source, raw)
+
+    print(f"Message:                    {message.name} ({message.frame_id:#x}), {count:,} frames")
+    print(f"{'':28}{'frames/s':>12}{'written':>12}")
+    print(f"{'Per frame encode + Write':28}{count / elapsed_per_frame:12,.0f}{written_per_frame:12,}")
+    print(f"{'Sequence + WriteMany':28}{count / elapsed_sequence:12,.0f}{written_sequence:12,}")
+    print(f"{'Raw burst + WriteMany':28}{count / elapsed_raw:12,.0f}")
+    print(f"Compile:                    {compile_s * 1000:.1f} ms, {len(sequence):,} steps, {sequence.frames} frames")
+    print(f"Batches:                    {player.batches:,} ({player.sent / max(player.batches, 1):.0f} frames each)")
+
+
+if __name__ == "__main__":
+    main()
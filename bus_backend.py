@@ -0,0 +1,687 @@
+import abc
+import collections
+import ctypes
+import socket
+import struct
+import threading
+import time
+from PCANBasic import *
+from receive_event import create_receive_event, FdReceiveEvent, ThreadingReceiveEvent
+from canfd import FD_DLC, FD_LENGTHS
+
+
+# Bus backends.
+# Every backend exposes the subset of the PCANBasic API the monitor uses, with the same names
+# and return values, so the receive/decode/transmit paths run unchanged on any of them:
+#   Initialize(handle, bitrate)            -> TPCANStatus
+#   Uninitialize(handle)                   -> TPCANStatus
+#   Read(handle)                           -> (TPCANStatus, TPCANMsg, TPCANTimestamp)
+#   Write(handle, msg)                     -> TPCANStatus
+#   InitializeFD(handle, bitrate_fd)       -> TPCANStatus        (CAN FD, bitrate_fd is a PCAN-Basic FD string)
+#   ReadFD(handle)                         -> (TPCANStatus, TPCANMsgFD, TPCANTimestampFD)
+#   WriteFD(handle, msg)                   -> TPCANStatus
+#   WriteMany(handle, msgs)                -> (TPCANStatus, frames written)   (not in PCANBasic, see below)
+#   GetValue(handle, parameter)            -> (TPCANStatus, value)
+#   SetValue(handle, parameter, value)     -> TPCANStatus
+#   FilterMessages(handle, from, to, mode) -> TPCANStatus
+#   GetErrorText(status, language)         -> (TPCANStatus, bytes)
+# plus get_available_channels() -> [(name, handle)], create_receive_event() and
+# attach_database(db), which lets simulated backends generate traffic for the loaded DBC.
+# Read and ReadFD may hand out the same per-channel TPCANMsg / TPCANMsgFD, timestamp and even the
+# same result tuple on every call: the receive path copies what it keeps before reading the next
+# frame. PCANBasic.Read/ReadFD allocate a message and a timestamp per call, so the PCAN backend
+# calls the driver with one preallocated set per channel instead.
+# WriteMany sends prebuilt TPCANMsg / TPCANMsgFD in order and stops at the first status other than
+# PCAN_ERROR_OK (e.g. PCAN_ERROR_QXMTFULL), returning that status and how many frames went out; the
+# PCAN backend calls CAN_Write / CAN_WriteFD directly for the whole batch.
+
+
+_MSG_FD = PCAN_MESSAGE_FD.value
+_MSG_BRS = PCAN_MESSAGE_BRS.value
+_MSG_ESI = PCAN_MESSAGE_ESI.value
+
+
+def _parameter_value(parameter):
+    # PCAN parameters are ctypes instances, which do not compare by value
+    return getattr(parameter, "value", parameter)
+
+
+def fill_pcan_timestamp(timestamp, timestamp_us):
+    millis = timestamp_us // 1000
+    timestamp.micros = timestamp_us % 1000
+    timestamp.millis = millis & 0xFFFFFFFF
+    timestamp.millis_overflow = (millis >> 32) & 0xFFFF
+    return timestamp
+
+
+def _receive_buffers(msg, timestamp):
+    # (msg, timestamp, byref(msg), byref(timestamp), result tuple of a successful read) of one channel
+    return msg, timestamp, ctypes.byref(msg), ctypes.byref(timestamp), (PCAN_ERROR_OK, msg, timestamp)
+
+
+class BusBackend(abc.ABC):
+    # Initialize, Uninitialize, Read and Write are required; a backend missing one fails when it is created
+    name = "Generic"
+
+    def get_available_channels(self):
+        return []
+
+    def create_receive_event(self):
+        return create_receive_event()
+
+    def attach_database(self, db):
+        pass
+
+    @abc.abstractmethod
+    def Initialize(self, handle, bitrate, *args):
+        pass
+
+    @abc.abstractmethod
+    def Uninitialize(self, handle):
+        pass
+
+    @abc.abstractmethod
+    def Read(self, handle):
+        pass
+
+    @abc.abstractmethod
+    def Write(self, handle, msg):
+        pass
+
+    def InitializeFD(self, handle, bitrate_fd):
+        return PCAN_ERROR_ILLOPERATION  # No CAN FD support
+
+    def ReadFD(self, handle):
+        return PCAN_ERROR_ILLOPERATION, TPCANMsgFD(), TPCANTimestampFD()
+
+    def WriteFD(self, handle, msg):
+        return PCAN_ERROR_ILLOPERATION
+
+    def WriteMany(self, handle, msgs):
+        for written, msg in enumerate(msgs):
+            status = self.WriteFD(handle, msg) if type(msg) is TPCANMsgFD else self.Write(handle, msg)
+            if status != PCAN_ERROR_OK:
+                return status, written
+        return PCAN_ERROR_OK, len(msgs)
+
+    def GetValue(self, handle, parameter):
+        return PCAN_ERROR_ILLPARAMTYPE, 0
+
+    def SetValue(self, handle, parameter, value):
+        return PCAN_ERROR_ILLPARAMTYPE
+
+    def FilterMessages(self, handle, from_id, to_id, mode):
+        return PCAN_ERROR_ILLOPERATION
+
+    def GetErrorText(self, status, language=0):
+        return PCAN_ERROR_OK, f"{self.name} error 0x{status:X}".encode()
+
+
+class PCANBackend(BusBackend):
+    # PEAK hardware through the PCAN-Basic driver; everything not overridden goes straight to PCANBasic
+    name = "PCAN"
+
+    def __init__(self):
+        self.pcan = PCANBasic()
+        # With the library handle the driver fills one preallocated message and timestamp per channel
+        self._dll = getattr(self.pcan, "_PCANBasic__m_dllBasic", None)
+        self._buffers = {}  # handle -> _receive_buffers(TPCANMsg, TPCANTimestamp)
+        self._fd_buffers = {}  # handle -> _receive_buffers(TPCANMsgFD, TPCANTimestampFD)
+
+    def __getattr__(self, attribute):
+        return getattr(self.pcan, attribute)
+
+    def Initialize(self, handle, bitrate, *args):
+        status = self.pcan.Initialize(handle, bitrate, *args)
+        if status == PCAN_ERROR_OK:
+            self._buffers[_parameter_value(handle)] = _receive_buffers(TPCANMsg(), TPCANTimestamp())
+        return status
+
+    def Uninitialize(self, handle):
+        self._buffers.pop(_parameter_value(handle), None)
+        self._fd_buffers.pop(_parameter_value(handle), None)
+        return self.pcan.Uninitialize(handle)
+
+    def Read(self, handle):
+        buffers = self._buffers.get(_parameter_value(handle))
+        if buffers is None or self._dll is None:
+            return self.pcan.Read(handle)
+        msg, timestamp, msg_ref, timestamp_ref, received = buffers
+        status = self._dll.CAN_Read(handle, msg_ref, timestamp_ref)
+        return received if status == PCAN_ERROR_OK else (status, msg, timestamp)
+
+    def Write(self, handle, msg):
+        return self.pcan.Write(handle, msg)
+
+    def InitializeFD(self, handle, bitrate_fd):
+        if isinstance(bitrate_fd, str):
+            bitrate_fd = bitrate_fd.encode()  # TPCANBitrateFD is a char pointer
+        status = self.pcan.InitializeFD(handle, bitrate_fd)
+        if status == PCAN_ERROR_OK:
+            self._fd_buffers[_parameter_value(handle)] = _receive_buffers(TPCANMsgFD(), TPCANTimestampFD())
+        return status
+
+    def ReadFD(self, handle):
+        buffers = self._fd_buffers.get(_parameter_value(handle))
+        if buffers is None or self._dll is None:
+            return self.pcan.ReadFD(handle)
+        msg, timestamp, msg_ref, timestamp_ref, received = buffers
+        status = self._dll.CAN_ReadFD(handle, msg_ref, timestamp_ref)
+        return received if status == PCAN_ERROR_OK else (status, msg, timestamp)
+
+    def WriteFD(self, handle, msg):
+        return self.pcan.WriteFD(handle, msg)
+
+    def WriteMany(self, handle, msgs):
+        if self._dll is None:
+            return BusBackend.WriteMany(self, handle, msgs)
+        write = self._dll.CAN_Write
+        write_fd = self._dll.CAN_WriteFD
+        byref = ctypes.byref
+        for written, msg in enumerate(msgs):
+            status = write_fd(handle, byref(msg)) if type(msg) is TPCANMsgFD else write(handle, byref(msg))
+            if status != PCAN_ERROR_OK:
+                return status, written
+        return PCAN_ERROR_OK, len(msgs)
+
+    def GetValue(self, handle, parameter):
+        return self.pcan.GetValue(handle, parameter)
+
+    def SetValue(self, handle, parameter, value):
+        return self.pcan.SetValue(handle, parameter, value)
+
+    def FilterMessages(self, handle, from_id, to_id, mode):
+        return self.pcan.FilterMessages(handle, from_id, to_id, mode)
+
+    def GetErrorText(self, status, language=0):
+        return self.pcan.GetErrorText(status, language)
+
+    def get_available_channels(self):
+        available_channels = []
+        result = self.pcan.GetValue(PCAN_NONEBUS, PCAN_ATTACHED_CHANNELS)
+        if result[0] == PCAN_ERROR_OK:
+            # Include only connectable channels
+            for channel in result[1]:
+                new_channel = (self.FormatChannelName(channel.channel_handle), channel.channel_handle)
+                available_channels.append(new_channel)
+        return available_channels
+
+    def GetDeviceName(self, handle):
+        # Gets the name of a PCAN device
+        switcher = {
+            PCAN_NONEBUS.value: "PCAN_NONEBUS",
+            PCAN_PEAKCAN.value: "PCAN_PEAKCAN",
+            PCAN_DNG.value: "PCAN_DNG",
+            PCAN_PCI.value: "PCAN_PCI",
+            PCAN_USB.value: "PCAN_USB",
+            PCAN_VIRTUAL.value: "PCAN_VIRTUAL",
+            PCAN_LAN.value: "PCAN_LAN"
+        }
+
+        return switcher.get(handle, "UNKNOWN")
+
+    def FormatChannelName(self, handle):
+        # Gets the formated text for a PCAN-Basic channel handle
+        if handle < 0x100:
+            devDevice = TPCANDevice(handle >> 4)
+            byChannel = handle & 0xF
+        else:
+            devDevice = TPCANDevice(handle >> 8)
+            byChannel = handle & 0xFF
+
+        return '%s: %s (%.2Xh)' % (self.GetDeviceName(devDevice.value), byChannel, handle)
+
+
+class VirtualBus(BusBackend):
+    # In-process bus for headless testing and load tests.
+    # A generator thread produces frames from `frames` round-robin at `rate` frames/s on every
+    # initialized channel; frames written on one channel are delivered to all other channels.
+    # CAN FD frames only reach channels opened with InitializeFD.
+    name = "Virtual"
+    HANDLE_BASE = 0x1000
+    QUEUE_SIZE = 32768  # Frames per channel, like the driver receive queue
+
+    def __init__(self, frames=None, rate=0, channels=2, echo=False):
+        # frames: [(can_id, msg_type, length)] with a running counter as payload, or
+        # (can_id, msg_type, length, payloads) to send the given payloads in turn
+        self.custom_frames = frames is not None
+        self.frames = list(frames or [(0x100, PCAN_MESSAGE_STANDARD.value, 8)])
+        self.rate = rate  # frames/s, 0 = no generated traffic
+        self.channels = [(f"VIRTUAL: {i + 1} ({self.HANDLE_BASE + i:X}h)", self.HANDLE_BASE + i) for i in range(channels)]
+        self.echo = echo  # Also deliver written frames to the sending channel
+        self._queues = {}
+        self._buffers = {}  # handle -> _receive_buffers(TPCANMsg, TPCANTimestamp), refilled by Read
+        self._fd_buffers = {}  # handle -> _receive_buffers(TPCANMsgFD, TPCANTimestampFD) of CAN FD channels
+        self._events = {}
+        self._overrun = set()
+        self._lock = threading.Lock()
+        self._start_ns = time.perf_counter_ns()
+        self._generator = None
+        self._running = False
+        self._empty_msg = TPCANMsg()
+        self._empty_timestamp = TPCANTimestamp()
+        self._empty_msg_fd = TPCANMsgFD()
+        self._empty_timestamp_fd = TPCANTimestampFD()
+
+        self.generated = 0
+        self.written = 0
+
+    def get_available_channels(self):
+        return list(self.channels)
+
+    def create_receive_event(self):
+        return ThreadingReceiveEvent()
+
+    def attach_database(self, db):
+        # Without explicit frames, generate one frame per DBC message round-robin
+        if self.custom_frames or not db.messages:
+            return
+        frames = []
+        for message in db.messages:
+            msg_type = PCAN_MESSAGE_EXTENDED.value if message.is_extended_frame else PCAN_MESSAGE_STANDARD.value
+            length = message.length
+            if message.is_fd or length > 8:
+                msg_type |= _MSG_FD | _MSG_BRS
+                length = FD_LENGTHS[FD_DLC[length]]
+            if not message.is_multiplexed():
+                frames.append((message.frame_id, msg_type, length))
+                continue
+            # A counter would put invalid multiplexer values on the bus
+            payloads = _multiplexed_payloads(message, length)
+            if payloads:
+                frames.append((message.frame_id, msg_type, length, payloads))
+        self.frames = frames  # Replaced in one step, the generator may be running (DBC reload)
+
+    def Initialize(self, handle, bitrate, *args):
+        handle = _parameter_value(handle)
+        with self._lock:
+            self._queues[handle] = collections.deque()
+            self._buffers[handle] = _receive_buffers(TPCANMsg(), TPCANTimestamp())
+            self._overrun.discard(handle)
+        if self.rate and not self._running:
+            self._running = True
+            self._generator = threading.Thread(target=self._generate, daemon=True)
+            self._generator.start()
+        return PCAN_ERROR_OK
+
+    def InitializeFD(self, handle, bitrate_fd):
+        self._fd_buffers[_parameter_value(handle)] = _receive_buffers(TPCANMsgFD(), TPCANTimestampFD())
+        return self.Initialize(handle, bitrate_fd)
+
+    def Uninitialize(self, handle):
+        handle = _parameter_value(handle)
+        with self._lock:
+            self._queues.pop(handle, None)
+            self._buffers.pop(handle, None)
+            self._fd_buffers.pop(handle, None)
+            self._events.pop(handle, None)
+            if not self._queues:
+                self._running = False
+        return PCAN_ERROR_OK
+
+    def Read(self, handle):
+        handle = _parameter_value(handle)
+        queue = self._queues.get(handle)
+        buffers = self._buffers.get(handle)
+        if queue is None or buffers is None:
+            return PCAN_ERROR_INITIALIZE, self._empty_msg, self._empty_timestamp
+        if handle in self._overrun:
+            self._overrun.discard(handle)
+            return PCAN_ERROR_QOVERRUN, self._empty_msg, self._empty_timestamp
+        try:
+            can_id, msg_type, dlc, data, timestamp_us = queue.popleft()
+        except IndexError:
+            return PCAN_ERROR_QRCVEMPTY, self._empty_msg, self._empty_timestamp
+
+        # Filled in place, like the driver does with the PCANBackend buffers
+        msg, timestamp, _, _, received = buffers
+        msg.ID = can_id
+        msg.MSGTYPE = msg_type
+        msg.LEN = dlc
+        if len(data) < 8:
+            ctypes.memset(msg.DATA, 0, 8)  # No stale bytes from the previous frame
+        ctypes.memmove(msg.DATA, data, min(len(data), 8))
+        fill_pcan_timestamp(timestamp, timestamp_us)
+        return received
+
+    def Write(self, handle, msg):
+        handle = _parameter_value(handle)
+        if handle not in self._queues:
+            return PCAN_ERROR_INITIALIZE
+        self._deliver(handle, (msg.ID, _parameter_value(msg.MSGTYPE), msg.LEN, bytes(msg.DATA[:msg.LEN]), self._now_us()))
+        return PCAN_ERROR_OK
+
+    def ReadFD(self, handle):
+        handle = _parameter_value(handle)
+        queue = self._queues.get(handle)
+        buffers = self._fd_buffers.get(handle)
+        if queue is None or buffers is None:
+            return PCAN_ERROR_INITIALIZE, self._empty_msg_fd, self._empty_timestamp_fd
+        if handle in self._overrun:
+            self._overrun.discard(handle)
+            return PCAN_ERROR_QOVERRUN, self._empty_msg_fd, self._empty_timestamp_fd
+        try:
+            can_id, msg_type, length, data, timestamp_us = queue.popleft()
+        except IndexError:
+            return PCAN_ERROR_QRCVEMPTY, self._empty_msg_fd, self._empty_timestamp_fd
+
+        # Filled in place, like the driver does with the PCANBackend buffers
+        msg, timestamp, _, _, received = buffers
+        msg.ID = can_id
+        msg.MSGTYPE = msg_type
+        msg.DLC = FD_DLC[length]
+        ctypes.memmove(msg.DATA, data, length)
+        timestamp.value = timestamp_us
+        return received
+
+    def WriteFD(self, handle, msg):
+        handle = _parameter_value(handle)
+        if handle not in self._fd_buffers:
+            return PCAN_ERROR_INITIALIZE
+        length = FD_LENGTHS[msg.DLC & 0xF]
+        self._deliver(handle, (msg.ID, _parameter_value(msg.MSGTYPE), length, ctypes.string_at(msg.DATA, length),
+                               self._now_us()))
+        return PCAN_ERROR_OK
+
+    def _deliver(self, handle, frame):
+        for target in list(self._queues):
+            if target != handle or self.echo:
+                self._push(target, frame)
+        self.written += 1
+
+    def GetValue(self, handle, parameter):
+        return PCAN_ERROR_ILLPARAMTYPE, 0
+
+    def SetValue(self, handle, parameter, value):
+        if _parameter_value(parameter) == PCAN_RECEIVE_EVENT.value:
+            handle = _parameter_value(handle)
+            if value is None:
+                self._events.pop(handle, None)
+            else:
+                self._events[handle] = value
+            return PCAN_ERROR_OK
+        # Filters, listen-only etc. are accepted and ignored
+        return PCAN_ERROR_OK
+
+    def inject(self, handle, can_id, data, msg_type=0):
+        # Queue a single frame on a channel, e.g. from a test script
+        self._push(_parameter_value(handle), (can_id, msg_type, len(data), bytes(data), self._now_us()))
+
+    def _now_us(self):
+        return (time.perf_counter_ns() - self._start_ns) // 1000
+
+    def _push(self, handle, frame):
+        queue = self._queues.get(handle)
+        if queue is None or (frame[1] & _MSG_FD and handle not in self._fd_buffers):
+            return
+        if len(queue) >= self.QUEUE_SIZE:
+            self._overrun.add(handle)
+            return
+        queue.append(frame)
+        event = self._events.get(handle)
+        if event is not None:
+            event.set()
+
+    def _generate(self):
+        frames = self.frames
+        frame_count = len(frames)
+        rate = self.rate
+        start = time.perf_counter()
+        start_us = self._now_us()
+        produced = 0
+        while self._running:
+            time.sleep(0.001)
+            due = int((time.perf_counter() - start) * rate) - produced
+            if due <= 0:
+                continue
+            if frames is not self.frames:
+                frames = self.frames  # New DBC attached
+                frame_count = len(frames)
+            for handle in list(self._queues):
+                for n in range(produced, produced + due):
+                    frame = frames[n % frame_count]
+                    can_id, msg_type, dlc = frame[:3]
+                    if len(frame) > 3:
+                        payloads = frame[3]
+                        data = payloads[n // frame_count % len(payloads)]
+                    else:
+                        counter = n & 0xFF
+                        data = bytes((counter + i) & 0xFF for i in range(dlc))
+                    # Evenly spaced timestamps, as if the frames arrived exactly at the configured rate
+                    timestamp_us = start_us + n * 1_000_000 // rate
+                    self._push(handle, (can_id, msg_type, dlc, data, timestamp_us))
+            produced += due
+            self.generated = produced
+
+
+def _multiplexed_payloads(message, length):
+    # One payload per multiplexer value, encoded from the initial values of the signals it selects
+    multiplexer = next(signal for signal in message.signals if signal.is_multiplexer)
+    mux_ids = sorted({mux_id for signal in message.signals if signal.multiplexer_signal == multiplexer.name
+                      for mux_id in signal.multiplexer_ids or ()})
+    payloads = []
+    for mux_id in mux_ids:
+        values = {signal.name: signal.initial if signal.initial is not None else 0 for signal in message.signals
+                  if not signal.multiplexer_ids or mux_id in signal.multiplexer_ids}
+        values[multiplexer.name] = mux_id
+        try:
+            data = message.encode(values, strict=False)
+        except Exception:
+            continue  # E.g. nested multiplexers: leave this value out
+        payloads.append(data + bytes(length - len(data)))
+    return tuple(payloads)
+
+
+class SocketCANBackend(BusBackend):
+    # Linux SocketCAN (e.g. vcan0). The bitrate is configured with `ip link`, not here; for CAN FD
+    # (`ip link set can0 type can bitrate 500000 dbitrate 2000000 fd on`) InitializeFD only enables
+    # FD frames on the socket.
+    name = "SocketCAN"
+    CAN_FRAME = struct.Struct("=IB3x8s")
+    CANFD_FRAME = struct.Struct("=IBBxx64s")
+    CANFD_HEADER = struct.Struct("=IBB")
+    CANFD_BRS = 0x01
+    CANFD_ESI = 0x02
+    CAN_EFF_FLAG = 0x80000000
+    CAN_RTR_FLAG = 0x40000000
+    CAN_ERR_FLAG = 0x20000000
+    CAN_EFF_MASK = 0x1FFFFFFF
+
+    def __init__(self, interfaces=("vcan0",)):
+        self.interfaces = list(interfaces)
+        self._sockets = {}
+        self._rx_buffer = bytearray(self.CAN_FRAME.size)
+        self._buffers = {}  # handle -> _receive_buffers(TPCANMsg, TPCANTimestamp), refilled by Read
+        self._fd_buffers = {}  # handle -> (receive buffer,) + _receive_buffers(TPCANMsgFD, TPCANTimestampFD)
+        self._empty_msg = TPCANMsg()
+        self._empty_timestamp = TPCANTimestamp()
+        self._empty_msg_fd = TPCANMsgFD()
+        self._empty_timestamp_fd = TPCANTimestampFD()
+        self._start_ns = time.perf_counter_ns()
+
+    def get_available_channels(self):
+        return [(f"SocketCAN: {interface}", index) for index, interface in enumerate(self.interfaces)]
+
+    def create_receive_event(self):
+        return FdReceiveEvent()
+
+    def Initialize(self, handle, bitrate, *args):
+        handle = _parameter_value(handle)
+        try:
+            sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+            sock.bind((self.interfaces[handle],))
+            sock.setblocking(False)
+        except (OSError, IndexError, AttributeError):
+            return PCAN_ERROR_INITIALIZE
+        self._sockets[handle] = sock
+        self._buffers[handle] = _receive_buffers(TPCANMsg(), TPCANTimestamp())
+        return PCAN_ERROR_OK
+
+    def Uninitialize(self, handle):
+        self._buffers.pop(_parameter_value(handle), None)
+        self._fd_buffers.pop(_parameter_value(handle), None)
+        sock = self._sockets.pop(_parameter_value(handle), None)
+        if sock is not None:
+            sock.close()
+        return PCAN_ERROR_OK
+
+    def InitializeFD(self, handle, bitrate_fd):
+        status = self.Initialize(handle, bitrate_fd)
+        if status != PCAN_ERROR_OK:
+            return status
+        handle = _parameter_value(handle)
+        try:
+            self._sockets[handle].setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FD_FRAMES, 1)
+        except (OSError, AttributeError):
+            self.Uninitialize(handle)
+            return PCAN_ERROR_INITIALIZE
+        buffers = _receive_buffers(TPCANMsgFD(), TPCANTimestampFD())
+        self._fd_buffers[handle] = ((ctypes.c_ubyte * self.CANFD_FRAME.size)(),) + buffers
+        return PCAN_ERROR_OK
+
+    def Read(self, handle):
+        handle = _parameter_value(handle)
+        sock = self._sockets.get(handle)
+        buffers = self._buffers.get(handle)
+        if sock is None or buffers is None:
+            return PCAN_ERROR_INITIALIZE, self._empty_msg, self._empty_timestamp
+        try:
+            sock.recv_into(self._rx_buffer)
+        except BlockingIOError:
+            return PCAN_ERROR_QRCVEMPTY, self._empty_msg, self._empty_timestamp
+        except OSError:
+            return PCAN_ERROR_ILLOPERATION, self._empty_msg, self._empty_timestamp
+
+        can_id, dlc, data = self.CAN_FRAME.unpack_from(self._rx_buffer)
+        msg, timestamp, _, _, received = buffers
+        msg_type = PCAN_MESSAGE_STANDARD.value
+        if can_id & self.CAN_ERR_FLAG:
+            msg_type = PCAN_MESSAGE_ERRFRAME.value
+        elif can_id & self.CAN_EFF_FLAG:
+            msg_type = PCAN_MESSAGE_EXTENDED.value
+        if can_id & self.CAN_RTR_FLAG:
+            msg_type |= PCAN_MESSAGE_RTR.value
+        msg.ID = can_id & self.CAN_EFF_MASK
+        msg.MSGTYPE = msg_type
+        msg.LEN = dlc
+        ctypes.memmove(msg.DATA, data, 8)
+        fill_pcan_timestamp(timestamp, (time.perf_counter_ns() - self._start_ns) // 1000)
+        return received
+
+    def Write(self, handle, msg):
+        sock = self._sockets.get(_parameter_value(handle))
+        if sock is None:
+            return PCAN_ERROR_INITIALIZE
+        msg_type = _parameter_value(msg.MSGTYPE)
+        can_id = msg.ID
+        if msg_type & PCAN_MESSAGE_EXTENDED.value:
+            can_id |= self.CAN_EFF_FLAG
+        if msg_type & PCAN_MESSAGE_RTR.value:
+            can_id |= self.CAN_RTR_FLAG
+        try:
+            sock.send(self.CAN_FRAME.pack(can_id, msg.LEN, bytes(msg.DATA)))
+        except BlockingIOError:
+            return PCAN_ERROR_QXMTFULL
+        except OSError:
+            return PCAN_ERROR_ILLOPERATION
+        return PCAN_ERROR_OK
+
+    def ReadFD(self, handle):
+        # Classic frames arrive as 16-byte can_frame, FD frames as 72-byte canfd_frame; the payload starts
+        # at byte 8 in both and is copied straight into the channel's TPCANMsgFD
+        handle = _parameter_value(handle)
+        sock = self._sockets.get(handle)
+        buffers = self._fd_buffers.get(handle)
+        if sock is None or buffers is None:
+            return PCAN_ERROR_INITIALIZE, self._empty_msg_fd, self._empty_timestamp_fd
+        rx_buffer, msg, timestamp, _, _, received = buffers
+        try:
+            size = sock.recv_into(rx_buffer)
+        except BlockingIOError:
+            return PCAN_ERROR_QRCVEMPTY, self._empty_msg_fd, self._empty_timestamp_fd
+        except OSError:
+            return PCAN_ERROR_ILLOPERATION, self._empty_msg_fd, self._empty_timestamp_fd
+
+        can_id, length, flags = self.CANFD_HEADER.unpack_from(rx_buffer)
+        msg_type = PCAN_MESSAGE_STANDARD.value
+        if can_id & self.CAN_ERR_FLAG:
+            msg_type = PCAN_MESSAGE_ERRFRAME.value
+        elif can_id & self.CAN_EFF_FLAG:
+            msg_type = PCAN_MESSAGE_EXTENDED.value
+        if size == self.CANFD_FRAME.size:
+            msg_type |= _MSG_FD
+            if flags & self.CANFD_BRS:
+                msg_type |= _MSG_BRS
+            if flags & self.CANFD_ESI:
+                msg_type |= _MSG_ESI
+        elif can_id & self.CAN_RTR_FLAG:
+            msg_type |= PCAN_MESSAGE_RTR.value
+        length = min(length, 64)
+        msg.ID = can_id & self.CAN_EFF_MASK
+        msg.MSGTYPE = msg_type
+        msg.DLC = FD_DLC[length]
+        ctypes.memmove(msg.DATA, ctypes.byref(rx_buffer, 8), length)
+        timestamp.value = (time.perf_counter_ns() - self._start_ns) // 1000
+        return received
+
+    def WriteFD(self, handle, msg):
+        sock = self._sockets.get(_parameter_value(handle))
+        if sock is None:
+            return PCAN_ERROR_INITIALIZE
+        msg_type = _parameter_value(msg.MSGTYPE)
+        can_id = msg.ID
+        if msg_type & PCAN_MESSAGE_EXTENDED.value:
+            can_id |= self.CAN_EFF_FLAG
+        length = FD_LENGTHS[msg.DLC & 0xF]
+        if msg_type & _MSG_FD:
+            flags = (self.CANFD_BRS if msg_type & _MSG_BRS else 0) | (self.CANFD_ESI if msg_type & _MSG_ESI else 0)
+            frame = self.CANFD_FRAME.pack(can_id, length, flags, ctypes.string_at(msg.DATA, length))
+        else:
+            if msg_type & PCAN_MESSAGE_RTR.value:
+                can_id |= self.CAN_RTR_FLAG
+            frame = self.CAN_FRAME.pack(can_id, length, ctypes.string_at(msg.DATA, length))
+        try:
+            sock.send(frame)
+        except BlockingIOError:
+            return PCAN_ERROR_QXMTFULL
+        except OSError:
+            return PCAN_ERROR_ILLOPERATION
+        return PCAN_ERROR_OK
+
+    def GetValue(self, handle, parameter):
+        if _parameter_value(parameter) == PCAN_RECEIVE_EVENT.value:
+            sock = self._sockets.get(_parameter_value(handle))
+            if sock is not None:
+                return PCAN_ERROR_OK, sock.fileno()
+        return PCAN_ERROR_ILLPARAMTYPE, 0
+
+    def SetValue(self, handle, parameter, value):
+        return PCAN_ERROR_OK
+
+
+def create_backend(kind, **options):
+    if kind == "pcan":
+        return PCANBackend()
+    if kind == "virtual":
+        return VirtualBus(**options)
+    if kind == "socketcan":
+        return SocketCANBackend(**options)
+    raise ValueError(f"Unknown backend: {kind}")
+
+
+def add_backend_arguments(parser):
+    # Shared by the GUI and the headless CLI
+    parser.add_argument("--backend", choices=["pcan", "virtual", "socketcan"], default="pcan",
+                        help="Bus backend (default: pcan)")
+    parser.add_argument("--virtual-rate", type=int, default=1000,
+                        help="Frames/s generated per channel by the virtual bus (default: 1000)")
+    parser.add_argument("--socketcan-interface", action="append", dest="socketcan_interfaces",
+                        help="SocketCAN interface, may be repeated (default: vcan0)")
+
+
+def build_backend(args):
+    if args.backend == "virtual":
+        return create_backend("virtual", rate=args.virtual_rate)
+    if args.backend == "socketcan":
+        return create_backend("socketcan", interfaces=args.socketcan_interfaces or ["vcan0"])
+    return create_backend("pcan")
@@ -0,0 +1,138 @@
+import time
+from PCANBasic import *
+from canfd import fd_bitrates_bps, is_fd_bitrate
+
+
+# Bus load and pipeline instrumentation.
+# The receive thread only bumps integer counters per frame (BusMetrics.count) and feeds a few
+# DurationStat timers; rates and window maxima are computed when someone asks for them, at most
+# once per sampling window, so the GUI tick, the CLI and the metrics endpoint all see the same
+# numbers.
+#
+# Frame lengths use the worst-case bit-stuffing bound (one stuff bit per 4 bits of the
+# stuffable SOF..CRC region), including the 3-bit interframe space:
+#   standard: 8n + 47 + (34 + 8n - 1) // 4      extended: 8n + 67 + (54 + 8n - 1) // 4
+# so the bus load is an upper estimate. CAN FD frames are split into the bits sent at the
+# nominal rate (SOF..BRS, ACK..IFS) and at the data rate (ESI..CRC delimiter, with the stuff
+# count and fixed stuff bits of the FD CRC); with bit rate switching the data phase is counted
+# in nominal bit times, so the load stays "share of the bus time in use".
+
+BITRATE_BPS = {
+    PCAN_BAUD_1M.value: 1_000_000, PCAN_BAUD_800K.value: 800_000, PCAN_BAUD_500K.value: 500_000,
+    PCAN_BAUD_250K.value: 250_000, PCAN_BAUD_125K.value: 125_000, PCAN_BAUD_100K.value: 100_000,
+    PCAN_BAUD_95K.value: 95_238, PCAN_BAUD_83K.value: 83_333, PCAN_BAUD_50K.value: 50_000,
+    PCAN_BAUD_47K.value: 47_619, PCAN_BAUD_33K.value: 33_333, PCAN_BAUD_20K.value: 20_000,
+    PCAN_BAUD_10K.value: 10_000, PCAN_BAUD_5K.value: 5_000,
+}
+
+_STANDARD_BITS = tuple(8 * n + 47 + (34 + 8 * n - 1) // 4 for n in range(9))
+_EXTENDED_BITS = tuple(8 * n + 67 + (54 + 8 * n - 1) // 4 for n in range(9))
+
+_MSG_EXTENDED = PCAN_MESSAGE_EXTENDED.value
+_MSG_RTR = PCAN_MESSAGE_RTR.value
+_MSG_ERRFRAME = PCAN_MESSAGE_ERRFRAME.value
+_MSG_STATUS = PCAN_MESSAGE_STATUS.value
+_MSG_FD = PCAN_MESSAGE_FD.value
+_MSG_BRS = PCAN_MESSAGE_BRS.value
+
+
+def bitrate_bps(bitrate):
+    # PCAN_BAUD_* (ctypes or int) or a CAN FD bitrate string -> (nominal) bits per second, 0 when unknown
+    if is_fd_bitrate(bitrate):
+        return fd_bitrates_bps(bitrate)[0]
+    return BITRATE_BPS.get(getattr(bitrate, "value", bitrate), 0)
+
+
+def fd_frame_bits(extended, length):
+    # -> (bits at the nominal rate, bits at the data rate) of a CAN FD data frame, worst-case stuffing
+    arbitration = 36 if extended else 17  # SOF, ID (SRR, IDE, ID extension), r1, IDE, FDF, res, BRS
+    nominal = arbitration + (arbitration - 1) // 4 + 12  # ACK slot and delimiter, EOF, IFS
+    control = 5 + 8 * length  # ESI, DLC, payload
+    crc = 21 if length > 16 else 17
+    data = control + control // 4 + 4 + crc + (4 + crc) // 4 + 1 + 1  # stuff count, CRC, fixed stuff bits, delimiter
+    return nominal, data
+
+
+class DurationStat:
+    # Last / mean / max of a duration in nanoseconds; mean and max cover the current window
+    __slots__ = ("last_ns", "total_ns", "samples", "max_ns")
+
+    def __init__(self):
+        self.last_ns = 0
+        self.total_ns = 0
+        self.samples = 0
+        self.max_ns = 0
+
+    def add(self, duration_ns):
+        self.last_ns = duration_ns
+        self.total_ns += duration_ns
+        self.samples += 1
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def take(self, scale=1e3):
+        # -> {"last", "mean", "max"} in microseconds (scale=1e3) or milliseconds (scale=1e6); starts a new window
+        result = {
+            "last": round(self.last_ns / scale, 3),
+            "mean": round(self.total_ns / self.samples / scale, 3) if self.samples else 0,
+            "max": round(self.max_ns / scale, 3),
+        }
+        self.total_ns = 0
+        self.samples = 0
+        self.max_ns = 0
+        return result
+
+
+class BusMetrics:
+    # Per-channel counters, updated from that channel's receive thread
+    __slots__ = ("bitrate_bps", "data_bitrate_bps", "_fd_bits", "frames", "bits", "error_frames", "decode_latency",
+                 "_last_time", "_last_frames", "_last_bits", "_last_errors",
+                 "frames_per_s", "bits_per_s", "errors_per_s", "load_pct")
+
+    def __init__(self, bitrate):
+        self.bitrate_bps = bitrate_bps(bitrate)
+        self.data_bitrate_bps = fd_bitrates_bps(bitrate)[1] if is_fd_bitrate(bitrate) else self.bitrate_bps
+        # PCAN_MESSAGE_EXTENDED | PCAN_MESSAGE_BRS bits -> FD frame length in nominal bit times per payload length
+        self._fd_bits = {}
+        for flags in (0, _MSG_EXTENDED, _MSG_BRS, _MSG_EXTENDED | _MSG_BRS):
+            ratio = self.bitrate_bps / self.data_bitrate_bps if flags & _MSG_BRS and self.data_bitrate_bps else 1
+            self._fd_bits[flags] = tuple(round(nominal + data * ratio) for nominal, data in
+                                         (fd_frame_bits(flags & _MSG_EXTENDED, length) for length in range(65)))
+        self.frames = 0
+        self.bits = 0
+        self.error_frames = 0
+        self.decode_latency = DurationStat()  # Read() returned -> frame decoded / handed over
+        self._last_time = time.monotonic()
+        self._last_frames = 0
+        self._last_bits = 0
+        self._last_errors = 0
+        self.frames_per_s = 0.0
+        self.bits_per_s = 0.0
+        self.errors_per_s = 0.0
+        self.load_pct = 0.0
+
+    def count(self, msg_type, dlc):
+        if msg_type & _MSG_ERRFRAME:
+            self.error_frames += 1
+        elif not msg_type & _MSG_STATUS:
+            self.frames += 1
+            if msg_type & _MSG_FD:
+                self.bits += self._fd_bits[msg_type & (_MSG_EXTENDED | _MSG_BRS)][dlc]
+            else:
+                self.bits += (_EXTENDED_BITS if msg_type & _MSG_EXTENDED else _STANDARD_BITS)[
+                    0 if msg_type & _MSG_RTR else min(dlc, 8)]
+
+    def sample(self):
+        # Rates since the previous sample
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        if elapsed > 0:
+            frames, bits, errors = self.frames, self.bits, self.error_frames
+            self.frames_per_s = (frames - self._last_frames) / elapsed
+            self.bits_per_s = (bits - self._last_bits) / elapsed
+            self.errors_per_s = (errors - self._last_errors) / elapsed
+            self.load_pct = 100.0 * self.bits_per_s / self.bitrate_bps if self.bitrate_bps else 0.0
+            self._last_time = now
+            self._last_frames = frames
+            self._last_bits = bits
+            self._last_errors = errors
@@ -0,0 +1,92 @@
+from PCANBasic import *
+
+
+# CAN FD helpers shared by the backends, the engine, capture and replay.
+# Inside the monitor a frame's "dlc" is its payload length in bytes (0..8 classic, up to 64 for
+# CAN FD); TPCANMsgFD.DLC holds the 4-bit length code and is converted with the tables below.
+#
+# FD channels are initialized with a PCAN-Basic bitrate string that sets the nominal
+# (arbitration) and the data phase timing, e.g. for 500 kbit/s / 2 Mbit/s at 80 MHz:
+#   f_clock_mhz=80, nom_brp=1, nom_tseg1=127, nom_tseg2=32, nom_sjw=32, data_brp=1, data_tseg1=29, data_tseg2=10, data_sjw=10
+# fd_bitrate() computes one from the two bit rates (sample points 80 % nominal, 75 % data);
+# parse_fd_bitrate() accepts "500K/2M" or a complete PCAN-Basic string.
+
+FD_LENGTHS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64)  # DLC code -> payload bytes
+FD_DLC = tuple(next(dlc for dlc, length in enumerate(FD_LENGTHS) if length >= size) for size in range(65))  # bytes -> DLC code
+FD_CLOCK_MHZ = 80
+
+# PCAN-Basic limits of the timing fields
+_NOMINAL_LIMITS = (256, 128, 128)  # tseg1, tseg2, sjw
+_DATA_LIMITS = (32, 16, 16)
+
+
+def is_fd_bitrate(bitrate):
+    # Classic bit rates are PCAN_BAUD_* values, FD bit rates are strings
+    return isinstance(bitrate, (str, bytes))
+
+
+def parse_rate(text):
+    # "500K", "2M", "2000000" -> bit/s
+    text = text.strip().upper()
+    scale = {"K": 1_000, "M": 1_000_000}.get(text[-1:], 1)
+    if scale != 1:
+        text = text[:-1]
+    return int(round(float(text) * scale))
+
+
+def _timing(clock_hz, bitrate, sample_point, limits):
+    # Smallest prescaler with a whole number of time quanta per bit inside the limits -> (brp, tseg1, tseg2, sjw)
+    max_tseg1, max_tseg2, max_sjw = limits
+    for brp in range(1, 1025):
+        quanta, remainder = divmod(clock_hz, brp * bitrate)
+        if quanta < 4:
+            break
+        if remainder or quanta > 1 + max_tseg1 + max_tseg2:
+            continue
+        tseg2 = max(1, round(quanta * (1 - sample_point)))
+        tseg1 = quanta - 1 - tseg2
+        if tseg1 <= max_tseg1 and tseg2 <= max_tseg2:
+            return brp, tseg1, tseg2, min(tseg2, max_sjw)
+    raise ValueError(f"No bit timing for {bitrate} bit/s with a {clock_hz // 1_000_000} MHz clock")
+
+
+def fd_bitrate(nominal_bps, data_bps, clock_mhz=FD_CLOCK_MHZ):
+    # -> PCAN-Basic FD bitrate string; raises ValueError when the clock cannot produce the rates
+    clock_hz = clock_mhz * 1_000_000
+    nom_brp, nom_tseg1, nom_tseg2, nom_sjw = _timing(clock_hz, nominal_bps, 0.8, _NOMINAL_LIMITS)
+    data_brp, data_tseg1, data_tseg2, data_sjw = _timing(clock_hz, data_bps, 0.75, _DATA_LIMITS)
+    return (f"f_clock_mhz={clock_mhz}, nom_brp={nom_brp}, nom_tseg1={nom_tseg1}, nom_tseg2={nom_tseg2}, "
+            f"nom_sjw={nom_sjw}, data_brp={data_brp}, data_tseg1={data_tseg1}, data_tseg2={data_tseg2}, "
+            f"data_sjw={data_sjw}")
+
+
+def parse_fd_bitrate(text):
+    # "500K/2M" or a PCAN-Basic FD bitrate string -> PCAN-Basic FD bitrate string; raises ValueError
+    if "=" in text:
+        fd_bitrates_bps(text)  # Validates the fields
+        return text.strip()
+    nominal, sep, data = text.partition("/")
+    if not sep:
+        raise ValueError(f"Invalid CAN FD bitrate (NOMINAL/DATA, e.g. 500K/2M): {text}")
+    return fd_bitrate(parse_rate(nominal), parse_rate(data))
+
+
+def fd_bitrates_bps(bitrate):
+    # PCAN-Basic FD bitrate string -> (nominal, data) in bit/s; raises ValueError
+    if isinstance(bitrate, bytes):
+        bitrate = bitrate.decode()
+    fields = {}
+    for item in bitrate.split(","):
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid CAN FD bitrate: {bitrate}")
+        fields[key.strip()] = int(value)
+    try:
+        clock_hz = fields["f_clock_mhz"] * 1_000_000 if "f_clock_mhz" in fields else fields["f_clock"]
+        nominal = clock_hz // (fields["nom_brp"] * (1 + fields["nom_tseg1"] + fields["nom_tseg2"]))
+        if "data_brp" not in fields:
+            return nominal, nominal
+        data = clock_hz // (fields["data_brp"] * (1 + fields["data_tseg1"] + fields["data_tseg2"]))
+    except (KeyError, ZeroDivisionError) as e:
+        raise ValueError(f"Invalid CAN FD bitrate: {bitrate}") from e
+    return nominal, data
@@ -0,0 +1,169 @@
+import ctypes
+import os
+import struct
+import threading
+
+
+# Binary capture recorder.
+# The receive thread packs every raw frame into a preallocated ring of fixed-width records;
+# a background writer thread flushes the ring to disk in batches and rotates the output
+# file when it reaches max_bytes. The ring is single-producer/single-consumer: only the
+# receive thread advances the head and only the writer advances the tail.
+#
+# File layout: FILE_HEADER followed by RECORD-sized records
+#   timestamp_us  u64  hardware timestamp from TPCANTimestamp in microseconds
+#   can_id        u32
+#   msg_type      u8   PCAN_MESSAGE_* flags
+#   dlc           u8
+#   channel       u8   index of the receiving channel (version 1 files: padding, always 0)
+#   (padding)     1 byte
+#   data          8 bytes, 64 in CAN FD captures (the record size in the header tells them apart)
+#
+# dlc is the payload length in bytes, up to 64 for CAN FD frames.
+
+CAPTURE_MAGIC = b"CANCAP"
+CAPTURE_VERSION = 2
+CAPTURE_VERSIONS = (1, 2)  # Same record size; version 1 had no channel byte
+CAPTURE_EXTENSION = ".cancap"
+FILE_HEADER = struct.Struct("<6sHH6x")  # magic, version, record size
+RECORD = struct.Struct("<QIBBBx8s")
+RECORD_HEADER = struct.Struct("<QIBBBx")
+DATA_OFFSET = RECORD_HEADER.size
+DATA_SIZE = 8
+RECORD_FD = struct.Struct("<QIBBBx64s")
+FD_DATA_SIZE = 64
+RECORD_FORMATS = {RECORD.size: RECORD, RECORD_FD.size: RECORD_FD}  # record size in the file header -> layout
+
+
+class CaptureRecorder:
+    def __init__(self, path, capacity=1 << 16, batch_records=4096, flush_interval=0.1,
+                 max_bytes=512 * 1024 * 1024, max_files=0, fd=False):
+        self.path = path
+        self.capacity = capacity
+        self.batch_records = batch_records
+        self.flush_interval = flush_interval  # seconds
+        self.max_bytes = max_bytes  # rotate after this many bytes per file, 0 = never
+        self.max_files = max_files  # keep at most this many rotated files, 0 = keep all
+        self.fd = fd  # 64-byte records for CAN FD payloads; classic records keep the first 8 bytes
+        self.record_format = RECORD_FD if fd else RECORD
+        self.record_size = self.record_format.size
+        self.data_size = FD_DATA_SIZE if fd else DATA_SIZE
+
+        self._buffer = bytearray(capacity * self.record_size)
+        self._address = ctypes.addressof((ctypes.c_char * len(self._buffer)).from_buffer(self._buffer))
+        self._head = 0  # Records written by the receive thread (monotonic)
+        self._tail = 0  # Records flushed by the writer thread (monotonic)
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._file = None
+        self._file_bytes = 0
+        self._file_index = 0
+        self.files = []
+
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+    # -------------------------------------------------- Control ----------------------------------------------------- #
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._open_next_file()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._close_file()
+    # ---------------------------------------------------------------------------------------------------------------- #
+
+    @property
+    def backlog(self):
+        # Records in the ring not written yet
+        return self._head - self._tail
+
+    def record(self, timestamp_us, can_id, msg_type, dlc, data, channel=0):
+        # Called from a single producer thread for every frame; data may be a ctypes array or bytes
+        head = self._head
+        if head - self._tail >= self.capacity:
+            self.dropped += 1
+            self._wakeup.set()
+            return
+        offset = (head % self.capacity) * self.record_size
+        data_size = self.data_size
+        if len(data) >= data_size:
+            # Copy straight from the receive buffer, no intermediate bytes object
+            RECORD_HEADER.pack_into(self._buffer, offset, timestamp_us, can_id, msg_type, dlc, channel)
+            ctypes.memmove(self._address + offset + DATA_OFFSET, data, data_size)
+        else:
+            self.record_format.pack_into(self._buffer, offset, timestamp_us, can_id, msg_type, dlc, channel,
+                                         bytes(data))
+        self._head = head + 1
+        self.recorded += 1
+        if head + 1 - self._tail == self.batch_records:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            running = self._running
+            self._flush()
+            if not running:
+                self._flush()
+                return
+
+    def _flush(self):
+        head = self._head
+        tail = self._tail
+        record_size = self.record_size
+        view = memoryview(self._buffer)
+        while tail < head:
+            # Rotate lazily so a full file is only followed by a new one when there is data for it
+            if self.max_bytes and self._file_bytes >= self.max_bytes:
+                self._open_next_file()
+            start = tail % self.capacity
+            # Write up to the end of the ring in one go, then wrap
+            count = min(head - tail, self.capacity - start)
+            if self.max_bytes:
+                room = max(1, (self.max_bytes - self._file_bytes) // record_size)
+                count = min(count, room)
+            chunk = view[start * record_size:(start + count) * record_size]
+            self._file.write(chunk)
+            self._file_bytes += len(chunk)
+            self.bytes_written += len(chunk)
+            tail += count
+            self._tail = tail
+        view.release()
+        if self._file:
+            self._file.flush()
+
+    def _open_next_file(self):
+        self._close_file()
+        stem, ext = os.path.splitext(self.path)
+        path = f"{stem}_{self._file_index:04d}{ext or CAPTURE_EXTENSION}"
+        self._file_index += 1
+        self._file = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, self.record_size))
+        self._file_bytes = FILE_HEADER.size
+        self.files.append(path)
+        if self.max_files and len(self.files) > self.max_files:
+            os.remove(self.files.pop(0))
+
+    def _close_file(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def pcan_timestamp_us(timestamp):
+    # Total microseconds of a TPCANTimestamp
+    return timestamp.micros + 1000 * timestamp.millis + 0x100000000 * 1000 * timestamp.millis_overflow
@@ -0,0 +1,95 @@
+from bisect import bisect_right
+
+
+# Per-ID cycle-time statistics in integer microseconds.
+# Every frame costs one subtraction, a few compares and adds and one bisect over the jitter
+# bucket edges; memory per ID is fixed (a handful of ints plus one counter per bucket). Sums are
+# exact Python ints, so mean and standard deviation do not drift on long runs.
+#
+# Jitter is the interval minus the expected cycle time: the DBC's GenMsgCycleTime when the
+# message declares one, the running mean otherwise. Against a declared cycle time an interval
+# of about n cycles counts n - 1 missing frames, and an interval longer than the cycle time
+# plus late_tolerance_pct percent (but too short to be a missing frame) counts as late.
+
+DEFAULT_JITTER_EDGES_US = (-1000, -500, -200, -100, -50, 50, 100, 200, 500, 1000)
+
+
+class CycleStatsConfig:
+    __slots__ = ("jitter_edges_us", "late_tolerance_pct")
+
+    def __init__(self, jitter_edges_us=DEFAULT_JITTER_EDGES_US, late_tolerance_pct=10):
+        self.jitter_edges_us = tuple(sorted(jitter_edges_us))  # Bucket i: edges[i - 1] <= jitter < edges[i]
+        self.late_tolerance_pct = late_tolerance_pct
+
+    def bucket_labels(self):
+        edges = self.jitter_edges_us
+        labels = [f"<{edges[0]}"] if edges else ["all"]
+        labels += [f"{low}..{high}" for low, high in zip(edges, edges[1:])]
+        if edges:
+            labels.append(f">={edges[-1]}")
+        return labels
+
+
+class CycleStats:
+    __slots__ = ("config", "expected_us", "last_us", "interval_us", "samples", "total_us", "total_sq",
+                 "min_us", "max_us", "histogram", "missing", "late")
+
+    def __init__(self, config, expected_us=0):
+        self.config = config
+        self.expected_us = expected_us  # 0: no cycle time in the DBC
+        self.last_us = None
+        self.interval_us = 0  # Last interval
+        self.samples = 0
+        self.total_us = 0
+        self.total_sq = 0
+        self.min_us = 0
+        self.max_us = 0
+        self.histogram = [0] * (len(config.jitter_edges_us) + 1)
+        self.missing = 0
+        self.late = 0
+
+    def add(self, timestamp_us):
+        last = self.last_us
+        self.last_us = timestamp_us
+        if last is None:
+            return
+        interval = timestamp_us - last
+        self.interval_us = interval
+        if not self.samples:
+            self.min_us = self.max_us = interval
+        elif interval < self.min_us:
+            self.min_us = interval
+        elif interval > self.max_us:
+            self.max_us = interval
+        self.samples += 1
+        self.total_us += interval
+        self.total_sq += interval * interval
+
+        expected = self.expected_us
+        if expected:
+            self.histogram[bisect_right(self.config.jitter_edges_us, interval - expected)] += 1
+            skipped = (interval + expected // 2) // expected - 1
+            if skipped > 0:
+                self.missing += skipped
+            elif interval * 100 > expected * (100 + self.config.late_tolerance_pct):
+                self.late += 1
+        else:
+            self.histogram[bisect_right(self.config.jitter_edges_us, interval - self.total_us // self.samples)] += 1
+
+    @property
+    def mean_us(self):
+        return self.total_us / self.samples if self.samples else 0
+
+    @property
+    def std_us(self):
+        if self.samples < 2:
+            return 0
+        n = self.samples
+        return max(self.total_sq * n - self.total_us * self.total_us, 0) ** 0.5 / n
+
+    def copy(self):
+        stats = CycleStats.__new__(CycleStats)
+        for name in self.__slots__:
+            setattr(stats, name, getattr(self, name))
+        stats.histogram = list(self.histogram)
+        return stats
@@ -0,0 +1,219 @@
+import gc
+import hashlib
+import marshal
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import cantools
+from decoder_table import DecoderTable, add_compiled_code
+
+
+# DBC loading with an on-disk cache and change detection.
+# The cache holds the parsed cantools database plus the compiled decode functions of its
+# DecoderTable (marshal'd code objects), keyed by the SHA-256 of the file contents, so a warm
+# start skips both the DBC parser and compile(). The key also covers the cache format, the
+# cantools version and the Python bytecode tag, so upgrading either just misses the cache.
+# Any problem with the cache (missing, truncated, written by another version) falls back to a
+# normal parse; the cache is rewritten atomically after the parse.
+#
+# Parsing and unpickling a large DBC create millions of small objects, and with the cyclic GC
+# running most of the time goes into collector passes, so both run with the GC paused.
+#
+# DatabaseWatcher polls a DBC for changes and hands a freshly loaded database to a callback
+# (MonitorEngine.reload_database swaps it in without stopping reception).
+
+CACHE_FORMAT = 1
+CACHE_EXTENSION = ".dbcache"
+MAX_CACHE_FILES = 32  # Older cache files are removed when a new one is written
+
+
+def default_cache_dir():
+    # $CAN_MONITOR_CACHE, else the platform's user cache directory
+    path = os.environ.get("CAN_MONITOR_CACHE")
+    if path:
+        return path
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "can_monitor")
+
+
+def _paused_gc(function, *args, **kwargs):
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _format_and_encoding(path):
+    # Like cantools.database.load_file: the format follows the extension, DBC/SYM files are cp1252
+    database_format = os.path.splitext(path)[1][1:].lower() or None
+    return database_format, "cp1252" if database_format in ("dbc", "sym") else "utf-8"
+
+
+def cache_key(data, database_format):
+    digest = hashlib.sha256(f"{CACHE_FORMAT}:{cantools.__version__}:{sys.implementation.cache_tag}:"
+                            f"{database_format}:".encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def load_database(path, cache_dir=None, use_cache=True):
+    # -> cantools database; raises OSError and cantools / parser errors like cantools.database.load_file
+    with open(path, "rb") as file:
+        data = file.read()  # Parsed from these bytes, so the key always matches what was parsed
+    database_format, encoding = _format_and_encoding(path)
+    cache_path = None
+    if use_cache:
+        cache_dir = cache_dir or default_cache_dir()
+        cache_path = os.path.join(cache_dir, cache_key(data, database_format) + CACHE_EXTENSION)
+        db = _read_cache(cache_path)
+        if db is not None:
+            return db
+
+    db = _paused_gc(cantools.database.load_string, data.decode(encoding, errors="replace"),
+                    database_format=database_format)
+    if cache_path is not None:
+        try:
+            _write_cache(cache_path, db)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            print(f"DBC cache not written: {e}")
+    return db
+
+
+def _read_cache(cache_path):
+    # -> database, or None when the cache cannot be used
+    try:
+        with open(cache_path, "rb") as file:
+            cache_format, db, code = _paused_gc(pickle.load, file)
+        if cache_format != CACHE_FORMAT:
+            return None
+        add_compiled_code({source: marshal.loads(dumped) for source, dumped in code.items()})
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # A damaged cache is never fatal
+        print(f"Ignoring DBC cache {cache_path}: {e}")
+        return None
+    try:
+        os.utime(cache_path)  # Recently used cache files survive pruning
+    except OSError:
+        pass
+    return db
+
+
+def _write_cache(cache_path, db):
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    code = {source: marshal.dumps(compiled) for source, compiled in DecoderTable(db).code().items()}
+    # Written next to the target and renamed, so readers never see a partial file
+    fd, temporary = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump((CACHE_FORMAT, db, code), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cache_path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+    _prune(cache_dir)
+
+
+def _prune(cache_dir):
+    try:
+        paths = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(CACHE_EXTENSION)]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[MAX_CACHE_FILES:]:
+            os.remove(path)
+    except OSError:
+        pass  # Another process pruned at the same time
+
+
+def clear_cache(cache_dir=None):
+    # -> number of cache files removed
+    cache_dir = cache_dir or default_cache_dir()
+    removed = 0
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith(CACHE_EXTENSION):
+                os.remove(os.path.join(cache_dir, name))
+                removed += 1
+    return removed
+
+
+class DatabaseWatcher:
+    def __init__(self, path, on_reload, on_error=None, interval=1.0, cache_dir=None, use_cache=True):
+        # on_reload(db) / on_error(exception) are called from the watcher thread
+        self.path = path
+        self.on_reload = on_reload
+        self.on_error = on_error
+        self.interval = interval  # seconds between polls
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.reloads = 0
+        self._signature = self._stat()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None  # Missing while an editor replaces it
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                continue
+            # Load once the file stopped changing for one interval; editors and generators write in steps
+            if self._stop.wait(self.interval) or self._stat() != signature:
+                continue
+            self._signature = signature
+            try:
+                db = load_database(self.path, self.cache_dir, self.use_cache)
+            except Exception as e:  # A broken edit keeps the current database
+                if self.on_error is not None:
+                    self.on_error(e)
+                else:
+                    print(f"Cannot reload {self.path}: {e}")
+                continue
+            self.reloads += 1
+            self.on_reload(db)
+
+
+def add_database_arguments(parser, required=False):
+    # Shared by the GUI and the headless CLI
+    help_text = "DBC file used for decoding and transmit encoding"
+    parser.add_argument("--dbc", required=required, help=help_text if required else help_text + " (default: ask for one)")
+    parser.add_argument("--watch-dbc", action="store_true",
+                        help="Reload the DBC when the file changes, without stopping reception")
+    parser.add_argument("--dbc-cache-dir", metavar="DIR",
+                        help=f"Directory of the parsed-DBC cache (default: {default_cache_dir()})")
+    parser.add_argument("--no-dbc-cache", action="store_true", help="Always parse the DBC, do not read or write the cache")
+
+
+def database_options(args):
+    # -> keyword arguments of load_database / DatabaseWatcher
+    return {"cache_dir": args.dbc_cache_dir, "use_cache": not args.no_dbc_cache}
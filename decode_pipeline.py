@@ -0,0 +1,270 @@
+import collections
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from capture import RECORD, RECORD_FD, RECORD_FORMATS
+from bus_metrics import DurationStat
+from decoder_table import DecoderTable
+from snapshot_store import SnapshotStore
+
+
+# Optional multiprocess decode pipeline.
+# The acquisition thread packs raw frames (capture RECORD layout) into batches that live in
+# shared memory, one block of slots per decoder process, and only passes (slot, count) through
+# a queue. Frames are partitioned by CAN ID, so every frame of an ID goes to the same worker in
+# order and the worker's cycle-time statistics stay correct. Workers decode with their own
+# DecoderTable and send back only the snapshots of IDs that changed, which are merged into the
+# engine's SnapshotStore.
+
+
+def _worker_main(index, db, channel_databases, cycle_config, shm_name, slot_records, record_size, tasks, results,
+                 report_interval):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    table = DecoderTable(db)
+    # Channels with their own DBC get their own table, all others share the default one
+    channel_tables = {channel: DecoderTable(channel_db) for channel, channel_db in channel_databases.items()}
+    store = SnapshotStore(cycle_config)
+    update = store.update
+    record = RECORD_FORMATS[record_size]
+    trim = record_size == RECORD_FD.size  # Keep FD payloads at their real length
+    slot_bytes = slot_records * record_size
+    decoded = unknown = errors = 0
+    results.put((index, None, None, 0, 0, 0))  # Ready: the DBC is compiled
+    next_report = time.monotonic() + report_interval
+    try:
+        while True:
+            try:
+                task = tasks.get(timeout=report_interval)
+            except queue.Empty:
+                task = ()
+            if task is None:
+                break
+            freed = None
+            if task == "reset":
+                store.clear()
+            elif task:
+                slot, count = task
+                offset = slot * slot_bytes
+                for timestamp_us, can_id, msg_type, dlc, channel, data in record.iter_unpack(shm.buf[offset:offset + count * record_size]):
+                    if trim:
+                        data = data[:dlc]
+                    decoder = channel_tables.get(channel, table).lookup(can_id)
+                    if decoder is None:
+                        unknown += 1
+                        continue
+                    try:
+                        signal_values = decoder.decode(data)
+                    except Exception:
+                        errors += 1
+                        continue
+                    # Snapshots travel back without the decoder, which does not pickle
+                    update(can_id, msg_type, dlc, data, None, signal_values, timestamp_us, channel, decoder.cycle_time_us)
+                    decoded += 1
+                freed = slot
+
+            # The slot goes back right away; snapshots at most every report_interval
+            now = time.monotonic()
+            changed = None
+            if now >= next_report:
+                changed = store.take_changed()
+                next_report = now + report_interval
+            if freed is not None or changed:
+                results.put((index, freed, changed, decoded, unknown, errors))
+    finally:
+        results.put((index, None, store.take_changed(), decoded, unknown, errors))
+        shm.close()
+
+
+class _Partition:
+    __slots__ = ("process", "tasks", "shm", "view", "free_slots", "slot", "count", "lock", "sent_at")
+
+
+class DecodePipeline:
+    def __init__(self, db, snapshot_store, decoder_table, workers=2, slot_records=1024, slots=64,
+                 report_interval=0.05, channel_databases=None, channel_tables=None, fd=False):
+        if workers < 1:
+            raise ValueError("At least one decoder process is required")
+        self.db = db
+        self.snapshot_store = snapshot_store
+        self.decoder_table = decoder_table  # Parent-side entries attached to merged snapshots
+        self.channel_databases = dict(channel_databases or {})  # channel index -> DBC for channels with their own
+        self.channel_tables = dict(channel_tables or {})  # channel index -> parent-side DecoderTable
+        self.workers = workers
+        self.slot_records = slot_records
+        self.slots = slots  # Batches in flight per worker
+        self.report_interval = report_interval  # seconds
+        self.fd = fd  # 64-byte records for CAN FD payloads
+        self._record = RECORD_FD if fd else RECORD
+        self._slot_bytes = slot_records * self._record.size
+        self._partitions = []
+        self._results = None
+        self._result_thread = None
+        self._running = False
+
+        self.submitted = 0
+        self.dropped = 0  # Frames lost because a worker had no free slot
+        self.decoded = 0
+        self.unknown = 0
+        self.errors = 0
+        self.batch_latency = DurationStat()  # Batch handed to a worker -> its slot came back decoded
+        self._worker_counts = {}
+
+    # -------------------------------------------------- Control ----------------------------------------------------- #
+    def start(self):
+        if self._running:
+            return
+        context = multiprocessing.get_context("spawn")
+        self._results = context.Queue()
+        try:
+            for index in range(self.workers):
+                partition = _Partition()
+                partition.process = None
+                partition.shm = shared_memory.SharedMemory(create=True, size=self.slots * self._slot_bytes)
+                partition.view = partition.shm.buf
+                self._partitions.append(partition)  # From here on the segment is released by _discard()
+                partition.tasks = context.Queue()
+                partition.free_slots = collections.deque(range(1, self.slots))
+                partition.slot = 0
+                partition.count = 0
+                partition.lock = threading.Lock()
+                partition.sent_at = [0] * self.slots
+                partition.process = context.Process(
+                    target=_worker_main, daemon=True,
+                    args=(index, self.db, self.channel_databases, self.snapshot_store.cycle_config, partition.shm.name,
+                          self.slot_records, self._record.size, partition.tasks, self._results, self.report_interval))
+                partition.process.start()
+            # Spawning and compiling the DBC takes a while; do not hand out batches before every worker is up
+            self._wait_ready(timeout=60)
+        except BaseException:
+            self._discard()
+            raise
+        self._running = True
+        self._result_thread = threading.Thread(target=self._collect, daemon=True)
+        self._result_thread.start()
+
+    def stop(self):
+        if not self._running:
+            return
+        self.flush()
+        self._running = False
+        for partition in self._partitions:
+            partition.tasks.put(None)
+        for partition in self._partitions:
+            partition.process.join(timeout=5)
+            if partition.process.is_alive():
+                partition.process.terminate()
+        self._results.put(None)
+        self._result_thread.join(timeout=5)
+        for partition in self._partitions:
+            partition.view.release()
+            partition.shm.close()
+            partition.shm.unlink()
+        self._partitions = []
+
+    def _wait_ready(self, timeout):
+        # Raises RuntimeError when a worker exits or stays silent before reporting ready
+        deadline = time.monotonic() + timeout
+        ready = set()
+        while len(ready) < self.workers:
+            try:
+                ready.add(self._results.get(timeout=0.5)[0])
+                continue
+            except queue.Empty:
+                pass
+            for index, partition in enumerate(self._partitions):
+                if index not in ready and not partition.process.is_alive():
+                    raise RuntimeError(f"Decoder process {index} exited with code {partition.process.exitcode} "
+                                       f"before it was ready")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Decoder processes not ready after {timeout} s ({len(ready)} of {self.workers})")
+
+    def _discard(self):
+        # Failed start: no batch was handed out, so the workers are terminated and the segments removed at once
+        for partition in self._partitions:
+            if partition.process is not None and partition.process.is_alive():
+                partition.process.terminate()
+        for partition in self._partitions:
+            if partition.process is not None and partition.process.pid is not None:
+                partition.process.join(timeout=5)
+            partition.view.release()
+            partition.shm.close()
+            partition.shm.unlink()
+        self._partitions = []
+        self._results.close()
+        self._results = None
+
+    def reset(self):
+        for partition in self._partitions:
+            partition.tasks.put("reset")
+    # ---------------------------------------------------------------------------------------------------------------- #
+
+    def submit(self, timestamp_us, can_id, msg_type, dlc, data, channel=0):
+        # Called from the acquisition thread(s); data may be a ctypes array or bytes
+        if not self._running:
+            return
+        # Same ID on any channel goes to the same worker, which keeps the order per (channel, ID)
+        partition = self._partitions[can_id % self.workers]
+        with partition.lock:
+            if partition.slot is None:
+                partition.slot = self._next_slot(partition)
+                if partition.slot is None:
+                    self.dropped += 1
+                    return
+            record = self._record
+            offset = partition.slot * self._slot_bytes + partition.count * record.size
+            record.pack_into(partition.view, offset, timestamp_us, can_id, msg_type, dlc, channel, bytes(data))
+            partition.count += 1
+            self.submitted += 1
+            if partition.count == self.slot_records:
+                self._send(partition)
+
+    def flush(self):
+        # Hand over partially filled batches, e.g. after every drain of the driver queue
+        for partition in self._partitions:
+            if partition.count:
+                with partition.lock:
+                    if partition.count:
+                        self._send(partition)
+
+    @property
+    def in_flight(self):
+        # Batches handed to the workers and not decoded yet
+        return sum(self.slots - 1 - len(partition.free_slots) for partition in self._partitions)
+
+    def _send(self, partition):
+        partition.sent_at[partition.slot] = time.perf_counter_ns()
+        partition.tasks.put((partition.slot, partition.count))
+        partition.slot = self._next_slot(partition)
+        partition.count = 0
+
+    @staticmethod
+    def _next_slot(partition):
+        try:
+            return partition.free_slots.popleft()
+        except IndexError:
+            return None
+
+    def _collect(self):
+        table = self.decoder_table
+        channel_tables = self.channel_tables
+        store = self.snapshot_store
+        while True:
+            result = self._results.get()
+            if result is None:
+                return
+            index, freed, changed, decoded, unknown, errors = result
+            if freed is not None:
+                partition = self._partitions[index]
+                self.batch_latency.add(time.perf_counter_ns() - partition.sent_at[freed])
+                partition.free_slots.append(freed)
+            if changed:
+                for snapshot in changed:
+                    snapshot.decoder = channel_tables.get(snapshot.channel, table).lookup(snapshot.can_id)
+                store.replace_many(changed)
+            self._worker_counts[index] = (decoded, unknown, errors)
+            counts = list(self._worker_counts.values())
+            self.decoded = sum(c[0] for c in counts)
+            self.unknown = sum(c[1] for c in counts)
+            self.errors = sum(c[2] for c in counts)
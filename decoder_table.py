@@ -0,0 +1,123 @@
+# Precompiled per-ID decoder table built once from the DBC.
+# Each entry keeps the message name, the signal layout and a generated decode function that
+# extracts all signals with precomputed shifts and masks and returns the values as a tuple
+# ordered like entry.signal_names. Messages the fast path cannot handle (multiplexed messages,
+# IEEE float signals) fall back to cantools' own decoder but keep the same interface.
+# Generated functions are compiled once per distinct source; dbc_cache.py stores the code objects
+# next to the parsed DBC, so a warm start does not compile them again.
+
+# Generated source -> code object, shared by every table in the process
+_compiled = {}
+
+
+def compiled_code(source):
+    code = _compiled.get(source)
+    if code is None:
+        code = _compiled[source] = compile(source, "<decoder>", "exec")
+    return code
+
+
+def add_compiled_code(code_by_source):
+    # Code objects loaded from a cache; the source is the key, so a stale entry is simply never used
+    _compiled.update(code_by_source)
+
+
+class DecoderEntry:
+    __slots__ = ("frame_id", "name", "length", "cycle_time_us", "message", "signals", "signal_names",
+                 "source", "_layout", "_has_big_endian", "_fallback", "decode")
+
+    def __init__(self, message):
+        self.frame_id = message.frame_id
+        self.name = message.name
+        self.length = message.length
+        self.cycle_time_us = (message.cycle_time or 0) * 1000  # GenMsgCycleTime, 0 when not declared
+        self.message = message
+        self.signals = tuple(message.signals)
+        self.signal_names = tuple(signal.name for signal in self.signals)
+
+        self._fallback = message.is_multiplexed() or any(signal.is_float for signal in self.signals)
+        self.source = None  # Generated decode function, None on the fallback path
+        if self._fallback:
+            self._layout = ()
+            self._has_big_endian = False
+            self.decode = self._decode_generic
+        else:
+            self._layout = tuple(self._compile_signal(signal) for signal in self.signals)
+            self._has_big_endian = any(big_endian for big_endian, *_ in self._layout)
+            self.decode = self._build_decode()
+
+    def _compile_signal(self, signal):
+        # (big_endian, shift, mask, sign_bit, scale, offset, choices)
+        mask = (1 << signal.length) - 1
+        if signal.byte_order == "little_endian":
+            big_endian = False
+            shift = signal.start
+        else:
+            # Motorola start bit -> bit position counted from the MSB of byte 0
+            big_endian = True
+            msb_position = 8 * (signal.start // 8) + (7 - signal.start % 8)
+            shift = 8 * self.length - msb_position - signal.length
+        sign_bit = (1 << (signal.length - 1)) if signal.is_signed else 0
+        choices = dict(signal.choices) if signal.choices else None
+        return big_endian, shift, mask, sign_bit, signal.scale, signal.offset, choices
+
+    def _build_decode(self):
+        # Generate one straight-line function per message so the hot path has no per-signal loop
+        lines = ["def decode(data):",
+                 f"    if len(data) < {self.length}:",
+                 "        return generic(data)",
+                 f"    data = data[:{self.length}]",
+                 "    little = from_bytes(data, 'little')"]
+        if self._has_big_endian:
+            lines.append("    big = from_bytes(data, 'big')")
+        namespace = {"from_bytes": int.from_bytes, "generic": self._decode_generic}
+        results = []
+        for index, (big_endian, shift, mask, sign_bit, scale, offset, choices) in enumerate(self._layout):
+            raw = f"r{index}"
+            source = "big" if big_endian else "little"
+            lines.append(f"    {raw} = ({source} >> {shift}) & {mask:#x}" if shift else f"    {raw} = {source} & {mask:#x}")
+            if sign_bit:
+                lines.append(f"    if {raw} & {sign_bit:#x}:")
+                lines.append(f"        {raw} -= {sign_bit << 1:#x}")
+            value = raw
+            if not (scale == 1 and isinstance(scale, int)):
+                value = f"{value} * {scale!r}"
+            if not (offset == 0 and isinstance(offset, int)):
+                value = f"{value} + {offset!r}"
+            if choices is not None:
+                namespace[f"c{index}"] = choices
+                value = f"(c{index}[{raw}] if {raw} in c{index} else {value})"
+            results.append(value)
+        lines.append(f"    return ({', '.join(results)}{',' if len(results) == 1 else ''})")
+        self.source = "\n".join(lines)
+        exec(compiled_code(self.source), namespace)
+        return namespace["decode"]
+
+    def _decode_generic(self, data):
+        decoded = self.message.decode(data)
+        return tuple(decoded.get(name) for name in self.signal_names)
+
+    def decode_dict(self, data):
+        return dict(zip(self.signal_names, self.decode(data)))
+
+
+class DecoderTable:
+    def __init__(self, db):
+        self.entries = {}
+        self.unknown_ids = {}  # Negative lookup cache: CAN ID -> number of frames seen
+        for message in db.messages:
+            self.entries[message.frame_id] = DecoderEntry(message)
+
+    def code(self):
+        # Generated source -> code object of every fast-path entry, for dbc_cache.py
+        return {entry.source: compiled_code(entry.source) for entry in self.entries.values() if entry.source}
+
+    def lookup(self, frame_id):
+        entry = self.entries.get(frame_id)
+        if entry is None:
+            # Cache the miss so unknown IDs stay a single dict hit
+            self.unknown_ids[frame_id] = self.unknown_ids.get(frame_id, 0) + 1
+        return entry
+
+    def __len__(self):
+        return len(self.entries)
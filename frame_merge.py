@@ -0,0 +1,139 @@
+import threading
+import time
+from array import array
+
+
+# Timestamp-ordered merge of frames from several receive threads.
+# Each channel thread appends its frames to its own preallocated ring, stored as parallel arrays
+# (timestamp, ID, type, length) plus a list holding the payload bytes objects, so a frame costs no
+# tuple or heap entry. One merge thread repeatedly releases the oldest head frame of all rings
+# once the newest timestamp seen is more than window_us ahead of it, so frames read from
+# different channels a few poll intervals apart still come out in bus order. When no frames
+# arrive for a whole window the rings are flushed completely. The sink is called only from the
+# merge thread, which makes it the single producer for the capture ring.
+# Timestamps are expected to rise within a channel (hardware timestamps do); a full ring drops
+# the frame and counts it.
+
+
+class _ChannelRing:
+    # Single producer (the channel's receive thread), single consumer (the merge thread)
+    __slots__ = ("channel", "timestamps", "ids", "types", "lengths", "data", "head", "tail", "seen", "limit")
+
+    def __init__(self, channel, capacity):
+        self.channel = channel
+        self.timestamps = array("Q", bytes(8 * capacity))
+        self.ids = array("I", bytes(4 * capacity))
+        self.types = array("B", bytes(capacity))
+        self.lengths = array("B", bytes(capacity))
+        self.data = [None] * capacity
+        self.head = 0  # Frames written
+        self.tail = 0  # Frames released
+        self.seen = 0  # head at the previous merge pass
+        self.limit = 0  # head at the start of the current merge pass
+
+
+class FrameMerger:
+    def __init__(self, sink, window_us=50_000, interval=0.005, capacity=1 << 16):
+        self.sink = sink  # sink(timestamp_us, can_id, msg_type, dlc, data, channel)
+        self.window_us = window_us
+        self.interval = interval  # seconds between merge passes
+        self.capacity = capacity  # frames per channel ring
+        self._rings = {}  # channel index -> _ChannelRing
+        self._stop = threading.Event()
+        self._thread = None
+        self._newest = 0  # Newest hardware timestamp seen
+        self._last_arrival = 0.0  # time.monotonic() of the last merge pass that received frames
+        self._last_emitted = 0
+
+        self.merged = 0
+        self.late = 0  # Frames that arrived after a newer frame had already been released
+        self.dropped = 0  # Frames lost to a full ring
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        self._merge(flush=True)
+
+    @property
+    def backlog(self):
+        # Frames not released to the sink yet
+        return sum(ring.head - ring.tail for ring in list(self._rings.values()))
+
+    def push(self, timestamp_us, can_id, msg_type, dlc, data, channel):
+        # Called from the channel receive threads; data must be bytes the caller does not reuse
+        ring = self._rings.get(channel)
+        if ring is None:
+            ring = self._rings[channel] = _ChannelRing(channel, self.capacity)
+        head = ring.head
+        if head - ring.tail >= self.capacity:
+            self.dropped += 1
+            return
+        slot = head % self.capacity
+        ring.timestamps[slot] = timestamp_us
+        ring.ids[slot] = can_id
+        ring.types[slot] = msg_type
+        ring.lengths[slot] = dlc
+        ring.data[slot] = data
+        ring.head = head + 1  # Published last: the merge thread only reads slots below head
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._merge()
+
+    def _merge(self, flush=False):
+        capacity = self.capacity
+        # Frames pushed after this snapshot of the heads wait for the next pass
+        pending = []
+        newest = None
+        for ring in list(self._rings.values()):
+            head = ring.limit = ring.head
+            if head > ring.seen:
+                timestamp_us = ring.timestamps[(head - 1) % capacity]  # Newest frame of the channel
+                if newest is None or timestamp_us > newest:
+                    newest = timestamp_us
+                ring.seen = head
+            if head > ring.tail:
+                pending.append(ring)
+        now = time.monotonic()
+        if newest is not None:
+            self._last_arrival = now
+            if newest > self._newest:
+                self._newest = newest
+        elif now - self._last_arrival >= self.window_us / 1e6:
+            # Quiet for a whole window: nothing older can still be in flight
+            flush = True
+
+        release_until = None if flush else self._newest - self.window_us
+        sink = self.sink
+        while pending:
+            # Oldest head frame over all channels; ties keep the channel order
+            oldest = None
+            oldest_us = 0
+            for ring in pending:
+                timestamp_us = ring.timestamps[ring.tail % capacity]
+                if oldest is None or timestamp_us < oldest_us:
+                    oldest = ring
+                    oldest_us = timestamp_us
+            if release_until is not None and oldest_us > release_until:
+                break
+            slot = oldest.tail % capacity
+            data = oldest.data[slot]
+            oldest.data[slot] = None
+            if oldest_us < self._last_emitted:
+                self.late += 1
+            else:
+                self._last_emitted = oldest_us
+            sink(oldest_us, oldest.ids[slot], oldest.types[slot], oldest.lengths[slot], data, oldest.channel)
+            oldest.tail += 1  # The slot may be overwritten from here on
+            self.merged += 1
+            if oldest.tail == oldest.limit:
+                pending.remove(oldest)
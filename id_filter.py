@@ -0,0 +1,165 @@
+from PCANBasic import *
+
+
+# CAN ID acceptance filtering.
+# An IdFilter is a list of rules, each either an ID range or a code/mask pair, for standard or
+# extended frames. It is applied twice:
+#   - in the driver: every rule is widened to the ID range it covers and passed to
+#     FilterMessages; a type with a single mask rule also gets the controller's
+#     PCAN_ACCEPTANCE_FILTER_11BIT/29BIT code/mask. Both may let extra frames through (the
+#     driver merges ranges into one), and backends without driver filters ignore them;
+#   - in the receive thread as an exact software prefilter in front of recording and decoding.
+#     Decisions are cached per ID, so a frame costs one dict lookup.
+#
+# Rule syntax (comma separated in one string or given one by one):
+#   0x123             one ID
+#   0x100-0x1FF       inclusive range
+#   0x18FF0000/0x1FFF0000   code/mask: accepted when id & mask == code & mask
+#   a trailing "x" marks extended IDs (0x100x); IDs above 0x7FF are extended anyway
+#   dbc               every message ID of the DBC
+
+MAX_STANDARD_ID = 0x7FF
+MAX_EXTENDED_ID = 0x1FFFFFFF
+
+_MSG_EXTENDED = PCAN_MESSAGE_EXTENDED.value
+_CACHE_LIMIT = 1 << 16
+
+
+class IdRule:
+    __slots__ = ("extended", "low", "high", "code", "mask")
+
+    def __init__(self, extended, low=None, high=None, code=None, mask=None):
+        self.extended = extended
+        self.low = low  # Range rule
+        self.high = high
+        self.code = code  # Mask rule
+        self.mask = mask
+
+    def matches(self, can_id):
+        if self.mask is not None:
+            return can_id & self.mask == self.code & self.mask
+        return self.low <= can_id <= self.high
+
+    def id_range(self):
+        # Smallest range holding every ID the rule accepts
+        if self.mask is None:
+            return self.low, self.high
+        top = MAX_EXTENDED_ID if self.extended else MAX_STANDARD_ID
+        low = self.code & self.mask & top
+        return low, low | (~self.mask & top)
+
+    def __repr__(self):
+        suffix = "x" if self.extended else ""
+        if self.mask is not None:
+            return f"0x{self.code:X}/0x{self.mask:X}{suffix}"
+        if self.low == self.high:
+            return f"0x{self.low:X}{suffix}"
+        return f"0x{self.low:X}-0x{self.high:X}{suffix}"
+
+
+def parse_rule(text):
+    # One rule in the syntax above -> IdRule; raises ValueError
+    text = text.strip()
+    try:
+        rule = _parse_rule(text, False)
+    except ValueError:
+        if text[-1:] not in ("x", "X"):
+            raise
+        rule = _parse_rule(text[:-1], True)  # "0x100x": extended
+    if max(rule.id_range()) > MAX_EXTENDED_ID:
+        raise ValueError(f"ID out of range: {text}")
+    return rule
+
+
+def _parse_rule(text, extended):
+    if "/" in text:
+        code, mask = (int(part, 16) for part in text.split("/", 1))
+        return IdRule(extended or code > MAX_STANDARD_ID or mask > MAX_STANDARD_ID, code=code, mask=mask)
+    low, _, high = text.partition("-")
+    low = int(low, 16)
+    high = int(high, 16) if high else low
+    if high < low:
+        raise ValueError(f"Empty ID range: {text}")
+    return IdRule(extended or high > MAX_STANDARD_ID, low=low, high=high)
+
+
+class IdFilter:
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self._cache = {}
+
+    @classmethod
+    def parse(cls, specs, db=None):
+        # specs: iterable of rule strings (each may hold several comma separated rules)
+        rules = []
+        for spec in specs:
+            for text in spec.split(","):
+                if not text.strip():
+                    continue
+                if text.strip().lower() == "dbc":
+                    if db is None:
+                        raise ValueError("The dbc filter needs a DBC")
+                    rules.extend(cls.from_database(db).rules)
+                else:
+                    rules.append(parse_rule(text))
+        return cls(rules)
+
+    @classmethod
+    def from_database(cls, db):
+        # Exactly the IDs the DBC can decode
+        return cls(IdRule(message.is_extended_frame, low=message.frame_id, high=message.frame_id)
+                   for message in db.messages)
+
+    def accepts(self, can_id, msg_type):
+        key = can_id | 0x80000000 if msg_type & _MSG_EXTENDED else can_id
+        accepted = self._cache.get(key)
+        if accepted is None:
+            extended = key != can_id
+            accepted = any(rule.extended == extended and rule.matches(can_id) for rule in self.rules)
+            if len(self._cache) >= _CACHE_LIMIT:
+                self._cache.clear()
+            self._cache[key] = accepted
+        return accepted
+
+    def apply_to_driver(self, backend, handle):
+        # Pushes the filter into the driver; returns the PCAN status of the first failing call.
+        # A failure opens the driver filter again, so it is either fully applied or not at all and
+        # only means more frames reach the software prefilter.
+        status = self._apply_to_driver(backend, handle)
+        if status != PCAN_ERROR_OK:
+            clear_driver_filter(backend, handle)
+        return status
+
+    def _apply_to_driver(self, backend, handle):
+        status = backend.SetValue(handle, PCAN_MESSAGE_FILTER, PCAN_FILTER_CLOSE)
+        if status != PCAN_ERROR_OK:
+            return status
+        for extended, mode, parameter in ((False, PCAN_MODE_STANDARD, PCAN_ACCEPTANCE_FILTER_11BIT),
+                                          (True, PCAN_MODE_EXTENDED, PCAN_ACCEPTANCE_FILTER_29BIT)):
+            rules = [rule for rule in self.rules if rule.extended == extended]
+            for rule in rules:
+                low, high = rule.id_range()
+                status = backend.FilterMessages(handle, low, high, mode)
+                if status != PCAN_ERROR_OK:
+                    return status
+            if len(rules) == 1 and rules[0].mask is not None:
+                # Controller code/mask (mask bits set = don't care), code in the upper 32 bits
+                top = MAX_EXTENDED_ID if extended else MAX_STANDARD_ID
+                value = (rules[0].code & top) << 32 | (~rules[0].mask & top)
+                status = backend.SetValue(handle, parameter, value)
+                if status != PCAN_ERROR_OK:
+                    return status
+        return PCAN_ERROR_OK
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __repr__(self):
+        return ", ".join(map(repr, self.rules))
+
+
+def clear_driver_filter(backend, handle):
+    # Opens the driver filter and resets the controller code/mask to "accept all"
+    backend.SetValue(handle, PCAN_ACCEPTANCE_FILTER_11BIT, MAX_STANDARD_ID)
+    backend.SetValue(handle, PCAN_ACCEPTANCE_FILTER_29BIT, MAX_EXTENDED_ID)
+    return backend.SetValue(handle, PCAN_MESSAGE_FILTER, PCAN_FILTER_OPEN)
@@ -1,70 +1,92 @@
+import os
 import time
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 from PCANBasic import *
 import cantools
 import uuid
-import threading
-import queue
+import argparse
+from bus_backend import add_backend_arguments, build_backend
+from monitor_engine import MonitorEngine, BAUDRATES
+from capture import CAPTURE_EXTENSION
+from replay import open_trace, TRACE_FILETYPES
+from tx_sequence import SEQUENCE_FILETYPES
+from id_filter import IdFilter
+from dbc_cache import DatabaseWatcher, add_database_arguments, database_options, load_database
+
+DBC_FILETYPES = [("DBC", "*.dbc"), ("All files", "*.*")]
+PLOT_COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf"]
 
 
 class CANBusMonitor:
-    def __init__(self, master):
+    def __init__(self, master, backend=None, dbc_path=None, dbc_options=None, watch_dbc=False):
         self.master = master
         master.title("CAN Bus Monitor")
 
-        # CAN initialization
-        self.m_objPCANBasic = PCANBasic()
+        # DBC from --dbc or picked here; parsed DBCs are cached on disk (dbc_cache.py), so warm starts skip the
+        # parser. Without a DBC the monitor shows raw frames until one is loaded from the toolbar.
+        self.dbc_options = dbc_options or {}
+        self.dbc_path = dbc_path or filedialog.askopenfilename(title="DBC file (Cancel: start without a DBC)",
+                                                               filetypes=DBC_FILETYPES)
+        self.db = self.open_database(self.dbc_path) if self.dbc_path else None
+        if self.db is None:
+            self.dbc_path = None
+            self.db = cantools.database.Database()
+        self.dbc_watcher = None  # Reloads the DBC when the file changes
+        self.watch_dbc = tk.BooleanVar(master, value=watch_dbc)
+
+        # Receive, decode, record and cyclic transmit run in the engine; this class only renders its state
+        self.engine = MonitorEngine(self.db, backend)
+        self.engine.on_transmit_error = self.on_transmit_error
+        self.m_objPCANBasic = self.engine.backend
+        self.PcanHandle = PCAN_USBBUS1  # Default channel
         self.available_channels = self.get_available_channels()
         if not self.available_channels:
             messagebox.showerror("Error", "No PCAN channels available")
         else:
             self.PcanHandle = self.available_channels[0][1]  # Default to first available channel
 
-        self.baudrates = [
-            ("1 MBit/sec", PCAN_BAUD_1M),
-            ("800 kBit/sec", PCAN_BAUD_800K),
-            ("500 kBit/sec", PCAN_BAUD_500K),
-            ("250 kBit/sec", PCAN_BAUD_250K),
-            ("125 kBit/sec", PCAN_BAUD_125K),
-            ("100 kBit/sec", PCAN_BAUD_100K),
-            ("95.238 kBit/sec", PCAN_BAUD_95K),
-            ("83.333 kBit/sec", PCAN_BAUD_83K),
-            ("50 kBit/sec", PCAN_BAUD_50K),
-            ("47.619 kBit/sec", PCAN_BAUD_47K),
-            ("33.333 kBit/sec", PCAN_BAUD_33K),
-            ("20 kBit/sec", PCAN_BAUD_20K),
-            ("10 kBit/sec", PCAN_BAUD_10K),
-            ("5 kBit/sec", PCAN_BAUD_5K)
-        ]
+        self.baudrates = BAUDRATES
 
-        self.PcanHandle = PCAN_USBBUS1  # Default channel
         self.Bitrate = PCAN_BAUD_500K  # Default baudrate
         self.m_initialize = False
         self.m_reading = False
         self.TimerInterval = 10  # milliseconds
+        self.UIRefreshInterval = 50  # milliseconds
 
-        # Replace DBC file path
-        self.db = cantools.database.load_file("D:\Hydrogen_Valley_Power\TOYOTA\can_toyota.dbc")
-
-        # Handle the receiving and transmitting text widget display
-        self.message_handlers = {}
-        for msg in self.db.messages:
-            self.message_handlers[msg.frame_id] = self._create_message_handler(msg)
+        # Event-driven receive: wait on the driver's receive event instead of sleep polling
+        self.rx_event_mode = tk.BooleanVar(master, value=False)
 
         self.last_transmitted_values = {}
 
-        # Tracking the last received time
-        self.last_received_times = {}
+        # Trace replay through the transmit path
+        self.replayer = None
+        self.replay_speeds = [("0.5x", 0.5), ("1x", 1.0), ("2x", 2.0), ("10x", 10.0), ("Max", 0)]
+
+        # Scripted transmit sequence (tx_sequence.py)
+        self.sequence_player = None
 
-        # Attribute to store threads
-        self.receive_thread = None
-        self.transmit_threads = {}
+        self.TransmitDisplayInterval = 0.2  # seconds, 每 200 毫秒更新一次
+        self.last_transmit_display_update = 0
+
+        # Live signal plot: signals are picked by double-clicking them in the details list
+        self.plot_window = None
+        self.plot_spans = [("10 s", 10), ("1 min", 60), ("10 min", 600)]
+        self.PlotRefreshInterval = 0.1  # seconds, redraw at most 10 times per second
+        self.last_plot_update = 0
+        self.plot_layout = None  # (traces, width, height) the canvas items were created for
+        self.plot_items = {}  # SignalTrace -> (line item, label item, lane top y, lane bottom y)
+        self.plot_labels = {}  # SignalTrace -> label text last shown
 
         # Attribute to store receive and transmit message_details_text
-        self.message_details_texts = {}
+        self.tree_item_map = {}  # 新增: (channel, CAN ID) -> Treeview item 映射
 
-        self.tree_item_map = {}  # 新增: CAN ID -> Treeview item 映射
+        # Values last pushed to Tk, so each UI tick only sends the cells that changed
+        self.rendered_rows = {}  # (channel, CAN ID) -> Treeview row values
+        self.rendered_data = {}  # (channel, CAN ID) -> (payload bytes, hex string)
+        self.rendered_details = {}  # (channel, CAN ID) -> (summary, signal rows) shown in the details Treeview
+        self.channel_names = {}  # Channel index -> name shown in the Channel column
+        self.rendered_metrics = None  # engine.metrics() shown in the metrics panel
 
         # Create main frames with specific weight ratios
         self.toolbar_frame = ttk.Frame(master)
@@ -92,7 +114,9 @@ class CANBusMonitor:
         self.start_stop_receive_button.config(state=tk.DISABLED)
         self.global_transmit_button.config(state=tk.DISABLED)
 
-        self.update_queue = queue.Queue()
+        if self.watch_dbc.get():
+            self.start_dbc_watcher()
+
         self.schedule_ui_update()  # 啟動定時更新UI
 
 # -------------------------------------------------- GUI setup ------------------------------------------------------- #
@@ -111,7 +135,7 @@ class CANBusMonitor:
         self.refresh_button.grid(row=0, column=2, padx=2, sticky="w")
 
         ttk.Label(self.toolbar_frame, text="Baudrate:").grid(row=0, column=3, padx=(5, 2), sticky="w")
-        self.baudrate_combobox = ttk.Combobox(self.toolbar_frame, values=[rate[0] for rate in self.baudrates], width=15)
+        self.baudrate_combobox = ttk.Combobox(self.toolbar_frame, values=[rate[0] for rate in self.baudrates], width=20)
         self.baudrate_combobox.grid(row=0, column=4, padx=2, sticky="w")
         self.baudrate_combobox.set("500 kBit/sec")
         self.baudrate_combobox.bind("<<ComboboxSelected>>", self.on_baudrate_change)
@@ -137,6 +161,58 @@ class CANBusMonitor:
         self.start_stop_receive_button = ttk.Button(self.toolbar_frame, text="Start Receiving", command=self.toggle_receive)
         self.start_stop_receive_button.grid(row=0, column=9, padx=(2, 5), sticky="e")
 
+        # Status line: receive statistics
+        self.overrun_label = ttk.Label(self.toolbar_frame, text="Overruns: 0")
+        self.overrun_label.grid(row=1, column=0, columnspan=3, padx=(5, 2), sticky="w")
+
+        self.add_channel_button = ttk.Button(self.toolbar_frame, text="Add Channel", command=self.add_channel,
+                                             state=tk.DISABLED)
+        self.add_channel_button.grid(row=1, column=4, padx=2, sticky="e")
+
+        self.record_button = ttk.Button(self.toolbar_frame, text="Start Recording", command=self.toggle_recording)
+        self.record_button.grid(row=1, column=5, padx=(5, 2), sticky="w")
+
+        self.export_button = ttk.Button(self.toolbar_frame, text="Start Export", command=self.toggle_export)
+        self.export_button.grid(row=1, column=6, padx=2, sticky="w")
+
+        self.rx_event_checkbutton = ttk.Checkbutton(self.toolbar_frame, text="Event-driven receive",
+                                                    variable=self.rx_event_mode, command=self.on_rx_mode_change)
+        self.rx_event_checkbutton.grid(row=1, column=7, columnspan=3, padx=(2, 5), sticky="e")
+
+        # Acceptance filter: pushed to the driver where possible, exact in software
+        ttk.Label(self.toolbar_frame, text="ID filter:").grid(row=2, column=0, padx=(5, 2), sticky="w")
+        self.filter_entry = ttk.Entry(self.toolbar_frame, width=40)
+        self.filter_entry.grid(row=2, column=1, columnspan=3, padx=2, sticky="ew")
+        self.filter_entry.bind("<Return>", lambda event: self.apply_id_filter())
+        self.filter_button = ttk.Button(self.toolbar_frame, text="Apply Filter", command=self.apply_id_filter)
+        self.filter_button.grid(row=2, column=4, padx=2, sticky="w")
+
+        # Trigger capture: conditions separated by ";", e.g. "EngineSpeed>6000; error"
+        ttk.Label(self.toolbar_frame, text="Trigger:").grid(row=2, column=5, padx=(5, 2), sticky="e")
+        self.trigger_entry = ttk.Entry(self.toolbar_frame, width=30)
+        self.trigger_entry.grid(row=2, column=6, columnspan=2, padx=2, sticky="ew")
+        self.trigger_button = ttk.Button(self.toolbar_frame, text="Arm Trigger", command=self.toggle_trigger)
+        self.trigger_button.grid(row=2, column=8, padx=2, sticky="w")
+
+        # Metrics panel: bus load per channel and the monitor's own latencies, refreshed once per second
+        self.metrics_label = ttk.Label(self.toolbar_frame, text="Bus load: -")
+        self.metrics_label.grid(row=3, column=0, columnspan=10, padx=5, sticky="w")
+
+        # DBC: load another one or reload it while receiving; the decoder table is swapped without stopping
+        self.dbc_label = ttk.Label(self.toolbar_frame, text="DBC: -")
+        self.dbc_label.grid(row=4, column=0, columnspan=4, padx=(5, 2), sticky="w")
+        self.load_dbc_button = ttk.Button(self.toolbar_frame, text="Load DBC", command=self.load_dbc)
+        self.load_dbc_button.grid(row=4, column=4, padx=2, sticky="w")
+        self.reload_dbc_button = ttk.Button(self.toolbar_frame, text="Reload DBC", command=self.reload_dbc)
+        self.reload_dbc_button.grid(row=4, column=5, padx=2, sticky="w")
+        self.watch_dbc_checkbutton = ttk.Checkbutton(self.toolbar_frame, text="Reload on change",
+                                                     variable=self.watch_dbc, command=self.on_watch_dbc_change)
+        self.watch_dbc_checkbutton.grid(row=4, column=6, columnspan=2, padx=2, sticky="w")
+        self.update_dbc_label()
+
+        self.plot_button = ttk.Button(self.toolbar_frame, text="Signal Plot", command=self.show_plot_window)
+        self.plot_button.grid(row=4, column=8, columnspan=2, padx=(2, 5), sticky="e")
+
     def create_receive_frame(self):
         self.receive_frame.grid_columnconfigure(0, weight=1)
         self.receive_frame.grid_rowconfigure(0, weight=2)
@@ -148,7 +224,7 @@ class CANBusMonitor:
         tree_frame.grid_rowconfigure(0, weight=1)
         tree_frame.grid_columnconfigure(0, weight=1)
 
-        self.receive_tree = ttk.Treeview(tree_frame, columns=("Msg_Name", "CAN-ID (hex)", "Type", "Length", "Data", "Cycle Time (ms)", "Count"), show="headings")
+        self.receive_tree = ttk.Treeview(tree_frame, columns=("Channel", "Msg_Name", "CAN-ID (hex)", "Type", "Length", "Data", "Cycle Time (ms)", "Count"), show="headings")
         self.receive_tree.grid(row=0, column=0, sticky="nsew")
 
         v_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.receive_tree.yview)
@@ -168,21 +244,29 @@ class CANBusMonitor:
         self.message_details_frame.grid_rowconfigure(0, weight=1)
         self.message_details_frame.grid_columnconfigure(0, weight=1)
 
-        self.details_canvas = tk.Canvas(self.message_details_frame)
-        self.details_canvas.grid(row=0, column=0, sticky="nsew")
+        # One Treeview with a row per CAN ID and its signals as child rows. Tk only draws the rows in
+        # the viewport, and child rows are only refreshed while their message is expanded.
+        self.details_tree = ttk.Treeview(self.message_details_frame, columns=("Value",), show="tree headings")
+        self.details_tree.grid(row=0, column=0, sticky="nsew")
+        self.details_tree.heading("#0", text="Message / Signal")
+        self.details_tree.heading("Value", text="Value")
+        self.details_tree.column("#0", width=300)
+        self.details_tree.column("Value", width=500)
 
-        self.details_v_scrollbar = ttk.Scrollbar(self.message_details_frame, orient="vertical", command=self.details_canvas.yview)
+        self.details_v_scrollbar = ttk.Scrollbar(self.message_details_frame, orient="vertical", command=self.details_tree.yview)
         self.details_v_scrollbar.grid(row=0, column=1, sticky="ns")
-        self.details_h_scrollbar = ttk.Scrollbar(self.message_details_frame, orient="horizontal", command=self.details_canvas.xview)
+        self.details_h_scrollbar = ttk.Scrollbar(self.message_details_frame, orient="horizontal", command=self.details_tree.xview)
         self.details_h_scrollbar.grid(row=1, column=0, sticky="ew")
 
-        self.details_scrollable_frame = ttk.Frame(self.details_canvas)
-        self.details_canvas.create_window((0, 0), window=self.details_scrollable_frame, anchor="nw")
+        self.details_tree.configure(yscrollcommand=self.details_v_scrollbar.set, xscrollcommand=self.details_h_scrollbar.set)
+        self.details_tree.bind("<<TreeviewOpen>>", self.on_details_open)
+        self.details_tree.bind("<<TreeviewClose>>", self.on_details_close)
+        self.details_tree.bind("<Double-1>", self.on_details_double_click)
 
-        self.details_scrollable_frame.bind("<Configure>", lambda e: self.details_canvas.configure(scrollregion=self.details_canvas.bbox("all")))
-        self.details_canvas.configure(yscrollcommand=self.details_v_scrollbar.set, xscrollcommand=self.details_h_scrollbar.set)
-
-        self.message_details_texts = {}
+        self.details_item_map = {}  # (channel, CAN ID) -> details Treeview parent item
+        self.details_item_ids = {}  # details Treeview parent item -> (channel, CAN ID)
+        self.details_open = set()  # (channel, CAN ID) keys whose signal rows are expanded
+        self.details_pending = {}  # (channel, CAN ID) -> latest snapshot not yet shown because the row is collapsed
 
     def create_message_config_frame(self):
         self.message_config_frame.grid_columnconfigure(0, weight=1)
@@ -198,6 +282,29 @@ class CANBusMonitor:
         self.global_transmit_button = ttk.Button(controls_frame, text="Start All Transmissions", command=self.toggle_all_transmissions)
         self.global_transmit_button.grid(row=0, column=1, padx=(5, 0), sticky="e")
 
+        # Trace replay: speed and optional ID filter (comma separated hex, empty = all IDs)
+        ttk.Label(controls_frame, text="Replay speed:").grid(row=0, column=2, padx=(15, 2), sticky="e")
+        self.replay_speed_combobox = ttk.Combobox(controls_frame, values=[speed[0] for speed in self.replay_speeds],
+                                                  width=5, state="readonly")
+        self.replay_speed_combobox.grid(row=0, column=3, padx=2, sticky="e")
+        self.replay_speed_combobox.set("1x")
+
+        ttk.Label(controls_frame, text="IDs (hex):").grid(row=0, column=4, padx=(5, 2), sticky="e")
+        self.replay_filter_entry = ttk.Entry(controls_frame, width=15)
+        self.replay_filter_entry.grid(row=0, column=5, padx=2, sticky="e")
+
+        self.replay_button = ttk.Button(controls_frame, text="Replay Trace", command=self.toggle_replay)
+        self.replay_button.grid(row=0, column=6, padx=(2, 0), sticky="e")
+
+        # Transmit sequence script: passes over the script, 0 = until stopped
+        ttk.Label(controls_frame, text="Repeat:").grid(row=0, column=7, padx=(15, 2), sticky="e")
+        self.sequence_repeat_entry = ttk.Entry(controls_frame, width=5)
+        self.sequence_repeat_entry.grid(row=0, column=8, padx=2, sticky="e")
+        self.sequence_repeat_entry.insert(0, "1")
+
+        self.sequence_button = ttk.Button(controls_frame, text="Run Sequence", command=self.toggle_sequence)
+        self.sequence_button.grid(row=0, column=9, padx=(2, 0), sticky="e")
+
         # Message configurations frame
         self.message_configs_frame = ttk.Frame(self.message_config_frame)
         self.message_configs_frame.grid(row=1, column=0, sticky="nsew", padx=5, pady=5)
@@ -242,14 +349,7 @@ class CANBusMonitor:
         self.transmit_details_texts = {}
 
     def get_available_channels(self):
-        available_channels = []
-        result = self.m_objPCANBasic.GetValue(PCAN_NONEBUS, PCAN_ATTACHED_CHANNELS)
-        if result[0] == PCAN_ERROR_OK:
-            # Include only connectable channels
-            for channel in result[1]:
-                new_channel = (self.FormatChannelName(channel.channel_handle), channel.channel_handle)
-                available_channels.append(new_channel)
-        return available_channels
+        return self.engine.get_available_channels()
 
     def on_channel_change(self, event):
         selected_channel = self.channel_combobox.get()
@@ -257,10 +357,7 @@ class CANBusMonitor:
             if channel[0] == selected_channel:
                 self.PcanHandle = channel[1]
                 break
-
-        if self.m_reading:
-            self.stop_reading()
-            self.start_reading()
+        # Only selects the channel for Initialize / Add Channel; open channels keep reading
 
     def on_baudrate_change(self, event):
         selected_baudrate = self.baudrate_combobox.get()
@@ -269,10 +366,6 @@ class CANBusMonitor:
                 self.Bitrate = rate[1]
                 break
 
-        if self.m_reading:
-            self.stop_reading()
-            self.start_reading()
-
     def initialize_settings(self):
         if not self.m_initialize:
             try:
@@ -302,7 +395,8 @@ class CANBusMonitor:
                     self.stop_all_transmissions()
                     self.m_initialize = False
 
-                stsResult = self.m_objPCANBasic.Initialize(self.PcanHandle, self.Bitrate)
+                self.channel_names = {}
+                stsResult = self.engine.initialize(self.PcanHandle, self.Bitrate, name=selected_channel)
                 if stsResult != PCAN_ERROR_OK:
                     raise Exception(f"Error initializing CAN on {selected_channel} with baudrate {selected_baudrate}")
 
@@ -315,6 +409,7 @@ class CANBusMonitor:
                 # Enable the Start receiving button
                 self.start_stop_receive_button.config(state=tk.NORMAL)
                 self.global_transmit_button.config(state=tk.NORMAL)
+                self.add_channel_button.config(state=tk.NORMAL)
 
                 self.initialize_button.config(text="Uninitialize")
 
@@ -324,12 +419,42 @@ class CANBusMonitor:
             if self.m_reading:
                 self.stop_reading()
             self.stop_all_transmissions()
-            self.m_objPCANBasic.Uninitialize(self.PcanHandle)
+            self.engine.uninitialize()
             self.m_initialize = False
             self.initialize_button.config(text="Initialize")
 
             self.start_stop_receive_button.config(state=tk.DISABLED)
             self.global_transmit_button.config(state=tk.DISABLED)
+            self.add_channel_button.config(state=tk.DISABLED)
+
+    def add_channel(self):
+        # Open the selected channel next to the ones already initialized, optionally with its own DBC
+        selected_channel = self.channel_combobox.get()
+        selected_baudrate = self.baudrate_combobox.get()
+        handle = next((channel[1] for channel in self.available_channels if channel[0] == selected_channel), None)
+        bitrate = next((rate[1] for rate in self.baudrates if rate[0] == selected_baudrate), None)
+        if handle is None or bitrate is None:
+            messagebox.showerror("Error", "Select a channel and a baudrate")
+            return
+        if any(state.handle == handle for state in self.engine.channels.values()):
+            messagebox.showerror("Error", f"{selected_channel} is already initialized")
+            return
+
+        db = None
+        path = filedialog.askopenfilename(title=f"DBC for {selected_channel} (Cancel: use the shared DBC)",
+                                          filetypes=DBC_FILETYPES)
+        try:
+            if path:
+                db = load_database(path, **self.dbc_options)
+            stsResult = self.engine.initialize(handle, bitrate, db=db, name=selected_channel)
+        except (OSError, ValueError, cantools.Error) as e:
+            messagebox.showerror("Error", f"Cannot load {path}: {e}")
+            return
+        if stsResult != PCAN_ERROR_OK:
+            messagebox.showerror("Error", f"Error initializing CAN on {selected_channel} with baudrate {selected_baudrate}")
+            return
+        self.channel_names = {}  # Channel indexes are reused after a channel is closed
+        messagebox.showinfo("Channel Added", f"Channel: {selected_channel}\nBaudrate: {selected_baudrate}")
 
     def set_interval(self):
         try:
@@ -339,12 +464,18 @@ class CANBusMonitor:
             self.TimerInterval = new_interval
             messagebox.showinfo("Interval Set", f"New interval: {self.TimerInterval}ms")
 
-            if self.m_reading:
+            # In event-driven mode the interval only sets the UI refresh rate
+            if self.m_reading and not self.rx_event_mode.get():
                 self.stop_reading()
                 self.start_reading()
         except ValueError as e:
             messagebox.showerror("Error", str(e))
 
+    def on_rx_mode_change(self):
+        if self.m_reading:
+            self.stop_reading()
+            self.start_reading()
+
     def refresh_channels(self):
         # Stop any ongoing operations
         if self.m_reading:
@@ -353,9 +484,10 @@ class CANBusMonitor:
 
         # Uninitialize current channel if initialized
         if self.m_initialize:
-            self.m_objPCANBasic.Uninitialize(self.PcanHandle)
+            self.engine.uninitialize()
             self.m_initialize = False
             self.initialize_button.config(text="Initialize")
+            self.add_channel_button.config(state=tk.DISABLED)
 
         # Refresh available channels
         self.available_channels = self.get_available_channels()
@@ -380,11 +512,16 @@ class CANBusMonitor:
         for item in self.receive_tree.get_children():
             self.receive_tree.delete(item)
         self.tree_item_map.clear()
+        self.rendered_rows.clear()
+        self.rendered_data.clear()
+        self.rendered_details.clear()
 
-        # clear all widgets in message detail region
-        for widget in self.details_scrollable_frame.winfo_children():
-            widget.destroy()
-        self.message_details_texts.clear()
+        # Clear message details tree
+        self.details_tree.delete(*self.details_tree.get_children())
+        self.details_item_map.clear()
+        self.details_item_ids.clear()
+        self.details_open.clear()
+        self.details_pending.clear()
 
         # Clear transmit message configuration frame
         for config in self.message_configs:
@@ -396,7 +533,7 @@ class CANBusMonitor:
         self.transmit_details_texts.clear()
 
         # Reset data structures
-        self.last_received_times = {}
+        self.engine.reset()
         self.last_transmitted_values = {}
 
         # Update the canvas scroll region
@@ -406,8 +543,95 @@ class CANBusMonitor:
         messagebox.showinfo("Reset", "All displays have been cleared.")
 # -------------------------------------------------------------------------------------------------------------------- #
 
+# ------------------------------------------------------- DBC -------------------------------------------------------- #
+    def open_database(self, path):
+        # -> cantools database, or None after showing the error
+        try:
+            return load_database(path, **self.dbc_options)
+        except (OSError, ValueError, cantools.Error) as e:
+            messagebox.showerror("Error", f"Cannot load {path}: {e}")
+            return None
+
+    def load_dbc(self):
+        path = filedialog.askopenfilename(title="DBC file", filetypes=DBC_FILETYPES)
+        if path:
+            db = self.open_database(path)
+            if db is not None:
+                self.apply_database(db, path)
+
+    def reload_dbc(self):
+        if self.dbc_path is None:
+            self.load_dbc()
+            return
+        db = self.open_database(self.dbc_path)
+        if db is not None:
+            self.apply_database(db, self.dbc_path)
+
+    def apply_database(self, db, path):
+        # Reception keeps running; open transmit configs pick up the new DBC the next time they are used
+        self.engine.reload_database(db)
+        self.show_database(db, path)
+        if self.dbc_watcher is not None and self.dbc_watcher.path != path:
+            self.start_dbc_watcher()
+
+    def show_database(self, db, path):
+        self.db = db
+        self.dbc_path = path
+        self.update_dbc_label()
+
+    def update_dbc_label(self, note=""):
+        if self.dbc_path is None:
+            text = "DBC: none (raw frames only)"
+        else:
+            text = f"DBC: {os.path.basename(self.dbc_path)} ({len(self.db.messages)} messages)"
+        self.dbc_label.config(text=text + note)
+
+    def on_watch_dbc_change(self):
+        if self.watch_dbc.get():
+            self.start_dbc_watcher()
+        else:
+            self.stop_dbc_watcher()
+
+    def start_dbc_watcher(self):
+        self.stop_dbc_watcher()
+        if self.dbc_path is None:
+            return
+        # The watcher thread loads the file and swaps the engine's tables; Tk is only touched through after()
+        self.dbc_watcher = DatabaseWatcher(self.dbc_path, self.on_dbc_changed, on_error=self.on_dbc_error,
+                                           **self.dbc_options)
+        self.dbc_watcher.start()
+
+    def stop_dbc_watcher(self):
+        watcher, self.dbc_watcher = self.dbc_watcher, None
+        if watcher is not None:
+            watcher.stop()
+
+    def on_dbc_changed(self, db):
+        # Called from the watcher thread
+        path = self.dbc_watcher.path if self.dbc_watcher is not None else self.dbc_path
+        self.engine.reload_database(db)
+        self.master.after(0, self.show_database, db, path)
+
+    def on_dbc_error(self, error):
+        # Called from the watcher thread; the loaded DBC stays in use
+        print(f"Cannot reload {self.dbc_path}: {error}")
+        self.master.after(0, self.update_dbc_label, " - reload failed, see console")
+# -------------------------------------------------------------------------------------------------------------------- #
+
 # ----------------------------------------------- Receiving Message -------------------------------------------------- #
     # -------------------------------------------- Receiving Function ------------------------------------------------ #
+    def apply_id_filter(self):
+        # e.g. "0x100-0x1FF, 0x18FF0000/0x1FFF0000, dbc"; empty accepts everything
+        text = self.filter_entry.get().strip()
+        try:
+            id_filter = IdFilter.parse([text], self.db) if text else None
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid ID filter: {e}")
+            return
+        failed = [name for name, status in self.engine.set_id_filter(id_filter).items() if status != PCAN_ERROR_OK]
+        if failed and id_filter is not None:
+            print(f"Driver filter not available on {', '.join(failed)}, filtering in software")
+
     def toggle_receive(self):
         if self.m_initialize:
             if not self.m_reading:
@@ -418,127 +642,387 @@ class CANBusMonitor:
     def start_reading(self):
         self.m_reading = True
         self.start_stop_receive_button.config(text="Stop receiving")
-        self.receive_thread = threading.Thread(target=self.read_messages)
-        self.receive_thread.daemon = True
-        self.receive_thread.start()
-
-    def read_messages(self):
-        while self.m_reading:
-            stsResult = self.m_objPCANBasic.Read(self.PcanHandle)
-            if stsResult[0] == PCAN_ERROR_OK:
-                can_msg, timestamp = stsResult[1], stsResult[2]
-                self.process_message(can_msg, timestamp)
-            time.sleep(self.TimerInterval / 1000)  # Convert milliseconds to seconds
+        self.engine.poll_interval = self.TimerInterval
+        self.engine.use_rx_event = self.rx_event_mode.get()
+        self.engine.start_reading()
 
-    def stop_reading(self):
-        self.m_reading = False
-        self.start_stop_receive_button.config(text="Start receiving")
-        if hasattr(self, 'receive_thread'):
-            self.receive_thread.join(timeout=1)  # Wait for the thread to finish
+    def toggle_recording(self):
+        if self.engine.recorder is None:
+            self.start_recording()
+        else:
+            self.stop_recording()
+
+    def start_recording(self):
+        path = filedialog.asksaveasfilename(title="Record to", defaultextension=CAPTURE_EXTENSION,
+                                            filetypes=[("CAN capture", f"*{CAPTURE_EXTENSION}"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self.engine.start_recording(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Cannot start recording: {e}")
+            return
+        self.record_button.config(text="Stop Recording")
 
-    def _create_message_handler(self, msg):
-        # Create a custom handler function for the message
-        def handle_message(can_msg):
-            parsed_msg = msg.decode(can_msg.DATA)
-            return parsed_msg
+    def stop_recording(self):
+        self.engine.stop_recording()
+        self.record_button.config(text="Start Recording")
 
-        return handle_message
+    def toggle_export(self):
+        if self.engine.exporter is None:
+            self.start_export()
+        else:
+            self.stop_export()
 
-    def process_message(self, msg, timestamp):
+    def start_export(self):
+        # Parquet: one file per message in a directory; HDF5: one file
+        path = filedialog.asksaveasfilename(title="Export signals to",
+                                            filetypes=[("Parquet directory", "*"), ("HDF5", "*.h5 *.hdf5")])
+        if not path:
+            return
         try:
-            handler = self.message_handlers.get(msg.ID)
-            if handler:
-                can_msg_name = self.db.get_message_by_frame_id(msg.ID).name
-                can_data = bytes(msg.DATA)
-                parsed_data = self.db.decode_message(msg.ID, can_data)
-
-                # 計算 cycle time
-                current_time = timestamp.micros + (timestamp.millis * 1000) + (
-                            timestamp.millis_overflow * 0x100000 * 1000)
+            exporter = self.engine.start_export(path)
+        except (OSError, ImportError) as e:
+            messagebox.showerror("Error", f"Cannot start export: {e}")
+            return
+        self.export_button.config(text="Stop Export")
+        if exporter.skipped:
+            messagebox.showwarning("Export", "Not exported, a signal does not fit one 8-byte window:\n"
+                                   + ", ".join(exporter.skipped))
+
+    def stop_export(self):
+        self.engine.stop_export()
+        self.export_button.config(text="Start Export")
+
+    def toggle_trigger(self):
+        if self.engine.trigger is None:
+            self.arm_trigger()
+        else:
+            self.disarm_trigger()
 
-                if msg.ID in self.last_received_times:
-                    cycle_time = int((current_time - self.last_received_times[msg.ID]) / 1000)  # 轉換成毫秒
-                else:
-                    cycle_time = 0
+    def arm_trigger(self):
+        conditions = [text for text in self.trigger_entry.get().split(";") if text.strip()]
+        if not conditions:
+            messagebox.showerror("Error", "Enter at least one trigger condition")
+            return
+        path = filedialog.asksaveasfilename(title="Trigger captures to", defaultextension=CAPTURE_EXTENSION,
+                                            filetypes=[("CAN capture", f"*{CAPTURE_EXTENSION}"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            trigger = self.engine.start_trigger_capture(path, conditions)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid trigger: {e}")
+            return
+        trigger.on_trigger = lambda reason, timestamp_us: print(f"Trigger: {reason} at {timestamp_us / 1e6:.6f} s")
+        self.trigger_button.config(text="Disarm Trigger")
 
-                self.last_received_times[msg.ID] = current_time
+    def disarm_trigger(self):
+        self.engine.stop_trigger_capture()
+        self.trigger_button.config(text="Arm Trigger")
 
-                # 放入 UI 更新佇列
-                self.update_queue.put((msg, parsed_data, can_msg_name, cycle_time))
-            else:
-                print(f"Unhandled message with ID: {msg.ID}")
-        except cantools.CanError as e:
-            print(f"Error parsing message: {e}")
-        except Exception as e:
-            print(f"Unexpected error: {e}")
+    def stop_reading(self):
+        self.m_reading = False
+        self.start_stop_receive_button.config(text="Start receiving")
+        self.engine.stop_reading()
 
     # ---------------------------------------------------------------------------------------------------------------- #
 
     # ------------------------------------------------ GUI Update ---------------------------------------------------- #
     def schedule_ui_update(self):
-        try:
-            while not self.update_queue.empty():
-                msg, parsed_data, can_msg_name, cycle_time = self.update_queue.get_nowait()
-                self.update_receive_frame(msg, parsed_data, can_msg_name, cycle_time)
-        except queue.Empty:
-            pass
-        self.master.after(50, self.schedule_ui_update)
-
-    def update_receive_frame(self, msg, parsed_data, can_msg_name, cycle_time):
+        tick_start = time.perf_counter_ns()
+        # Render every changed ID once per tick; rows keep their place, so the order does not matter here
+        for snapshot in self.engine.snapshot_store.take_changed():
+            self.update_receive_frame(snapshot)
+
+        status_text = (f"Channels: {len(self.engine.channels)}  Overruns: {self.engine.rx_overrun_count}  "
+                       f"Unknown: {self.engine.unknown_frames}  Decode errors: {self.engine.decode_errors}")
+        recorder = self.engine.recorder
+        if recorder is not None:
+            status_text += f"  Recorded: {recorder.recorded}  Dropped: {recorder.dropped}"
+        exporter = self.engine.exporter
+        if exporter is not None:
+            status_text += f"  Exported: {exporter.exported}"
+        trigger = self.engine.trigger
+        if trigger is not None:
+            status_text += f"  Triggers: {trigger.fired} ({len(trigger.files)} files)"
+        self.overrun_label.config(text=status_text)
+        self.refresh_transmit_display()
+        self.update_metrics_panel()
+        self.update_plot()
+        self.engine.ui_tick.add(time.perf_counter_ns() - tick_start)
+        # With event-driven receive the "Set Interval" value drives the UI refresh rate
+        refresh_ms = self.TimerInterval if self.rx_event_mode.get() else self.UIRefreshInterval
+        self.master.after(refresh_ms, self.schedule_ui_update)
+
+    def update_metrics_panel(self):
+        metrics = self.engine.metrics()
+        if metrics is self.rendered_metrics:
+            return  # Same sampling window as the last tick
+        self.rendered_metrics = metrics
+        # Driver-filtered channels only count the accepted IDs, so no load % for them
+        parts = [f"{channel['name']}: "
+                 + ("accepted IDs " if channel["driver_filtered"] else f"{channel['load_pct']:.1f}% ")
+                 + f"{channel['frames_per_s']:.0f} fps {channel['bits_per_s'] / 1000:.1f} kbit/s "
+                 f"Err {channel['error_frames']}"
+                 for channel in metrics["channels"]]
+        latency = max((channel["decode_latency_us"]["max"] for channel in metrics["channels"]), default=0)
+        parts.append(f"Decode max {latency:.0f} us")
+        if metrics["pipeline_latency_ms"] is not None:
+            parts.append(f"Pipeline {metrics['pipeline_latency_ms']['mean']:.1f} ms")
+        parts.append(f"Queue {metrics['update_queue']}")
+        parts.append(f"UI tick {metrics['ui_tick_ms']['mean']:.1f}/{metrics['ui_tick_ms']['max']:.1f} ms")
+        parts.append(f"TX late max {metrics['transmit_late_max_ms']:.2f} ms")
+        self.metrics_label.config(text="Bus load: " + " | ".join(parts))
+
+    def update_receive_frame(self, snapshot):
+        can_id = snapshot.can_id
+        key = (snapshot.channel, can_id)
+        can_msg_name = snapshot.decoder.name
+        channel_name = self.channel_names.get(snapshot.channel)
+        if channel_name is None:
+            # A channel opened since the last lookup
+            self.channel_names = self.engine.channel_names()
+            channel_name = self.channel_names.get(snapshot.channel, str(snapshot.channel))
         # ------------------------------------------- Receive tree --------------------------------------------------- #
+        # Format the payload only when it changed
+        rendered_data = self.rendered_data.get(key)
+        if rendered_data is None or rendered_data[0] != snapshot.data:
+            # Formatted only for IDs that are rendered, and only when their payload changed
+            rendered_data = (snapshot.data, snapshot.data[:snapshot.length].hex(" ").upper())
+            self.rendered_data[key] = rendered_data
+
+        msg_type = self.GetTypeString(snapshot.msg_type)
         new_values = [
+            channel_name,
             can_msg_name,
-            hex(msg.ID),
-            self.GetTypeString(msg.MSGTYPE),
-            msg.LEN,
-            " ".join([f"{b:02X}" for b in msg.DATA]),
-            cycle_time,  # 用 PCAN API 計算的 cycle time
-            1,
+            hex(can_id),
+            msg_type,
+            snapshot.length,
+            rendered_data[1],
+            f"{snapshot.cycle.interval_us / 1000:.3f}",  # 用 PCAN 硬體時間戳計算的 cycle time (µs 整數)
+            snapshot.count,
         ]
 
-        if msg.ID in self.tree_item_map:
-            item = self.tree_item_map[msg.ID]
-            current_values = self.receive_tree.item(item)['values']
-            new_values[-1] = current_values[-1] + 1  # 更新計數
-            self.receive_tree.item(item, values=new_values)
-        else:
+        old_values = self.rendered_rows.get(key)
+        if old_values is None:
             item = self.receive_tree.insert("", "end", values=new_values)
-            self.tree_item_map[msg.ID] = item
+            self.tree_item_map[key] = item
+        else:
+            item = self.tree_item_map[key]
+            changed = [i for i, value in enumerate(new_values) if value != old_values[i]]
+            if len(changed) == 1:
+                column = self.receive_tree["columns"][changed[0]]
+                self.receive_tree.set(item, column, new_values[changed[0]])
+            elif changed:
+                self.receive_tree.item(item, values=new_values)
+        self.rendered_rows[key] = new_values
+        # ------------------------------------------------------------------------------------------------------------ #
+        # ------------------------------------------- Details tree --------------------------------------------------- #
+        cycle = snapshot.cycle
+        summary = (f"{msg_type} | Cycle {cycle.interval_us / 1000:.3f} ms | "
+                   f"Min/Avg/Max {cycle.min_us / 1000:.3f}/{cycle.mean_us / 1000:.3f}/{cycle.max_us / 1000:.3f} ms | "
+                   f"Std {cycle.std_us / 1000:.3f} ms")
+        if cycle.expected_us:
+            summary += f" | DBC {cycle.expected_us / 1000:g} ms, Missing {cycle.missing}, Late {cycle.late}"
+
+        parent = self.details_item_map.get(key)
+        if parent is None:
+            parent = self.details_tree.insert("", "end", text=f"{channel_name} | ID: {hex(can_id)} ({can_msg_name})",
+                                              values=(summary,), open=False)
+            self.details_item_map[key] = parent
+            self.details_item_ids[parent] = key
+            self.rendered_details[key] = (summary, [])
+            # Placeholder child so the row can be expanded; real signal rows are created on first open
+            self.details_tree.insert(parent, "end", text="...")
+        elif self.rendered_details[key][0] != summary:
+            self.details_tree.set(parent, "Value", summary)
+            self.rendered_details[key] = (summary, self.rendered_details[key][1])
+
+        if key in self.details_open:
+            self.update_details_signals(key, snapshot)
+        else:
+            self.details_pending[key] = snapshot
         # ------------------------------------------------------------------------------------------------------------ #
-        # --------------------------------------------- Text Widget -------------------------------------------------- #
-        # Update or create message details Text widget
-        if msg.ID not in self.message_details_texts:
-            # Calculate the position for the new widget
-            row = len(self.message_details_texts) // 5
-            col = len(self.message_details_texts) % 5
-
-            # Create a new Text widget for this message ID
-            frame = ttk.LabelFrame(self.details_scrollable_frame, text=f"ID: {hex(msg.ID)} ({can_msg_name})")
-            frame.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
 
-            text_widget = scrolledtext.ScrolledText(frame, wrap=tk.WORD, height=12, width=30)
-            text_widget.pack(fill="both", expand=True)
+    def update_details_signals(self, key, snapshot):
+        parent = self.details_item_map[key]
+        summary, old_rows = self.rendered_details[key]
+        new_rows = [(signal_name, str(signal_value))
+                    for signal_name, signal_value in zip(snapshot.decoder.signal_names, snapshot.signal_values)
+                    if signal_value is not None]  # Skip inactive multiplexed signals
+
+        children = self.details_tree.get_children(parent)
+        if (len(children) != len(new_rows) or len(old_rows) != len(new_rows)
+                or any(old[0] != new[0] for old, new in zip(old_rows, new_rows))):
+            # Signal layout changed (first open or multiplexing): rebuild the child rows
+            self.details_tree.delete(*children)
+            for signal_name, value in new_rows:
+                self.details_tree.insert(parent, "end", text=signal_name, values=(value,))
+        else:
+            # Push only the values that changed
+            for child, old, new in zip(children, old_rows, new_rows):
+                if old[1] != new[1]:
+                    self.details_tree.set(child, "Value", new[1])
+        self.rendered_details[key] = (summary, new_rows)
+
+    def on_details_open(self, event):
+        key = self.details_item_ids.get(self.details_tree.focus())
+        if key is None:
+            return
+        self.details_open.add(key)
+        snapshot = self.details_pending.pop(key, None)
+        if snapshot is not None:
+            self.update_details_signals(key, snapshot)
+
+    def on_details_close(self, event):
+        self.details_open.discard(self.details_item_ids.get(self.details_tree.focus()))
+
+    def on_details_double_click(self, event):
+        # Double-click on a signal row: add it to the plot, or remove it when it is plotted already
+        item = self.details_tree.identify_row(event.y)
+        key = self.details_item_ids.get(self.details_tree.parent(item)) if item else None
+        if key is None:
+            return
+        signal_name = self.details_tree.item(item, "text")
+        if signal_name != "...":
+            self.toggle_plot_signal(key, signal_name)
+    # ---------------------------------------------------------------------------------------------------------------- #
+# -------------------------------------------------------------------------------------------------------------------- #
 
-            self.message_details_texts[msg.ID] = text_widget
+# --------------------------------------------------- Signal Plot ---------------------------------------------------- #
+    def show_plot_window(self):
+        if self.plot_window is not None:
+            self.plot_window.deiconify()
+            self.plot_window.lift()
+            return
+        self.engine.start_plot()
+        self.plot_window = tk.Toplevel(self.master)
+        self.plot_window.title("Signal Plot")
+        self.plot_window.geometry("900x600")
+        self.plot_window.protocol("WM_DELETE_WINDOW", self.plot_window.withdraw)  # Traces keep collecting
+        self.plot_window.grid_rowconfigure(0, weight=1)
+        self.plot_window.grid_columnconfigure(0, weight=1)
+
+        self.plot_canvas = tk.Canvas(self.plot_window, background="white", highlightthickness=0)
+        self.plot_canvas.grid(row=0, column=0, sticky="nsew", padx=(5, 0), pady=5)
+
+        side_frame = ttk.Frame(self.plot_window)
+        side_frame.grid(row=0, column=1, sticky="ns", padx=5, pady=5)
+        side_frame.grid_rowconfigure(2, weight=1)
+        ttk.Label(side_frame, text="Span:").grid(row=0, column=0, sticky="w")
+        self.plot_span_combobox = ttk.Combobox(side_frame, values=[span[0] for span in self.plot_spans], width=8,
+                                               state="readonly")
+        self.plot_span_combobox.grid(row=0, column=1, sticky="e")
+        self.plot_span_combobox.set("1 min")
+        ttk.Label(side_frame, text="Double-click a signal in the\ndetails list to add or remove it").grid(
+            row=1, column=0, columnspan=2, sticky="w", pady=5)
+        self.plot_listbox = tk.Listbox(side_frame, width=32, selectmode=tk.EXTENDED)
+        self.plot_listbox.grid(row=2, column=0, columnspan=2, sticky="ns")
+        ttk.Button(side_frame, text="Remove", command=self.remove_plot_signals).grid(row=3, column=0, pady=5, sticky="w")
+        ttk.Button(side_frame, text="Clear Data", command=self.clear_plot).grid(row=3, column=1, pady=5, sticky="e")
+        self.refresh_plot_list()
+
+    def toggle_plot_signal(self, key, signal_name):
+        channel, can_id = key
+        plotter = self.engine.start_plot()
+        trace = plotter.find(channel, can_id, signal_name)
+        if trace is not None:
+            plotter.remove(trace)
+        else:
+            try:
+                plotter.add(channel, can_id, signal_name)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+        self.show_plot_window()
+        self.refresh_plot_list()
 
-        # Update the specific Text widget for this message ID
-        text_widget = self.message_details_texts[msg.ID]
-        text_widget.config(state=tk.NORMAL)
-        text_widget.delete('1.0', tk.END)
+    def remove_plot_signals(self):
+        plotter = self.engine.plotter
+        if plotter is None:
+            return
+        traces = plotter.traces
+        for index in self.plot_listbox.curselection():
+            plotter.remove(traces[index])
+        self.refresh_plot_list()
 
-        message_str = f"Type: {self.GetTypeString(msg.MSGTYPE)}\n"
-        message_str += f"Cycle Time: {cycle_time} ms\n"
-        for signal_name, signal_value in parsed_data.items():
-            message_str += f"{signal_name}: {signal_value}\n"
+    def clear_plot(self):
+        if self.engine.plotter is not None:
+            self.engine.plotter.clear()
 
-        text_widget.insert(tk.END, message_str)
-        text_widget.config(state=tk.DISABLED)
+    def refresh_plot_list(self):
+        if self.plot_window is None:
+            return
+        self.plot_listbox.delete(0, tk.END)
+        plotter = self.engine.plotter
+        for trace in plotter.traces if plotter is not None else ():
+            self.plot_listbox.insert(tk.END, f"{self.channel_names.get(trace.channel, trace.channel)} "
+                                             f"{trace.message_name}.{trace.signal_name}")
+
+    def update_plot(self):
+        # Runs on the UI tick. Each trace is one polyline through the min/max of every pixel column, so a redraw
+        # costs the same whatever the sample rate
+        plotter = self.engine.plotter
+        if self.plot_window is None or plotter is None or self.plot_window.state() in ("withdrawn", "iconic"):
+            return
+        now = time.time()
+        if now - self.last_plot_update < self.PlotRefreshInterval:
+            return
+        self.last_plot_update = now
 
-        # Update the canvas scroll region
-        self.details_scrollable_frame.update_idletasks()
-        self.details_canvas.configure(scrollregion=self.details_canvas.bbox("all"))
-        # ------------------------------------------------------------------------------------------------------------ #
-    # ---------------------------------------------------------------------------------------------------------------- #
+        canvas = self.plot_canvas
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        if width < 2 or height < 2:
+            return
+        span = next(seconds for label, seconds in self.plot_spans if label == self.plot_span_combobox.get())
+        plotter.set_resolution(span * 1_000_000, width)
+
+        traces = plotter.traces
+        layout = (tuple(traces), width, height)
+        if layout != self.plot_layout:
+            # One lane per signal, each scaled to its own range
+            canvas.delete("all")
+            self.plot_items.clear()
+            self.plot_labels.clear()
+            lane = height / max(1, len(traces))
+            for i, trace in enumerate(traces):
+                top = i * lane
+                if i:
+                    canvas.create_line(0, top, width, top, fill="#d0d0d0")
+                color = PLOT_COLORS[i % len(PLOT_COLORS)]
+                line = canvas.create_line(0, 0, 0, 0, fill=color, state=tk.HIDDEN)
+                label = canvas.create_text(4, top + 2, anchor="nw", fill=color)
+                self.plot_items[trace] = (line, label, top + 16, top + lane - 3)
+            self.plot_layout = layout
+
+        newest_us = plotter.newest_us
+        for trace in traces:
+            line, label, lane_top, lane_bottom = self.plot_items[trace]
+            points = trace.envelope(newest_us)
+            name = f"{self.channel_names.get(trace.channel, trace.channel)} {trace.message_name}.{trace.signal_name}"
+            if not points:
+                canvas.itemconfig(line, state=tk.HIDDEN)
+                text = f"{name}: no data"
+            else:
+                low = min(point[1] for point in points)
+                high = max(point[2] for point in points)
+                text = f"{name}: {trace.latest:g} {trace.unit}  [{low:g} .. {high:g}]"
+                if high == low:
+                    low -= 0.5  # A constant signal runs through the middle of its lane
+                    high += 0.5
+                scale = (lane_bottom - lane_top) / (high - low)
+                coords = []
+                for column, minimum, maximum in points:
+                    coords += (column, lane_bottom - (maximum - low) * scale, column, lane_bottom - (minimum - low) * scale)
+                if len(coords) == 4:
+                    coords += coords  # A single column still needs two points
+                canvas.coords(line, coords)
+                canvas.itemconfig(line, state=tk.NORMAL)
+            if self.plot_labels.get(trace) != text:
+                canvas.itemconfig(label, text=text)
+                self.plot_labels[trace] = text
 # -------------------------------------------------------------------------------------------------------------------- #
 
 # --------------------------------------------- Transmitting Message ------------------------------------------------- #
@@ -564,26 +1048,11 @@ class CANBusMonitor:
             if interval <= 0:
                 raise ValueError("Interval must be a positive integer")
 
-            signal_values = {}
-            for signal in message.signals:
-                value = config['signals'][signal.name].get()
-                signal_values[signal.name] = float(value)
-
-            data = message.encode(signal_values)
-
-            msg = TPCANMsg()
-            msg.ID = msg_id
-            msg.MSGTYPE = PCAN_MESSAGE_STANDARD
-            msg.LEN = len(data)
-            for i, byte in enumerate(data):
-                msg.DATA[i] = byte
+            signal_values = self.read_signal_values(config, message)
+            data = self.engine.start_transmission(config_id, msg_id, signal_values, interval)
 
             config['transmitting'] = True
-            config['thread'] = threading.Thread(target=self.transmit_message_thread,
-                                                args=(config_id, msg, interval, signal_values))
-            config['thread'].daemon = True
-            config['thread'].start()
-            self.transmit_threads[config_id] = config['thread']
+            config['tx_data'] = (msg_id, data, signal_values)
 
             config['transmit_button']['text'] = "Stop Transmitting"
 
@@ -592,45 +1061,45 @@ class CANBusMonitor:
         except KeyError:
             messagebox.showerror("Error", "Message ID not found in DBC file")
 
-    def transmit_message_thread(self, config_id, msg, interval, signal_values):
+    def apply_signal_values(self, config_id):
+        # Push edited signal values into a running transmission without restarting it
         config = next((c for c in self.message_configs if c['id'] == config_id), None)
-        if not config:
+        if not config or not config['transmitting'] or not config['tx_data']:
             return
 
-        last_update_time = 0
-        update_interval = 0.2  # 每 200 毫秒更新一次
-
-        while config['transmitting']:
-            start_time = time.time()
+        try:
+            msg_id = config['tx_data'][0]
+            signal_values = self.read_signal_values(config, self.db.get_message_by_frame_id(msg_id))
+            data = self.engine.update_transmission(config_id, signal_values)
+            if data is None:
+                return
+            config['tx_data'] = (msg_id, data, signal_values)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+        except KeyError:
+            messagebox.showerror("Error", "Message ID not found in DBC file")
 
-            result = self.m_objPCANBasic.Write(self.PcanHandle, msg)
-            if result != PCAN_ERROR_OK:
-                # 使用 master.after 呼叫 messagebox，確保在 UI 線程顯示
-                self.master.after(0, lambda: messagebox.showerror(
-                    "Error", f"Failed to transmit message {config_id}: {self.m_objPCANBasic.GetErrorText(result, 0x09)}"
-                ))
-                config['transmit_button']['text'] = "Start Transmitting"
-                break
+    def read_signal_values(self, config, message):
+        signal_values = {}
+        for signal in message.signals:
+            value = config['signals'][signal.name].get()
+            signal_values[signal.name] = float(value)
+        return signal_values
 
-            # 只在間隔超過 update_interval 時更新 UI
-            if time.time() - last_update_time >= update_interval:
-                self.master.after(0, self.update_transmitted_message_display, msg.ID, bytes(msg.DATA), signal_values)
-                last_update_time = time.time()
+    def on_transmit_error(self, config_id, result):
+        # 使用 master.after 呼叫 messagebox，確保在 UI 線程顯示
+        self.master.after(0, self.handle_transmit_error, config_id, result)
 
-            # 保持發送間隔
-            elapsed_time = time.time() - start_time
-            sleep_time = max(0, interval / 1000 - elapsed_time)
-            time.sleep(sleep_time)
+    def handle_transmit_error(self, config_id, result):
+        self.stop_transmitting(config_id)
+        messagebox.showerror(
+            "Error", f"Failed to transmit message {config_id}: {self.engine.get_error_text(result)}")
 
     def stop_transmitting(self, config_id):
         config = next((c for c in self.message_configs if c['id'] == config_id), None)
         if config:
             config['transmitting'] = False
-            if config.get('thread'):
-                config['thread'].join(timeout=1)  # Wait for the thread to finish
-                config['thread'] = None
-            if config_id in self.transmit_threads:
-                del self.transmit_threads[config_id]
+            self.engine.stop_transmission(config_id)
             config['transmit_button']['text'] = "Start Transmitting"
 
     def toggle_all_transmissions(self):
@@ -652,6 +1121,101 @@ class CANBusMonitor:
         self.global_transmit_button['text'] = "Start All Transmissions"
     # ---------------------------------------------------------------------------------------------------------------- #
 
+    def toggle_replay(self):
+        if self.replayer is not None and self.replayer.running:
+            self.stop_replay()
+        else:
+            self.start_replay()
+
+    def start_replay(self):
+        if not self.m_initialize:
+            messagebox.showerror("Error", "Initialize a channel before replaying a trace")
+            return
+        try:
+            speed = dict(self.replay_speeds)[self.replay_speed_combobox.get()]
+            filter_text = self.replay_filter_entry.get().strip()
+            id_filter = [int(can_id, 16) for can_id in filter_text.split(",")] if filter_text else None
+        except ValueError:
+            messagebox.showerror("Error", "Invalid replay ID filter")
+            return
+
+        path = filedialog.askopenfilename(title="Replay trace", filetypes=TRACE_FILETYPES)
+        if not path:
+            return
+        try:
+            frames = open_trace(path)
+            self.replayer = self.engine.start_replay(frames, speed=speed, id_filter=id_filter,
+                                                     on_done=self.on_replay_done)
+        except (OSError, ImportError, ValueError) as e:
+            messagebox.showerror("Error", f"Cannot replay {path}: {e}")
+            return
+        self.replay_button.config(text="Stop Replay")
+
+    def stop_replay(self):
+        if self.replayer is not None:
+            self.replayer.stop()
+
+    def on_replay_done(self, replayer):
+        # Called from the replay thread
+        self.master.after(0, self.show_replay_result, replayer)
+
+    def show_replay_result(self, replayer):
+        self.replay_button.config(text="Replay Trace")
+        if replayer.error is not None:
+            messagebox.showerror("Replay", f"Replay failed: {replayer.error}")
+            return
+        messagebox.showinfo("Replay",
+                            f"Sent: {replayer.sent}  Filtered: {replayer.skipped}  Write errors: {replayer.errors}\n"
+                            f"Lateness mean/max: {replayer.late_mean_ns / 1e6:.3f}/{replayer.late_max_ns / 1e6:.3f} ms")
+
+    def toggle_sequence(self):
+        if self.sequence_player is not None and self.sequence_player.running:
+            self.stop_sequence()
+        else:
+            self.start_sequence()
+
+    def start_sequence(self):
+        if not self.m_initialize:
+            messagebox.showerror("Error", "Initialize a channel before running a sequence")
+            return
+        try:
+            repeat = int(self.sequence_repeat_entry.get())
+            if repeat < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Invalid sequence repeat count")
+            return
+
+        path = filedialog.askopenfilename(title="Run transmit sequence", filetypes=SEQUENCE_FILETYPES)
+        if not path:
+            return
+        try:
+            sequence = self.engine.load_sequence(path)
+            self.sequence_player = self.engine.start_sequence(sequence, repeat=repeat, on_done=self.on_sequence_done)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Cannot run {path}: {e}")
+            return
+        self.sequence_button.config(text="Stop Sequence")
+
+    def stop_sequence(self):
+        if self.sequence_player is not None:
+            self.sequence_player.stop()
+
+    def on_sequence_done(self, player):
+        # Called from the sequence thread
+        self.master.after(0, self.show_sequence_result, player)
+
+    def show_sequence_result(self, player):
+        self.sequence_button.config(text="Run Sequence")
+        if player.error is not None:
+            messagebox.showerror("Sequence", f"Sequence failed: {player.error}")
+            return
+        messagebox.showinfo("Sequence",
+                            f"Sent: {player.sent}  Passes: {player.passes}  Write errors: {player.errors}  "
+                            f"TX queue full: {player.tx_full}\n"
+                            f"Rate: {player.frames_per_s:,.0f} frames/s  "
+                            f"Lateness mean/max: {player.late_mean_ns / 1e6:.3f}/{player.late_max_ns / 1e6:.3f} ms")
+
     # ------------------------------------------------ GUI Update ---------------------------------------------------- #
     def add_message_config(self):
         config_id = str(uuid.uuid4())
@@ -689,6 +1253,10 @@ class CANBusMonitor:
                                    command=lambda cid=config_id: self.remove_message_config(cid))
         remove_button.grid(row=3, column=2, padx=15, pady=2)
 
+        apply_button = ttk.Button(config_frame, text="Apply Values",
+                                  command=lambda cid=config_id: self.apply_signal_values(cid))
+        apply_button.grid(row=4, column=0, padx=5, pady=2)
+
         self.message_configs.append({
             'id': config_id,
             'frame': config_frame,
@@ -698,7 +1266,7 @@ class CANBusMonitor:
             'transmit_button': transmit_button,
             'signals': {},
             'transmitting': False,
-            'thread': None  # New attribute for the transmit thread
+            'tx_data': None  # (msg_id, encoded data, signal values) while transmitting
         })
 
         self.update_canvas_scroll()
@@ -735,22 +1303,24 @@ class CANBusMonitor:
             msg_id = int(msg_id_entry.get(), 16)
             message = self.db.get_message_by_frame_id(msg_id)
 
+            # Find the corresponding message config
+            config = next((c for c in self.message_configs if c['msg_id_entry'] == msg_id_entry), None)
+
             # Clear existing signal inputs
             for widget in signal_frame.winfo_children():
                 widget.destroy()
 
-            # Create input fields for each signal
+            # Create input fields for each signal, <Return> applies the values to a running transmission
             signal_inputs = {}
             for i, signal in enumerate(message.signals):
                 ttk.Label(signal_frame, text=signal.name).grid(row=i, column=0, sticky="w", padx=5, pady=2)
                 signal_inputs[signal.name] = ttk.Entry(signal_frame, width=10)
                 signal_inputs[signal.name].grid(row=i, column=1, padx=5, pady=2)
+                if config:
+                    signal_inputs[signal.name].bind("<Return>", lambda e, cid=config['id']: self.apply_signal_values(cid))
 
-            # Find the corresponding message config and update its signals
-            for config in self.message_configs:
-                if config['msg_id_entry'] == msg_id_entry:
-                    config['signals'] = signal_inputs
-                    break
+            if config:
+                config['signals'] = signal_inputs
 
             self.update_canvas_scroll()
 
@@ -760,7 +1330,20 @@ class CANBusMonitor:
             messagebox.showerror("Error", "Message ID not found in DBC file")
 
     # -------------------------------------- Text Widget display function -------------------------------------------- #
-    def update_transmitted_message_display(self, msg_id, encoded_data, signal_values):
+    def refresh_transmit_display(self):
+        # 只在間隔超過 TransmitDisplayInterval 時更新 UI
+        now = time.monotonic()
+        if now - self.last_transmit_display_update < self.TransmitDisplayInterval:
+            return
+        self.last_transmit_display_update = now
+
+        for config in self.message_configs:
+            if config['transmitting'] and config['tx_data']:
+                msg_id, encoded_data, signal_values = config['tx_data']
+                self.update_transmitted_message_display(msg_id, encoded_data, signal_values,
+                                                        self.engine.transmission_stats(config['id']))
+
+    def update_transmitted_message_display(self, msg_id, encoded_data, signal_values, stats=None):
         if msg_id not in self.transmit_details_texts:
             # Calculate the position for the new widget
             row = len(self.transmit_details_texts) // 5
@@ -784,6 +1367,11 @@ class CANBusMonitor:
         message_str += "Signal Values:\n"
         for signal_name, value in signal_values.items():
             message_str += f"  {signal_name}: {value}\n"
+        if stats:
+            message_str += (f"Sent: {stats['sent']}  Missed: {stats['missed']}\n"
+                            f"Period avg/min/max: {stats['period_mean_ms']:.3f}/{stats['period_min_ms']:.3f}/"
+                            f"{stats['period_max_ms']:.3f} ms\n"
+                            f"Jitter: {stats['jitter_ms']:.3f} ms  Late max: {stats['late_max_ms']:.3f} ms\n")
 
         text_widget.insert(tk.END, message_str)
         text_widget.config(state=tk.DISABLED)
@@ -807,45 +1395,28 @@ class CANBusMonitor:
         # Stop all transmissions
         self.stop_all_transmissions()
 
-        # Uninitialize PCAN
-        if self.m_initialize:
-            self.m_objPCANBasic.Uninitialize(self.PcanHandle)
+        # Flush and close the capture file
+        self.stop_recording()
 
-        # Wait for receive thread to finish
-        if self.receive_thread and self.receive_thread.is_alive():
-            self.receive_thread.join(timeout=1)
+        # Write the remaining export rows
+        self.stop_export()
 
-        # Wait for all transmit threads to finish
-        for thread in self.transmit_threads.values():
-            if thread and thread.is_alive():
-                thread.join(timeout=1)
+        # Finish a running trigger dump
+        self.disarm_trigger()
 
-# ------------------------------------------------ Help-Functions ---------------------------------------------------- #
-    def GetDeviceName(self, handle):
-        # Gets the name of a PCAN device
-        switcher = {
-            PCAN_NONEBUS.value: "PCAN_NONEBUS",
-            PCAN_PEAKCAN.value: "PCAN_PEAKCAN",
-            PCAN_DNG.value: "PCAN_DNG",
-            PCAN_PCI.value: "PCAN_PCI",
-            PCAN_USB.value: "PCAN_USB",
-            PCAN_VIRTUAL.value: "PCAN_VIRTUAL",
-            PCAN_LAN.value: "PCAN_LAN"
-        }
-
-        return switcher.get(handle, "UNKNOWN")
-
-    def FormatChannelName(self, handle):
-        # Gets the formated text for a PCAN-Basic channel handle
-        if handle < 0x100:
-            devDevice = TPCANDevice(handle >> 4)
-            byChannel = handle & 0xF
-        else:
-            devDevice = TPCANDevice(handle >> 8)
-            byChannel = handle & 0xFF
+        # Stop watching the DBC
+        self.stop_dbc_watcher()
 
-        return '%s: %s (%.2Xh)' % (self.GetDeviceName(devDevice.value), byChannel, handle)
+        # Stop a running trace replay
+        self.stop_replay()
 
+        # Stop a running transmit sequence
+        self.stop_sequence()
+
+        # Uninitialize PCAN and stop the engine threads
+        self.engine.close()
+
+# ------------------------------------------------ Help-Functions ---------------------------------------------------- #
     def GetTypeString(self, msgtype):
         # Gets the string representation of the type of CAN message
         if (msgtype & PCAN_MESSAGE_STATUS.value) == PCAN_MESSAGE_STATUS.value:
@@ -872,10 +1443,27 @@ class CANBusMonitor:
 # -------------------------------------------------------------------------------------------------------------------- #
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="CAN Bus Monitor")
+    add_database_arguments(parser)
+    add_backend_arguments(parser)
+    parser.add_argument("--decode-workers", type=int, default=0,
+                        help="Decode in this many processes, partitioned by CAN ID (default: 0, decode in the receive thread)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve /metrics and /stats as JSON on http://127.0.0.1:PORT")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     root = tk.Tk()
     root.geometry("1080x1000")  # Set an initial size for the window
-    app = CANBusMonitor(root)
+    app = CANBusMonitor(root, backend=build_backend(args), dbc_path=args.dbc, dbc_options=database_options(args),
+                        watch_dbc=args.watch_dbc)
+    if args.decode_workers:
+        app.engine.start_decode_pipeline(args.decode_workers)
+    if args.metrics_port is not None:
+        app.engine.start_metrics_server(args.metrics_port)
 
     def on_closing():
         app.cleanup()
@@ -0,0 +1,36 @@
+# Cached per-message encoder for transmissions.
+# encode() only runs cantools' encoder when the signal values differ from the previous call
+# and otherwise returns the same bytes object, so callers can detect "nothing changed"
+# with an identity check.
+
+
+class MessageEncoder:
+    def __init__(self, message):
+        self.message = message
+        self.frame_id = message.frame_id
+        self.encode_count = 0
+        self._values = None
+        self._data = None
+
+    def encode(self, signal_values):
+        if signal_values != self._values:
+            self._data = self.message.encode(signal_values)
+            self._values = dict(signal_values)
+            self.encode_count += 1
+        return self._data
+
+
+class EncoderCache:
+    def __init__(self, db):
+        self.db = db
+        self._encoders = {}
+
+    def get(self, frame_id):
+        # Raises KeyError for IDs not in the DBC, like get_message_by_frame_id
+        encoder = self._encoders.get(frame_id)
+        if encoder is None:
+            encoder = self._encoders[frame_id] = MessageEncoder(self.db.get_message_by_frame_id(frame_id))
+        return encoder
+
+    def clear(self):
+        self._encoders.clear()
@@ -0,0 +1,61 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Local read-only metrics endpoint.
+#   GET /metrics  -> MonitorEngine.metrics()  (bus load, latencies, backlogs)
+#   GET /stats    -> MonitorEngine.stats()    (totals, per-ID cycle statistics, transmissions)
+# Binds to localhost by default; there is no authentication.
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        engine = self.server.engine
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/metrics":
+            body = engine.metrics()
+        elif path == "/stats":
+            body = engine.stats()
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Keep the console for the monitor's own output
+
+
+class MetricsServer:
+    def __init__(self, engine, port, host="127.0.0.1"):
+        self.engine = engine
+        self.port = port
+        self.host = host
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        # Raises OSError when the port is taken
+        if self._server is not None:
+            return
+        server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        server.daemon_threads = True
+        server.engine = self.engine
+        self.port = server.server_address[1]  # The real port when 0 was asked for
+        self._server = server
+        self._thread = threading.Thread(target=server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._thread.join(timeout=1)
+        self._thread = None
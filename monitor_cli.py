@@ -0,0 +1,264 @@
+import argparse
+import csv
+import json
+import signal
+import sys
+import threading
+import time
+from PCANBasic import *
+import cantools
+from bus_backend import add_backend_arguments, build_backend
+from cycle_stats import CycleStatsConfig, DEFAULT_JITTER_EDGES_US
+from id_filter import IdFilter
+from canfd import parse_fd_bitrate
+from dbc_cache import DatabaseWatcher, add_database_arguments, database_options, load_database
+from monitor_engine import MonitorEngine
+
+
+# Headless monitor: receive, decode, record and cyclic transmit without Tk.
+#   python monitor_cli.py --dbc vehicle.dbc --bitrate 500K --record log.cancap \
+#       --transmit 0x100:10:EngineSpeed=1500,Gear=3 --stats-interval 1 --stats-format csv
+#   python monitor_cli.py --dbc vehicle.dbc --export signals/ --duration 600
+#   python monitor_cli.py --dbc powertrain_fd.dbc --bitrate 500K/2M --record fd.cancap
+#   python monitor_cli.py --dbc vehicle.dbc --watch-dbc     (reload the DBC whenever it is saved)
+#   python monitor_cli.py --dbc vehicle.dbc --sequence flash_test.txt --sequence-repeat 0 --duration 60
+
+BITRATES = {
+    "1M": PCAN_BAUD_1M, "800K": PCAN_BAUD_800K, "500K": PCAN_BAUD_500K, "250K": PCAN_BAUD_250K,
+    "125K": PCAN_BAUD_125K, "100K": PCAN_BAUD_100K, "95K": PCAN_BAUD_95K, "83K": PCAN_BAUD_83K,
+    "50K": PCAN_BAUD_50K, "47K": PCAN_BAUD_47K, "33K": PCAN_BAUD_33K, "20K": PCAN_BAUD_20K,
+    "10K": PCAN_BAUD_10K, "5K": PCAN_BAUD_5K
+}
+
+CSV_FIELDS = ["time", "frames", "overruns", "recorded", "dropped",
+              "channel", "id", "name", "count", "cycle_us", "cycle_min_us", "cycle_max_us", "cycle_mean_us",
+              "cycle_std_us", "expected_us", "missing", "late", "jitter_histogram"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless CAN Bus Monitor")
+    add_database_arguments(parser, required=True)
+    add_backend_arguments(parser)
+    parser.add_argument("--channel", action="append", dest="channels", metavar="CHANNEL[:BITRATE[:DBC]]",
+                        help="Channel handle (e.g. 0x51) or index into the available channels, optionally with its "
+                             "own bitrate and DBC; may be repeated to monitor several channels (default: first)")
+    parser.add_argument("--bitrate", default="500K",
+                        help="Bitrate of channels given without one: " + ", ".join(BITRATES) + ", or NOMINAL/DATA "
+                             "(e.g. 500K/2M) or a PCAN-Basic FD bitrate string for CAN FD (default: 500K)")
+    parser.add_argument("--event", action="store_true",
+                        help="Wait on the driver's receive event instead of polling")
+    parser.add_argument("--poll-interval", type=int, default=10,
+                        help="Polling interval in milliseconds when --event is not used (default: 10)")
+    parser.add_argument("--filter", action="append", default=[], metavar="RULE[,RULE...]",
+                        help="Only accept these IDs: 0x123, ranges 0x100-0x1FF, code/mask 0x18FF0000/0x1FFF0000, "
+                             "a trailing x for extended IDs, or dbc for the IDs in the DBC; may be repeated")
+    parser.add_argument("--decode-workers", type=int, default=0,
+                        help="Decode in this many processes, partitioned by CAN ID (default: 0, decode in the receive thread)")
+    parser.add_argument("--record", metavar="PATH", help="Record raw frames to a .cancap capture")
+    parser.add_argument("--trigger", action="append", default=[], metavar="CONDITION",
+                        help="Trigger condition: id:0x123, error, or a signal condition like EngineSpeed>3000 or "
+                             "EngineData.Gear==D; may be repeated")
+    parser.add_argument("--trigger-capture", metavar="PATH",
+                        help="Dump the frames around every trigger to PATH_NNNN.cancap")
+    parser.add_argument("--pre-trigger", type=float, default=5.0,
+                        help="Seconds kept before a trigger (default: 5)")
+    parser.add_argument("--post-trigger", type=float, default=5.0,
+                        help="Seconds recorded after a trigger (default: 5)")
+    parser.add_argument("--export", metavar="PATH",
+                        help="Export decoded signals per message: a directory of Parquet files, or one HDF5 file "
+                             "when PATH ends in .h5/.hdf5")
+    parser.add_argument("--export-row-group", type=int, default=65536,
+                        help="Rows per Parquet row group / HDF5 chunk (default: 65536)")
+    parser.add_argument("--transmit", action="append", default=[], metavar="ID:PERIOD[:SIGNAL=VALUE,...]",
+                        help="Cyclic transmission, e.g. 0x100:10:EngineSpeed=1500; may be repeated")
+    parser.add_argument("--sequence", metavar="PATH",
+                        help="Send the transmit sequence script PATH (see tx_sequence.py) on the first channel")
+    parser.add_argument("--sequence-repeat", type=int, default=1, metavar="N",
+                        help="Passes over the sequence, 0 = until the monitor stops (default: 1)")
+    parser.add_argument("--duration", type=float, default=0,
+                        help="Stop after this many seconds (default: run until Ctrl+C)")
+    parser.add_argument("--stats-interval", type=float, default=1.0,
+                        help="Seconds between statistics outputs (default: 1)")
+    parser.add_argument("--stats-format", choices=["json", "csv"], default="json",
+                        help="json: one object per line; csv: one row per message ID (default: json)")
+    parser.add_argument("--stats-file", help="Write statistics to this file instead of stdout")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve /metrics and /stats as JSON on http://127.0.0.1:PORT")
+    parser.add_argument("--jitter-buckets", metavar="US,US,...",
+                        help="Jitter histogram bucket edges in microseconds relative to the expected cycle time "
+                             "(default: -1000,-500,-200,-100,-50,50,100,200,500,1000)")
+    parser.add_argument("--late-tolerance", type=int, default=10,
+                        help="Percent over the DBC cycle time (GenMsgCycleTime) before a frame counts as late (default: 10)")
+    return parser.parse_args(argv)
+
+
+def select_channel(channels, text):
+    # -> (name, handle)
+    if not channels:
+        raise ValueError("No CAN channels available")
+    value = int(text, 0)
+    if value < len(channels):
+        return channels[value]
+    for name, handle in channels:
+        if handle == value:
+            return name, handle
+    raise ValueError(f"Channel {text} not available")
+
+
+def parse_bitrate(text):
+    # "500K" -> PCAN_BAUD_500K; "500K/2M" or an FD bitrate string -> PCAN-Basic FD bitrate string
+    if text.upper() in BITRATES:
+        return BITRATES[text.upper()]
+    if "/" in text or "=" in text:
+        return parse_fd_bitrate(text)
+    raise ValueError(f"Unknown bitrate: {text}")
+
+
+def parse_channel(available, text, default_bitrate, dbc_options=None):
+    # "CHANNEL[:BITRATE[:DBC]]" -> (name, handle, bitrate, db or None)
+    parts = text.split(":", 2)
+    name, handle = select_channel(available, parts[0])
+    bitrate = parse_bitrate(parts[1] if len(parts) > 1 and parts[1] else default_bitrate)
+    db = load_database(parts[2], **(dbc_options or {})) if len(parts) > 2 and parts[2] else None
+    return name, handle, bitrate, db
+
+
+def parse_transmit(db, text):
+    # "ID:PERIOD[:SIGNAL=VALUE,...]"; signals left out start at their initial value (or 0)
+    parts = text.split(":", 2)
+    if len(parts) < 2:
+        raise ValueError(f"Invalid transmit spec: {text}")
+    msg_id = int(parts[0], 16)
+    period_ms = int(parts[1])
+    message = db.get_message_by_frame_id(msg_id)
+    signal_values = {s.name: s.initial if s.initial is not None else 0 for s in message.signals}
+    if len(parts) == 3 and parts[2]:
+        for item in parts[2].split(","):
+            name, sep, value = item.partition("=")
+            if not sep or name not in signal_values:
+                raise ValueError(f"Unknown signal in transmit spec: {item}")
+            signal_values[name] = float(value)
+    return msg_id, period_ms, signal_values
+
+
+class StatsWriter:
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, stats):
+        if self._csv is None:
+            self.stream.write(json.dumps(stats) + "\n")
+        else:
+            totals = {name: stats[name] for name in CSV_FIELDS[:5]}
+            for message in stats["messages"]:
+                row = dict(totals, **message)
+                row["id"] = f"0x{message['id']:X}"
+                row["jitter_histogram"] = " ".join(str(count) for count in message["jitter_histogram"])
+                self._csv.writerow(row)
+        self.stream.flush()
+
+
+def run(args):
+    dbc_options = database_options(args)
+    db = load_database(args.dbc, **dbc_options)
+    engine = MonitorEngine(db, build_backend(args))
+    edges = [int(edge) for edge in args.jitter_buckets.split(",")] if args.jitter_buckets else DEFAULT_JITTER_EDGES_US
+    engine.snapshot_store.cycle_config = CycleStatsConfig(edges, args.late_tolerance)
+    available = engine.get_available_channels()
+    channels = [parse_channel(available, text, args.bitrate, dbc_options) for text in args.channels or ["0"]]
+    transmissions = [parse_transmit(db, text) for text in args.transmit]
+    id_filter = IdFilter.parse(args.filter, db) if args.filter else None
+
+    # Transmissions go out on the first channel
+    for name, handle, bitrate, channel_db in channels:
+        status = engine.initialize(handle, bitrate, db=channel_db, name=name)
+        if status != PCAN_ERROR_OK:
+            engine.close()
+            raise RuntimeError(f"Cannot initialize channel {name}: {engine.get_error_text(status)}")
+
+    if id_filter is not None:
+        for name, status in engine.set_id_filter(id_filter).items():
+            if status != PCAN_ERROR_OK:
+                print(f"Driver filter not available on {name}, filtering in software: "
+                      f"{engine.get_error_text(status)}", file=sys.stderr)
+
+    stop = threading.Event()
+    engine.on_transmit_error = lambda key, status: print(
+        f"Transmission {key} stopped: {engine.get_error_text(status)}", file=sys.stderr)
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    watcher = None
+    if args.watch_dbc:
+        def reload_database(new_db):
+            engine.reload_database(new_db)
+            print(f"Reloaded {args.dbc}: {len(new_db.messages)} messages", file=sys.stderr)
+
+        watcher = DatabaseWatcher(args.dbc, reload_database, on_error=lambda e: print(
+            f"Cannot reload {args.dbc}, keeping the loaded DBC: {e}", file=sys.stderr), **dbc_options)
+
+    stream = open(args.stats_file, "w", newline="") if args.stats_file else sys.stdout
+    writer = StatsWriter(stream, args.stats_format)
+    try:
+        if args.record:
+            engine.start_recording(args.record)
+        if args.trigger_capture:
+            if not args.trigger:
+                raise ValueError("--trigger-capture needs at least one --trigger")
+            trigger = engine.start_trigger_capture(args.trigger_capture, args.trigger,
+                                                   pre_seconds=args.pre_trigger, post_seconds=args.post_trigger)
+            trigger.on_trigger = lambda reason, timestamp_us: print(
+                f"Trigger: {reason} at {timestamp_us / 1e6:.6f} s", file=sys.stderr)
+        if args.export:
+            exporter = engine.start_export(args.export, row_group_size=args.export_row_group)
+            if exporter.skipped:
+                print(f"Not exported, a signal does not fit one 8-byte window: {', '.join(exporter.skipped)}",
+                      file=sys.stderr)
+        if args.decode_workers:
+            engine.start_decode_pipeline(args.decode_workers)
+        if args.metrics_port is not None:
+            engine.start_metrics_server(args.metrics_port)
+        engine.poll_interval = args.poll_interval
+        engine.use_rx_event = args.event
+        engine.start_reading()
+        if watcher is not None:
+            watcher.start()
+        for i, (msg_id, period_ms, signal_values) in enumerate(transmissions):
+            engine.start_transmission(i, msg_id, signal_values, period_ms)
+        if args.sequence:
+            sequence = engine.load_sequence(args.sequence)
+            print(f"Sequence {sequence.name}: {len(sequence)} steps, {sequence.frames} distinct frames, "
+                  f"{sequence.duration_ns / 1e6:g} ms per pass", file=sys.stderr)
+            engine.start_sequence(sequence, repeat=args.sequence_repeat, on_done=lambda player: print(
+                f"Sequence {'failed: ' + str(player.error) if player.error else 'done'}: {player.stats()}",
+                file=sys.stderr))
+
+        deadline = time.monotonic() + args.duration if args.duration else None
+        while True:
+            wait = args.stats_interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+            if wait <= 0 or stop.wait(wait):
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            writer.write(engine.stats())
+    finally:
+        # Final totals, then stop the threads and flush the capture
+        if watcher is not None:
+            watcher.stop()
+        writer.write(engine.stats())
+        engine.close()
+        if stream is not sys.stdout:
+            stream.close()
+
+
+if __name__ == "__main__":
+    try:
+        run(parse_args())
+    except (OSError, ImportError, ValueError, KeyError, RuntimeError, cantools.Error) as e:
+        sys.exit(f"Error: {e}")
@@ -0,0 +1,821 @@
+import threading
+import time
+from ctypes import memmove
+from PCANBasic import *
+import cantools
+from bus_backend import PCANBackend
+from decoder_table import DecoderTable
+from snapshot_store import SnapshotStore
+from tx_scheduler import TransmitScheduler
+from message_encoder import EncoderCache
+from capture import CaptureRecorder, pcan_timestamp_us
+from trigger_capture import TriggerCapture, TriggerSet
+from replay import TraceReplayer
+from tx_sequence import SequencePlayer, load_sequence
+from decode_pipeline import DecodePipeline
+from frame_merge import FrameMerger
+from signal_plot import SignalPlotter
+from bus_metrics import BusMetrics, DurationStat
+from id_filter import clear_driver_filter
+from canfd import FD_DLC, FD_LENGTHS, fd_bitrate, is_fd_bitrate
+
+
+# GUI-free monitor engine.
+# Owns the bus backend, one receive thread per initialized channel, DBC decoding (optionally a
+# DBC per channel), the latest-value snapshot store, binary capture, signal export, live
+# signal plots and cyclic transmission. Front ends (the Tk app, the headless CLI) only call
+# the control methods below and poll snapshot_store / stats(); nothing on the receive path
+# touches a UI toolkit.
+# Channels opened with a CAN FD bitrate string (canfd.py) are read with ReadFD into the
+# backend's reused TPCANMsgFD and transmit through WriteFD; captures, export, trigger capture
+# and the decode pipeline use 64-byte records while an FD channel is open.
+
+_MSG_FD = PCAN_MESSAGE_FD.value
+_MSG_BRS = PCAN_MESSAGE_BRS.value
+_MSG_NO_DATA = PCAN_MESSAGE_ERRFRAME.value | PCAN_MESSAGE_STATUS.value  # Counted and recorded, not decoded
+
+BAUDRATES = [
+    ("1 MBit/sec", PCAN_BAUD_1M),
+    ("800 kBit/sec", PCAN_BAUD_800K),
+    ("500 kBit/sec", PCAN_BAUD_500K),
+    ("250 kBit/sec", PCAN_BAUD_250K),
+    ("125 kBit/sec", PCAN_BAUD_125K),
+    ("100 kBit/sec", PCAN_BAUD_100K),
+    ("95.238 kBit/sec", PCAN_BAUD_95K),
+    ("83.333 kBit/sec", PCAN_BAUD_83K),
+    ("50 kBit/sec", PCAN_BAUD_50K),
+    ("47.619 kBit/sec", PCAN_BAUD_47K),
+    ("33.333 kBit/sec", PCAN_BAUD_33K),
+    ("20 kBit/sec", PCAN_BAUD_20K),
+    ("10 kBit/sec", PCAN_BAUD_10K),
+    ("5 kBit/sec", PCAN_BAUD_5K),
+    # CAN FD: nominal / data bit rate
+    ("FD 1 MBit / 8 MBit", fd_bitrate(1_000_000, 8_000_000)),
+    ("FD 1 MBit / 5 MBit", fd_bitrate(1_000_000, 5_000_000)),
+    ("FD 500 kBit / 5 MBit", fd_bitrate(500_000, 5_000_000)),
+    ("FD 500 kBit / 4 MBit", fd_bitrate(500_000, 4_000_000)),
+    ("FD 500 kBit / 2 MBit", fd_bitrate(500_000, 2_000_000)),
+    ("FD 250 kBit / 2 MBit", fd_bitrate(250_000, 2_000_000)),
+]
+
+
+class ChannelState:
+    # One initialized channel and its receive worker
+    __slots__ = ("handle", "index", "name", "bitrate", "fd", "db", "decoder_table", "reading", "thread",
+                 "rx_msg", "rx_view", "rx_frame_count", "rx_overrun_count", "rx_filtered_count", "driver_filtered",
+                 "metrics")
+
+    def __init__(self, handle, index, name, bitrate, db, decoder_table):
+        self.handle = handle
+        self.index = index  # Small number stored with every snapshot and captured frame
+        self.name = name
+        self.bitrate = bitrate  # PCAN_BAUD_* or a CAN FD bitrate string
+        self.fd = is_fd_bitrate(bitrate)
+        self.db = db  # None: the engine's DBC
+        self.decoder_table = decoder_table
+        self.reading = False
+        self.thread = None
+        self.rx_msg = None  # Receive buffer the backend refills for every frame
+        self.rx_view = None  # Byte view of its DATA, payloads are copied out of it with a single tobytes()
+        self.rx_frame_count = 0
+        self.rx_overrun_count = 0  # Driver receive queue overruns (PCAN_ERROR_QOVERRUN)
+        self.rx_filtered_count = 0  # Frames dropped by the software prefilter
+        self.driver_filtered = False  # The driver drops rejected IDs, so metrics only see accepted frames
+        self.metrics = BusMetrics(bitrate)  # Bus load, error frames, decode latency
+
+
+def _handle_key(handle):
+    # PCAN handles may be ctypes instances, which do not hash by value
+    return getattr(handle, "value", handle)
+
+
+class MonitorEngine:
+    def __init__(self, db, backend=None):
+        # CAN initialization: PCAN hardware by default, any bus backend with the PCANBasic API otherwise
+        self.backend = backend if backend is not None else PCANBackend()
+        self.channels = {}  # handle -> ChannelState, in the order the channels were initialized
+        self.handle = PCAN_USBBUS1  # Transmit channel: the first initialized one
+        self.reading = False
+
+        self.poll_interval = 10  # milliseconds, sleep between polls when the queue is empty
+        self.use_rx_event = False  # Wait on the driver's receive event instead of sleep polling
+        self.rx_event_timeout = 100  # milliseconds, upper bound for one wait on the receive event
+        self.rx_event_factory = self.backend.create_receive_event  # Pluggable wait primitive (see receive_event.py)
+
+        # Acceptance filter (id_filter.IdFilter): pushed to the driver, exact check before recording/decoding
+        self.id_filter = None
+        # Unknown IDs and decode errors are counted; one summary line per report_interval at most
+        self.unknown_frames = 0
+        self.decode_errors = 0
+        self.report_interval = 5.0  # seconds
+        self._next_report = 0.0
+
+        self.db = db
+        self.backend.attach_database(db)
+        # Precompiled per-ID decoders, built once from the DBC (and again on reload_database)
+        self.decoder_table = DecoderTable(db)
+        self._reload_lock = threading.Lock()
+        # Cached per-message encoders for transmissions, re-encode only when signal values change
+        self.encoders = EncoderCache(db)
+        # Latest value per CAN ID (payload, decoded signals, count, cycle statistics in microseconds)
+        self.snapshot_store = SnapshotStore()
+
+        # Binary capture of raw received frames, fed from the receive thread
+        self.recorder = None
+        # Columnar export of decoded signals (Parquet / HDF5), fed like the capture
+        self.exporter = None
+        # Pre/post trigger capture: ring of recent frames, dumped around trigger events
+        self.trigger = None
+        # Live plot of selected signals: per-signal rings with min/max decimation, read by the front end
+        self.plotter = None
+        # With several channels capture and export are fed through a merge stage in hardware timestamp order
+        self.merger = None
+        # record() of every raw frame consumer above, rebuilt by _update_sinks()
+        self.frame_sinks = ()
+
+        # Optional decoder processes; when running, the receive thread only hands raw frames over
+        self.pipeline = None
+
+        # One scheduler thread for all cyclic transmissions
+        self.on_transmit_error = None  # on_transmit_error(key, status), called from the scheduler thread
+        self.tx_scheduler = TransmitScheduler(self.write_message, on_error=self._transmit_failed)
+        self.transmissions = {}  # key -> (msg_id, encoded data, signal values)
+        # Scripted transmit sequence (tx_sequence.py), sent in batches from its own thread
+        self.sequence_player = None
+
+        # Instrumentation: see metrics()
+        self.metrics_interval = 1.0  # seconds, rates and window maxima are recomputed at most this often
+        self.ui_tick = DurationStat()  # Fed by the front end with the duration of each refresh
+        self.metrics_server = None
+        self._metrics = None
+        self._metrics_time = 0.0
+        self._metrics_lock = threading.Lock()
+
+    # -------------------------------------------------- Channel ----------------------------------------------------- #
+    def get_available_channels(self):
+        return self.backend.get_available_channels()
+
+    @property
+    def initialized(self):
+        return bool(self.channels)
+
+    @property
+    def rx_frame_count(self):
+        return sum(state.rx_frame_count for state in list(self.channels.values()))
+
+    @property
+    def rx_overrun_count(self):
+        return sum(state.rx_overrun_count for state in list(self.channels.values()))
+
+    @property
+    def fd(self):
+        # A CAN FD channel is open: raw frame consumers need 64-byte records
+        return any(state.fd for state in list(self.channels.values()))
+
+    def initialize(self, handle, bitrate, db=None, name=None):
+        # Adds a channel next to the ones already open; db overrides the engine's DBC for it.
+        # bitrate: PCAN_BAUD_* for classic CAN, a PCAN-Basic FD bitrate string (canfd.fd_bitrate) for CAN FD
+        key = _handle_key(handle)
+        if key in self.channels:
+            self.uninitialize(handle)
+        fd = is_fd_bitrate(bitrate)
+        status = self.backend.InitializeFD(handle, bitrate) if fd else self.backend.Initialize(handle, bitrate)
+        if status != PCAN_ERROR_OK:
+            return status
+        # The driver only delivers error frames on request; backends without the parameter ignore it
+        self.backend.SetValue(handle, PCAN_ALLOW_ERROR_FRAMES, PCAN_PARAMETER_ON)
+
+        used = {state.index for state in self.channels.values()}
+        index = next(i for i in range(len(used) + 1) if i not in used)
+        decoder_table = DecoderTable(db) if db is not None else self.decoder_table
+        state = ChannelState(handle, index, name or f"{key:X}h", bitrate, db, decoder_table)
+        self.channels[key] = state
+        if self.id_filter is not None:
+            self._apply_id_filter(state)
+        if len(self.channels) == 1:
+            self.handle = handle
+        if self.pipeline is not None and (db is not None or (fd and not self.pipeline.fd)):
+            # Decoder processes need the new channel's DBC / FD-sized records
+            self.start_decode_pipeline(self.pipeline.workers)
+        if fd and any(consumer is not None and not consumer.fd
+                      for consumer in (self.recorder, self.exporter, self.trigger)):
+            print("Recording, export and trigger capture keep 8 data bytes per frame until restarted")
+        self._update_sinks()
+        if self.plotter is not None and db is not None:
+            self.plotter.rebind()  # Plotted signals of this channel index now decode with its own DBC
+        if self.reading:
+            self._start_channel(state)
+        return status
+
+    def uninitialize(self, handle=None):
+        # Closes one channel, or all of them when handle is None
+        if handle is None:
+            self.stop_reading()
+            self.stop_all_transmissions()
+            states = list(self.channels.values())
+            self.channels.clear()
+        else:
+            state = self.channels.pop(_handle_key(handle), None)
+            if state is None:
+                return
+            self._stop_channel(state)
+            states = [state]
+            if _handle_key(self.handle) == _handle_key(handle):
+                # Transmissions run on the first channel; move on to the next one
+                self.stop_all_transmissions()
+                if self.channels:
+                    self.handle = next(iter(self.channels.values())).handle
+        for state in states:
+            self.backend.Uninitialize(state.handle)
+        self._update_sinks()
+
+    def set_id_filter(self, id_filter):
+        # None or an empty filter accepts everything; returns {channel name: status of the driver filter}
+        if id_filter is not None and not len(id_filter):
+            id_filter = None
+        self.id_filter = id_filter
+        return {state.name: self._apply_id_filter(state) for state in list(self.channels.values())}
+
+    def _apply_id_filter(self, state):
+        # Driver filters only thin out the traffic; the software prefilter stays exact when they fail
+        if self.id_filter is None:
+            state.driver_filtered = False
+            return clear_driver_filter(self.backend, state.handle)
+        status = self.id_filter.apply_to_driver(self.backend, state.handle)
+        state.driver_filtered = status == PCAN_ERROR_OK
+        return status
+
+    def reload_database(self, db):
+        # Swaps in a new engine DBC while the receive threads keep running. The decoder table, encoders and
+        # trigger conditions are built first and then published with plain reference assignments, so every
+        # frame is decoded completely with either the old or the new table. Channels with their own DBC keep it;
+        # running transmissions keep their encoded payload and export keeps its columns until restarted.
+        with self._reload_lock:
+            decoder_table = DecoderTable(db)
+            encoders = EncoderCache(db)
+            trigger = self.trigger
+            triggers = None
+            if trigger is not None:
+                try:
+                    triggers = TriggerSet(trigger.triggers.conditions, db)
+                except ValueError as e:
+                    print(f"Trigger conditions stay on the previous DBC: {e}")
+
+            self.db = db
+            self.decoder_table = decoder_table
+            self.encoders = encoders
+            for state in list(self.channels.values()):
+                if state.db is None:
+                    state.decoder_table = decoder_table
+            if triggers is not None:
+                trigger.triggers = triggers
+            if self.plotter is not None:
+                self.plotter.rebind()  # Signals missing from the new DBC stop getting samples
+            self.backend.attach_database(db)
+            if self.pipeline is not None:
+                # Decoder processes build their tables from the DBC they were started with
+                try:
+                    self.start_decode_pipeline(self.pipeline.workers)
+                except RuntimeError as e:
+                    print(f"Decoding in the receive thread, the decoder processes did not restart: {e}")
+
+    def channel_names(self):
+        return {state.index: state.name for state in list(self.channels.values())}
+
+    def get_error_text(self, status):
+        return self.backend.GetErrorText(status, 0x09)[1].decode(errors='replace')
+    # ---------------------------------------------------------------------------------------------------------------- #
+
+    # -------------------------------------------------- Receive ----------------------------------------------------- #
+    def start_reading(self):
+        if self.reading:
+            return
+        self.reading = True
+        for state in list(self.channels.values()):
+            self._start_channel(state)
+
+    def stop_reading(self):
+        self.reading = False
+        for state in list(self.channels.values()):
+            self._stop_channel(state)
+
+    def _start_channel(self, state):
+        state.reading = True
+        state.thread = threading.Thread(target=self.read_messages, args=(state,))
+        state.thread.daemon = True
+        state.thread.start()
+
+    def _stop_channel(self, state):
+        state.reading = False
+        if state.thread:
+            state.thread.join(timeout=1)  # Wait for the thread to finish
+            state.thread = None
+
+    def read_messages(self, channel):
+        if self.use_rx_event:
+            rx_event = self.rx_event_factory()
+            if rx_event.attach(self.backend, channel.handle) == PCAN_ERROR_OK:
+                try:
+                    self.read_messages_event(rx_event, channel)
+                finally:
+                    rx_event.detach(self.backend, channel.handle)
+                    rx_event.close()
+                return
+            # Driver refused the event, fall back to polling
+            rx_event.close()
+            print("Receive event not available, falling back to polling")
+
+        while channel.reading:
+            self.drain_receive_queue(channel)
+            # Back off only when the queue is empty
+            time.sleep(self.poll_interval / 1000)  # Convert milliseconds to seconds
+
+    def read_messages_event(self, rx_event, channel):
+        while channel.reading:
+            # Wake on the driver event; the timeout only bounds how long stop_reading waits
+            if rx_event.wait(self.rx_event_timeout):
+                self.drain_receive_queue(channel)
+
+    def drain_receive_queue(self, channel):
+        if channel.fd:
+            read = self.backend.ReadFD
+            process = self.process_message_fd
+        else:
+            read = self.backend.Read
+            process = self.process_message
+        handle = channel.handle
+        latency = channel.metrics.decode_latency
+        clock = time.perf_counter_ns
+
+        # Drain the driver queue completely on every wake
+        while channel.reading:
+            stsResult = read(handle)
+            status = stsResult[0]
+            if status == PCAN_ERROR_OK:
+                received = clock()
+                process(stsResult[1], stsResult[2], channel)
+                latency.add(clock() - received)
+            elif status & PCAN_ERROR_QOVERRUN:
+                # Frames were lost in the driver, count it and keep draining
+                channel.rx_overrun_count += 1
+            else:
+                # PCAN_ERROR_QRCVEMPTY or a bus error: nothing more to read right now
+                break
+
+        pipeline = self.pipeline
+        if pipeline is not None:
+            pipeline.flush()
+
+    def process_message(self, msg, timestamp, channel):
+        # The backend reuses msg for the next frame, so the payload is copied once and shared by every consumer
+        view = channel.rx_view
+        if msg is not channel.rx_msg:
+            channel.rx_msg = msg
+            channel.rx_view = view = memoryview(msg.DATA).cast("B")
+        self.process_frame(pcan_timestamp_us(timestamp), msg.ID, msg.MSGTYPE, msg.LEN, view.tobytes(), channel)
+
+    def process_message_fd(self, msg, timestamp, channel):
+        # TPCANMsgFD: DLC is the length code and the timestamp a plain microsecond count; the payload is
+        # copied at its real length
+        view = channel.rx_view
+        if msg is not channel.rx_msg:
+            channel.rx_msg = msg
+            channel.rx_view = view = memoryview(msg.DATA).cast("B")
+        length = FD_LENGTHS[msg.DLC & 0xF]
+        self.process_frame(timestamp.value, msg.ID, msg.MSGTYPE, length,
+                           view.tobytes() if length == 64 else view[:length].tobytes(), channel)
+
+    def process_frame(self, timestamp_us, can_id, msg_type, length, data, channel):
+        # data: bytes owned by the frame (8 bytes for classic frames); length in bytes
+        channel.rx_frame_count += 1
+        channel.metrics.count(msg_type, length)
+        id_filter = self.id_filter
+        # Error and status frames carry an error code as ID, no filter rule applies to them
+        if id_filter is not None and not msg_type & _MSG_NO_DATA and not id_filter.accepts(can_id, msg_type):
+            channel.rx_filtered_count += 1
+            return
+
+        # Record every raw frame, known to the DBC or not
+        merger = self.merger
+        if merger is not None:
+            merger.push(timestamp_us, can_id, msg_type, length, data, channel.index)
+        else:
+            for sink in self.frame_sinks:
+                sink(timestamp_us, can_id, msg_type, length, data, channel.index)
+        if msg_type & _MSG_NO_DATA:
+            return
+
+        pipeline = self.pipeline
+        if pipeline is not None:
+            pipeline.submit(timestamp_us, can_id, msg_type, length, data, channel.index)
+            return
+
+        try:
+            decoder = channel.decoder_table.lookup(can_id)
+            if decoder is not None:
+                signal_values = decoder.decode(data)
+
+                # 更新最新值 (UI 只讀取有變動的 ID)
+                self.snapshot_store.update(can_id, msg_type, length, data, decoder, signal_values, timestamp_us,
+                                           channel.index)
+            else:
+                self.unknown_frames += 1
+                self._report(f"Unhandled message with ID: {can_id:#x}")
+        except cantools.Error as e:
+            self.decode_errors += 1
+            self._report(f"Error parsing message {can_id:#x}: {e}")
+        except Exception as e:
+            self.decode_errors += 1
+            self._report(f"Unexpected error: {e}")
+
+    def _report(self, text):
+        now = time.monotonic()
+        if now >= self._next_report:
+            self._next_report = now + self.report_interval
+            print(f"{text} ({self.unknown_frames} unhandled frames, {self.decode_errors} decode errors so far)")
+
+    def start_decode_pipeline(self, workers, **options):
+        # Decode in `workers` processes, partitioned by CAN ID
+        self.stop_decode_pipeline()
+        states = [state for state in self.channels.values() if state.db is not None]
+        pipeline = DecodePipeline(self.db, self.snapshot_store, self.decoder_table, workers=workers,
+                                  channel_databases={state.index: state.db for state in states},
+                                  channel_tables={state.index: state.decoder_table for state in states}, fd=self.fd,
+                                  **options)
+        pipeline.start()
+        self.pipeline = pipeline
+        return pipeline
+
+    def stop_decode_pipeline(self):
+        pipeline, self.pipeline = self.pipeline, None
+        if pipeline is not None:
+            pipeline.stop()
+
+    def reset(self):
+        if self.pipeline is not None:
+            self.pipeline.reset()
+        self.snapshot_store.clear()
+        if self.plotter is not None:
+            self.plotter.clear()
+        for state in list(self.channels.values()):
+            state.rx_frame_count = 0
+            state.rx_overrun_count = 0
+            state.rx_filtered_count = 0
+            state.metrics = BusMetrics(state.bitrate)
+            state.decoder_table.unknown_ids.clear()
+        self.decoder_table.unknown_ids.clear()
+        self.unknown_frames = 0
+        self.decode_errors = 0
+    # ---------------------------------------------------------------------------------------------------------------- #
+
+    # ------------------------------------------------- Recording ---------------------------------------------------- #
+    def start_recording(self, path, **options):
+        # Raises OSError when the capture file cannot be created
+        self.stop_recording()
+        options.setdefault("fd", self.fd)
+        recorder = CaptureRecorder(path, **options)
+        recorder.start()
+        self.recorder = recorder
+        self._update_sinks()
+        return recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        self._update_sinks()
+        if recorder is not None:
+            recorder.stop()
+        return recorder
+
+    def start_export(self, path, **options):
+        # Raises ImportError without numpy / pyarrow / h5py and OSError when the output cannot be created
+        from signal_export import SignalExporter
+        self.stop_export()
+        options.setdefault("fd", self.fd)
+        exporter = SignalExporter(path, self.db, channel_databases={
+            state.index: state.db for state in self.channels.values() if state.db is not None}, **options)
+        exporter.start()
+        self.exporter = exporter
+        self._update_sinks()
+        return exporter
+
+    def stop_export(self):
+        exporter, self.exporter = self.exporter, None
+        self._update_sinks()
+        if exporter is not None:
+            exporter.stop()  # Writes the remaining rows
+        return exporter
+
+    def start_trigger_capture(self, path, conditions, pre_seconds=5.0, post_seconds=5.0, **options):
+        # Raises ValueError for bad trigger conditions; dumps go to <path stem>_NNNN.cancap
+        triggers = TriggerSet(conditions, self.db)
+        self.stop_trigger_capture()
+        options.setdefault("fd", self.fd)
+        trigger = TriggerCapture(path, triggers, pre_seconds=pre_seconds, post_seconds=post_seconds, **options)
+        trigger.start()
+        self.trigger = trigger
+        self._update_sinks()
+        return trigger
+
+    def stop_trigger_capture(self):
+        trigger, self.trigger = self.trigger, None
+        self._update_sinks()
+        if trigger is not None:
+            trigger.stop()  # Ends a dump in progress
+        return trigger
+
+    def start_plot(self, **options):
+        # -> the running SignalPlotter, created on first use; signals are added with plotter.add()
+        if self.plotter is None:
+            self.plotter = SignalPlotter(self._plot_decoder, **options)
+            self._update_sinks()
+        return self.plotter
+
+    def stop_plot(self):
+        plotter, self.plotter = self.plotter, None
+        self._update_sinks()
+        return plotter
+
+    def _plot_decoder(self, channel, can_id):
+        # Decoder entry of a CAN ID on a channel index, from the channel's own DBC when it has one
+        table = next((state.decoder_table for state in list(self.channels.values()) if state.index == channel),
+                     self.decoder_table)
+        return table.entries.get(can_id)
+
+    def _update_sinks(self):
+        sinks = tuple(consumer.record for consumer in (self.recorder, self.exporter, self.trigger, self.plotter)
+                      if consumer is not None)
+        # The merge stage is only needed while feeding raw frames from more than one channel
+        if sinks and len(self.channels) > 1:
+            self.frame_sinks = sinks
+            if self.merger is None:
+                merger = FrameMerger(self._record_frame)
+                merger.start()
+                self.merger = merger
+        else:
+            if self.merger is not None:
+                merger, self.merger = self.merger, None
+                merger.stop()  # Flushes the frames still held back into the consumers
+            self.frame_sinks = sinks
+
+    def _record_frame(self, timestamp_us, can_id, msg_type, dlc, data, channel):
+        # Merge stage sink
+        for sink in self.frame_sinks:
+            sink(timestamp_us, can_id, msg_type, dlc, data, channel)
+    # ---------------------------------------------------------------------------------------------------------------- #
+
+    # ------------------------------------------------- Transmit ----------------------------------------------------- #
+    def start_transmission(self, key, msg_id, signal_values, period_ms):
+        # Raises KeyError for IDs not in the DBC and ValueError for bad values or periods
+        if period_ms <= 0:
+            raise ValueError("Interval must be a positive integer")
+        data = self.encoders.get(msg_id).encode(signal_values)
+        self.transmissions[key] = (msg_id, data, signal_values)
+        self.tx_scheduler.add(key, self.build_tx_message(msg_id, data), period_ms)
+        return data
+
+    def update_transmission(self, key, signal_values):
+        # Push new signal values into a running transmission without restarting its cycle
+        tx_data = self.transmissions.get(key)
+        if tx_data is None:
+            return None
+        msg_id, old_data, _ = tx_data
+        data = self.encoders.get(msg_id).encode(signal_values)
+        if data is not old_data:
+            self.tx_scheduler.update_message(key, self.build_tx_message(msg_id, data))
+        self.transmissions[key] = (msg_id, data, signal_values)
+        return data
+
+    def stop_transmission(self, key):
+        self.transmissions.pop(key, None)
+        self.tx_scheduler.remove(key)
+
+    def stop_all_transmissions(self):
+        for key in list(self.transmissions):
+            self.stop_transmission(key)
+
+    def transmission_stats(self, key):
+        return self.tx_scheduler.stats(key)
+
+    def build_tx_message(self, msg_id, data):
+        message = self.encoders.get(msg_id).message
+        msg_type = PCAN_MESSAGE_EXTENDED.value if message.is_extended_frame else PCAN_MESSAGE_STANDARD.value
+        state = self.channels.get(_handle_key(self.handle))
+        if state is not None and state.fd:
+            # FD channels only take TPCANMsgFD; payloads over 8 bytes and FD messages of the DBC go out as
+            # CAN FD frames with bit rate switch, the rest as classic frames
+            msg = TPCANMsgFD()
+            msg.ID = msg_id
+            if len(data) > 8 or message.is_fd:
+                msg_type |= _MSG_FD | _MSG_BRS
+            msg.MSGTYPE = msg_type
+            msg.DLC = FD_DLC[len(data)]
+            memmove(msg.DATA, data, len(data))
+            return msg
+        msg = TPCANMsg()
+        msg.ID = msg_id
+        msg.MSGTYPE = msg_type
+        msg.LEN = len(data)
+        for i, byte in enumerate(data):
+            msg.DATA[i] = byte
+        return msg
+
+    def write_message(self, msg):
+        # Called from the scheduler and replay threads
+        if type(msg) is TPCANMsgFD:
+            return self.backend.WriteFD(self.handle, msg)
+        return self.backend.Write(self.handle, msg)
+
+    def write_messages(self, msgs):
+        # Called from the sequence thread -> (status, frames written)
+        return self.backend.WriteMany(self.handle, msgs)
+
+    def _transmit_failed(self, key, status):
+        # The scheduler already dropped the job
+        self.transmissions.pop(key, None)
+        if self.on_transmit_error:
+            self.on_transmit_error(key, status)
+
+    def start_replay(self, frames, speed=1.0, id_filter=None, on_done=None):
+        state = self.channels.get(_handle_key(self.handle))
+        replayer = TraceReplayer(self.write_message, frames, speed=speed, id_filter=id_filter, on_done=on_done,
+                                 fd=state is not None and state.fd)
+        replayer.start()
+        return replayer
+
+    def load_sequence(self, path):
+        # Compiles a sequence script for the transmit channel; raises OSError and ValueError
+        state = self.channels.get(_handle_key(self.handle))
+        return load_sequence(path, self.db, fd=state is not None and state.fd)
+
+    def start_sequence(self, sequence, repeat=1, on_done=None):
+        # repeat: passes over the sequence, 0 = until stop_sequence()
+        self.stop_sequence()
+        player = SequencePlayer(self.write_messages, sequence, repeat=repeat, on_done=on_done)
+        player.start()
+        self.sequence_player = player
+        return player
+
+    def stop_sequence(self):
+        player, self.sequence_player = self.sequence_player, None
+        if player is not None:
+            player.stop()
+        return player
+    # ---------------------------------------------------------------------------------------------------------------- #
+
+    # ------------------------------------------------- Statistics --------------------------------------------------- #
+    def stats(self):
+        messages = []
+        for snapshot in sorted(self.snapshot_store.snapshots(), key=lambda s: (s.channel, s.can_id)):
+            cycle = snapshot.cycle
+            messages.append({
+                "channel": snapshot.channel,
+                "id": snapshot.can_id,
+                "name": snapshot.decoder.name,
+                "count": snapshot.count,
+                "cycle_us": cycle.interval_us,
+                "cycle_min_us": cycle.min_us,
+                "cycle_max_us": cycle.max_us,
+                "cycle_mean_us": round(cycle.mean_us, 1),
+                "cycle_std_us": round(cycle.std_us, 1),
+                "expected_us": cycle.expected_us,
+                "missing": cycle.missing,
+                "late": cycle.late,
+                "jitter_histogram": cycle.histogram,
+            })
+
+        transmit = []
+        for key, (msg_id, data, _) in list(self.transmissions.items()):
+            stats = self.tx_scheduler.stats(key)
+            if stats:
+                transmit.append(dict(stats, key=str(key), id=msg_id))
+
+        channels = [{
+            "channel": state.index,
+            "name": state.name,
+            "fd": state.fd,
+            "frames": state.rx_frame_count,
+            "overruns": state.rx_overrun_count,
+            "filtered": state.rx_filtered_count,
+        } for state in list(self.channels.values())]
+
+        recorder = self.recorder
+        exporter = self.exporter
+        trigger = self.trigger
+        pipeline = self.pipeline
+        sequence_player = self.sequence_player
+        return {
+            "time": time.time(),
+            "frames": self.rx_frame_count,
+            "overruns": self.rx_overrun_count,
+            "recorded": recorder.recorded if recorder else 0,
+            "dropped": recorder.dropped if recorder else 0,
+            "pipeline_dropped": pipeline.dropped if pipeline else 0,
+            "filtered": sum(channel["filtered"] for channel in channels),
+            "unknown": self.unknown_frames + (pipeline.unknown if pipeline else 0),
+            "decode_errors": self.decode_errors + (pipeline.errors if pipeline else 0),
+            "unknown_ids": self.unknown_ids(),
+            "exported": exporter.exported if exporter else 0,
+            "export_dropped": exporter.dropped if exporter else 0,
+            "export_skipped": exporter.skipped if exporter else [],
+            "triggers": {
+                "fired": trigger.fired,
+                "suppressed": trigger.suppressed,
+                "dropped": trigger.dropped,
+                "dumps": [{"file": path, "reason": reason, "timestamp_us": timestamp_us}
+                          for path, reason, timestamp_us in list(trigger.events)],
+            } if trigger else None,
+            "sequence": sequence_player.stats() if sequence_player else None,
+            "channels": channels,
+            "metrics": self.metrics(),
+            "jitter_buckets_us": self.snapshot_store.cycle_config.bucket_labels(),
+            "messages": messages,
+            "transmit": transmit,
+        }
+
+    def unknown_ids(self, limit=10):
+        # Most frequent IDs missing from the DBC -> {"0x123": frames}; receive-thread decoding only
+        counts = {}
+        tables = {id(table): table for table in [self.decoder_table] + [s.decoder_table for s in list(self.channels.values())]}
+        for table in tables.values():
+            for can_id, count in list(table.unknown_ids.items()):
+                counts[can_id] = counts.get(can_id, 0) + count
+        top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return {f"{can_id:#x}": count for can_id, count in top}
+
+    def metrics(self):
+        # Bus load per channel plus the tool's own latencies and backlogs; cached for metrics_interval so
+        # every consumer (GUI, CLI, metrics endpoint) sees the same window
+        with self._metrics_lock:
+            now = time.monotonic()
+            if self._metrics is None or now - self._metrics_time >= self.metrics_interval:
+                self._metrics = self._sample_metrics()
+                self._metrics_time = now
+            return self._metrics
+
+    def _sample_metrics(self):
+        channels = []
+        for state in list(self.channels.values()):
+            bus = state.metrics
+            bus.sample()
+            channels.append({
+                "channel": state.index,
+                "name": state.name,
+                "bitrate": bus.bitrate_bps,
+                "data_bitrate": bus.data_bitrate_bps,
+                # With a driver filter the rates cover the accepted frames only, which is no bus load
+                "driver_filtered": state.driver_filtered,
+                "frames_per_s": round(bus.frames_per_s, 1),
+                "bits_per_s": round(bus.bits_per_s),
+                "load_pct": None if state.driver_filtered else round(bus.load_pct, 2),
+                "error_frames": bus.error_frames,
+                "error_frames_per_s": round(bus.errors_per_s, 1),
+                "overruns": state.rx_overrun_count,
+                "decode_latency_us": bus.decode_latency.take(),
+            })
+
+        transmit_late = [stats["late_max_ms"] for stats in map(self.tx_scheduler.stats, list(self.transmissions))
+                         if stats]
+        recorder = self.recorder
+        exporter = self.exporter
+        merger = self.merger
+        pipeline = self.pipeline
+        return {
+            "channels": channels,
+            "update_queue": self.snapshot_store.pending(),
+            "merge_backlog": merger.backlog if merger else 0,
+            "merge_dropped": merger.dropped if merger else 0,
+            "record_backlog": recorder.backlog if recorder else 0,
+            "export_backlog": exporter.backlog if exporter else 0,
+            "pipeline_in_flight": pipeline.in_flight if pipeline else 0,
+            "pipeline_latency_ms": pipeline.batch_latency.take(1e6) if pipeline else None,
+            "ui_tick_ms": self.ui_tick.take(1e6),
+            "transmit_late_max_ms": round(max(transmit_late), 3) if transmit_late else 0,
+        }
+
+    def start_metrics_server(self, port, host="127.0.0.1"):
+        # Serves metrics() and stats() as JSON on http://host:port/metrics and /stats; raises OSError when the port is taken
+        from metrics_server import MetricsServer
+        self.stop_metrics_server()
+        server = MetricsServer(self, port, host)
+        server.start()
+        self.metrics_server = server
+        return server
+
+    def stop_metrics_server(self):
+        server, self.metrics_server = self.metrics_server, None
+        if server is not None:
+            server.stop()
+    # ---------------------------------------------------------------------------------------------------------------- #
+
+    def close(self):
+        self.stop_metrics_server()
+        self.stop_reading()
+        self.stop_decode_pipeline()
+        self.stop_sequence()
+        self.stop_all_transmissions()
+        self.stop_recording()
+        self.stop_export()
+        self.stop_trigger_capture()
+        self.stop_plot()
+        self.uninitialize()
+        self.tx_scheduler.stop()
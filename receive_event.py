@@ -0,0 +1,91 @@
+import platform
+import select
+import threading
+from PCANBasic import *
+
+
+# Wait primitives for the event-driven receive mode.
+# Every primitive offers the same small interface:
+#   attach(pcan, handle) -> TPCANStatus   register the event with the driver
+#   wait(timeout_ms)     -> bool          True if the driver signalled new frames
+#   detach(pcan, handle)                  unregister the event from the driver
+#   close()                               release OS resources
+
+
+class Win32ReceiveEvent:
+    # Auto-reset Win32 event handed to the driver through PCAN_RECEIVE_EVENT
+    WAIT_OBJECT_0 = 0x00000000
+
+    def __init__(self):
+        import ctypes
+        self._kernel32 = ctypes.windll.kernel32
+        self._kernel32.CreateEventW.restype = ctypes.c_void_p
+        self._kernel32.WaitForSingleObject.argtypes = [ctypes.c_void_p, ctypes.c_uint32]
+        self._kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+        self.handle = self._kernel32.CreateEventW(None, False, False, None)
+
+    def attach(self, pcan, handle):
+        return pcan.SetValue(handle, PCAN_RECEIVE_EVENT, self.handle)
+
+    def wait(self, timeout_ms):
+        return self._kernel32.WaitForSingleObject(self.handle, int(timeout_ms)) == self.WAIT_OBJECT_0
+
+    def detach(self, pcan, handle):
+        pcan.SetValue(handle, PCAN_RECEIVE_EVENT, 0)
+
+    def close(self):
+        if self.handle:
+            self._kernel32.CloseHandle(self.handle)
+            self.handle = None
+
+
+class FdReceiveEvent:
+    # PCAN-Basic for Linux exposes the receive event as a file descriptor
+    def __init__(self):
+        self.fd = None
+
+    def attach(self, pcan, handle):
+        result = pcan.GetValue(handle, PCAN_RECEIVE_EVENT)
+        if result[0] == PCAN_ERROR_OK:
+            self.fd = result[1]
+        return result[0]
+
+    def wait(self, timeout_ms):
+        readable, _, _ = select.select([self.fd], [], [], timeout_ms / 1000)
+        return bool(readable)
+
+    def detach(self, pcan, handle):
+        self.fd = None
+
+    def close(self):
+        self.fd = None
+
+
+class ThreadingReceiveEvent:
+    # In-process event for fake/virtual buses: the bus calls set() whenever it queues a frame
+    def __init__(self):
+        self._event = threading.Event()
+
+    def attach(self, pcan, handle):
+        return pcan.SetValue(handle, PCAN_RECEIVE_EVENT, self)
+
+    def set(self):
+        self._event.set()
+
+    def wait(self, timeout_ms):
+        signalled = self._event.wait(timeout_ms / 1000)
+        self._event.clear()
+        return signalled
+
+    def detach(self, pcan, handle):
+        pcan.SetValue(handle, PCAN_RECEIVE_EVENT, None)
+
+    def close(self):
+        self._event.set()
+
+
+def create_receive_event():
+    # Pick the native wait primitive of the running platform
+    if platform.system() == "Windows":
+        return Win32ReceiveEvent()
+    return FdReceiveEvent()
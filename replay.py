@@ -0,0 +1,247 @@
+import ctypes
+import os
+import threading
+import time
+from PCANBasic import *
+from capture import CAPTURE_MAGIC, CAPTURE_VERSIONS, FILE_HEADER, RECORD_FORMATS
+from canfd import FD_DLC
+from tx_scheduler import HighResolutionTimer
+
+
+# Trace replay through the transmit path.
+# Readers stream frames from disk one chunk/line at a time, so multi-GB traces are never
+# loaded into memory. Every reader yields the same tuple:
+#   (timestamp_us, can_id, msg_type, dlc, data)
+# with msg_type holding PCAN_MESSAGE_* flags, dlc the payload length in bytes and data as bytes.
+# CAN FD frames carry PCAN_MESSAGE_FD and are only replayed on CAN FD channels.
+
+TRACE_FILETYPES = [("CAN capture", "*.cancap"), ("Vector ASC", "*.asc"), ("Vector BLF", "*.blf"),
+                   ("candump log", "*.log"), ("All files", "*.*")]
+
+_MSG_STANDARD = PCAN_MESSAGE_STANDARD.value
+_MSG_EXTENDED = PCAN_MESSAGE_EXTENDED.value
+_MSG_RTR = PCAN_MESSAGE_RTR.value
+_MSG_FD = PCAN_MESSAGE_FD.value
+_MSG_BRS = PCAN_MESSAGE_BRS.value
+_MSG_ESI = PCAN_MESSAGE_ESI.value
+
+
+# ---------------------------------------------------- Readers -------------------------------------------------------- #
+def read_capture(path, chunk_records=4096, channel=None):
+    # channel: only yield frames received on this channel index
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+        magic, version, record_size = FILE_HEADER.unpack(header)
+        if magic != CAPTURE_MAGIC or version not in CAPTURE_VERSIONS or record_size not in RECORD_FORMATS:
+            raise ValueError(f"{path} is not a supported capture file")
+        record = RECORD_FORMATS[record_size]
+        while True:
+            chunk = f.read(chunk_records * record_size)
+            if not chunk:
+                return
+            usable = len(chunk) - len(chunk) % record_size  # Ignore a truncated last record
+            for timestamp_us, can_id, msg_type, dlc, frame_channel, data in record.iter_unpack(chunk[:usable]):
+                if channel is not None and frame_channel != channel:
+                    continue
+                yield timestamp_us, can_id, msg_type, dlc, data[:dlc]
+
+
+def read_candump(path):
+    # candump -L / log format: "(1436509052.249713) can0 123#DEADBEEF", CAN FD: "123##1DEADBEEF"
+    # (one hex digit of flags after "##": 1 = bit rate switch, 2 = error state indicator)
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 3 or not parts[0].startswith("("):
+                continue
+            can_id_text, sep, payload = parts[2].partition("#")
+            if not sep:
+                continue
+            timestamp_us = int(round(float(parts[0][1:-1]) * 1_000_000))
+            can_id = int(can_id_text, 16)
+            msg_type = _MSG_EXTENDED if len(can_id_text) > 3 else _MSG_STANDARD
+            if payload.startswith("#"):
+                flags = int(payload[1:2] or "0", 16)
+                msg_type |= _MSG_FD | (_MSG_BRS if flags & 1 else 0) | (_MSG_ESI if flags & 2 else 0)
+                data = bytes.fromhex(payload[2:])
+                yield timestamp_us, can_id, msg_type, len(data), data
+            elif payload.startswith("R"):
+                dlc = int(payload[1:] or 0)
+                yield timestamp_us, can_id, msg_type | _MSG_RTR, dlc, b""
+            else:
+                data = bytes.fromhex(payload)
+                yield timestamp_us, can_id, msg_type, len(data), data
+
+
+def read_asc(path):
+    # Vector ASC: "   0.010000 1  123x      Rx   d 8 00 01 02 03 04 05 06 07"
+    id_base = 16
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0] == "base":
+                id_base = 10 if parts[1] == "dec" else 16
+                continue
+            if len(parts) < 5 or not parts[1].isdigit() or parts[3] not in ("Rx", "Tx"):
+                continue
+            try:
+                timestamp_us = int(round(float(parts[0]) * 1_000_000))
+            except ValueError:
+                continue
+            can_id_text = parts[2]
+            msg_type = _MSG_STANDARD
+            if can_id_text.endswith(("x", "X")):
+                can_id_text = can_id_text[:-1]
+                msg_type = _MSG_EXTENDED
+            can_id = int(can_id_text, id_base)
+            if parts[4] == "r":
+                dlc = int(parts[5], 16) if len(parts) > 5 and parts[5].isalnum() else 0
+                yield timestamp_us, can_id, msg_type | _MSG_RTR, dlc, b""
+            elif parts[4] == "d" and len(parts) > 5:
+                dlc = int(parts[5], 16)
+                data = bytes(int(b, 16) for b in parts[6:6 + dlc])
+                yield timestamp_us, can_id, msg_type, dlc, data
+
+
+def read_blf(path):
+    # BLF needs python-can; its reader streams object by object
+    try:
+        import can
+    except ImportError:
+        raise ImportError("Replaying BLF files requires python-can (pip install python-can)")
+    for message in can.BLFReader(path):
+        if message.is_error_frame:
+            continue
+        msg_type = _MSG_EXTENDED if message.is_extended_id else _MSG_STANDARD
+        if message.is_remote_frame:
+            msg_type |= _MSG_RTR
+        if message.is_fd:
+            msg_type |= _MSG_FD
+            if message.bitrate_switch:
+                msg_type |= _MSG_BRS
+            if message.error_state_indicator:
+                msg_type |= _MSG_ESI
+        yield int(round(message.timestamp * 1_000_000)), message.arbitration_id, msg_type, message.dlc, bytes(message.data)
+
+
+def open_trace(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".asc":
+        return read_asc(path)
+    if ext == ".blf":
+        return read_blf(path)
+    if ext in (".log", ".candump"):
+        return read_candump(path)
+    return read_capture(path)
+# -------------------------------------------------------------------------------------------------------------------- #
+
+
+class TraceReplayer:
+    SPIN_NS = 500_000  # Busy-wait the last 500 us before a frame is due
+
+    def __init__(self, write, frames, speed=1.0, id_filter=None, on_frame=None, on_done=None, fd=False):
+        # speed: 1.0 = original timing, 10.0 = ten times faster, 0 = as fast as possible
+        if speed < 0:
+            raise ValueError("Speed must not be negative")
+        self.write = write  # write(msg) -> TPCANStatus
+        self.fd = fd  # Write TPCANMsgFD (CAN FD channel); otherwise CAN FD frames are skipped
+        self.frames = frames
+        self.speed = speed
+        self.id_filter = self._make_filter(id_filter)
+        self.on_frame = on_frame  # on_frame(frame, late_ns), called from the replay thread
+        self.on_done = on_done  # on_done(replayer), called from the replay thread
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.sent = 0
+        self.skipped = 0
+        self.errors = 0
+        self.late_max_ns = 0
+        self.late_total_ns = 0
+        self.error = None
+
+    @staticmethod
+    def _make_filter(id_filter):
+        if id_filter is None or callable(id_filter):
+            return id_filter
+        allowed = frozenset(id_filter)
+        return allowed.__contains__
+
+    @property
+    def late_mean_ns(self):
+        return self.late_total_ns / self.sent if self.sent else 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        timer_resolution = HighResolutionTimer()
+        try:
+            self._replay()
+        except Exception as e:
+            self.error = e
+        finally:
+            timer_resolution.release()
+            if self.on_done:
+                self.on_done(self)
+
+    def _replay(self):
+        fd = self.fd
+        msg = TPCANMsgFD() if fd else TPCANMsg()  # One buffer reused for every frame
+        write = self.write
+        id_filter = self.id_filter
+        speed = self.speed
+        spin_ns = self.SPIN_NS
+        stop = self._stop
+        perf_counter_ns = time.perf_counter_ns
+
+        trace_start = None
+        wall_start = None
+        for frame in self.frames:
+            if stop.is_set():
+                return
+            timestamp_us, can_id, msg_type, dlc, data = frame
+            if (id_filter is not None and not id_filter(can_id)) or (msg_type & _MSG_FD and not fd):
+                self.skipped += 1
+                continue
+
+            if trace_start is None:
+                trace_start = timestamp_us
+                wall_start = perf_counter_ns()
+            due_ns = wall_start
+            if speed:
+                due_ns += int((timestamp_us - trace_start) * 1000 / speed)
+                remaining = due_ns - perf_counter_ns()
+                if remaining > spin_ns and stop.wait((remaining - spin_ns) / 1e9):
+                    return
+                while perf_counter_ns() < due_ns:
+                    pass
+
+            msg.ID = can_id
+            msg.MSGTYPE = msg_type
+            if fd:
+                msg.DLC = FD_DLC[dlc]
+            else:
+                msg.LEN = dlc
+            ctypes.memmove(msg.DATA, data, len(data))
+            if write(msg) != PCAN_ERROR_OK:
+                self.errors += 1
+                continue
+
+            late_ns = perf_counter_ns() - due_ns if speed else 0
+            self.sent += 1
+            self.late_total_ns += late_ns
+            if late_ns > self.late_max_ns:
+                self.late_max_ns = late_ns
+            if self.on_frame:
+                self.on_frame(frame, late_ns)
@@ -0,0 +1,192 @@
+import os
+import numpy as np
+from PCANBasic import *
+from capture import CaptureRecorder
+from batch_decode import BatchDecoder, CAPTURE_DTYPES
+
+
+# Streaming columnar export of decoded signals.
+# The receive thread only packs raw frames into the capture ring (same single-producer ring as
+# CaptureRecorder); the writer thread batch-decodes each chunk of the ring with NumPy, appends
+# the columns per message and writes them out in fixed-size row groups. Memory stays bounded by
+# the ring plus at most max_pending_rows decoded rows: past that the biggest message is written
+# early as a shorter row group.
+#
+# Output, one table per message with the columns timestamp (us), channel and one per signal:
+#   Parquet (default):  <path>/<message>.parquet                 pandas.read_parquet(file)
+#   HDF5 (.h5, .hdf5):  <path>:/<message>/<column> datasets       pandas.DataFrame({c: g[c][:] for c in g})
+# Messages of channels with their own DBC are stored as ch<channel>_<message>.
+
+EXPORT_FORMATS = ("parquet", "hdf5")
+HDF5_EXTENSIONS = (".h5", ".hdf5")
+
+# Remote, status and error frames carry no DBC payload
+_SKIPPED_TYPES = PCAN_MESSAGE_RTR.value | PCAN_MESSAGE_STATUS.value | PCAN_MESSAGE_ERRFRAME.value
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._writers = {}
+
+    def write(self, key, columns):
+        table = self._pa.Table.from_pydict(columns)
+        writer = self._writers.get(key)
+        if writer is None:
+            writer = self._pq.ParquetWriter(os.path.join(self.path, f"{key}.parquet"), table.schema)
+            self._writers[key] = writer
+        writer.write_table(table, row_group_size=len(table))
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+
+class _HDF5Writer:
+    def __init__(self, path, chunk_rows):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("HDF5 export requires h5py (pip install h5py)")
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self._file = h5py.File(path, "w", track_order=True)
+
+    def write(self, key, columns):
+        group = self._file.get(key)
+        if group is None:
+            group = self._file.create_group(key, track_order=True)  # Keep the column order
+        for name, values in columns.items():
+            dataset = group.get(name)
+            if dataset is None:
+                dataset = group.create_dataset(name, shape=(0,), maxshape=(None,), dtype=values.dtype,
+                                               chunks=(self.chunk_rows,))
+            size = dataset.shape[0]
+            dataset.resize((size + len(values),))
+            dataset[size:] = values
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SignalExporter(CaptureRecorder):
+    def __init__(self, path, db, channel_databases=None, fmt=None, row_group_size=65536, max_pending_rows=None,
+                 capacity=1 << 16, batch_records=4096, flush_interval=0.1, fd=False):
+        if fmt is None:
+            fmt = "hdf5" if path.lower().endswith(HDF5_EXTENSIONS) else "parquet"
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        super().__init__(path, capacity=capacity, batch_records=batch_records, flush_interval=flush_interval,
+                         max_bytes=0, fd=fd)
+        self._dtype = CAPTURE_DTYPES[self.record_size]
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.max_pending_rows = max_pending_rows or 4 * row_group_size
+        self.decoder = BatchDecoder(db)
+        # channel index -> BatchDecoder for channels with their own DBC
+        self.channel_decoders = {channel: BatchDecoder(channel_db)
+                                 for channel, channel_db in (channel_databases or {}).items()}
+        self._writer = None
+        self._pending = {}  # key -> [column dicts] not written yet
+        self._pending_rows = {}  # key -> rows in _pending[key]
+        self._total_pending = 0
+
+        self.exported = 0  # Decoded rows written
+        self.row_groups = 0
+
+    @property
+    def skipped(self):
+        # Messages left out of the export, with the same ch<N>_ prefix as their output
+        return self.decoder.skipped + [f"ch{channel}_{name}" for channel, decoder in self.channel_decoders.items()
+                                       for name in decoder.skipped]
+
+    # Ring consumer: decode and write instead of dumping raw records
+    def _flush(self):
+        head = self._head
+        tail = self._tail
+        while tail < head:
+            start = tail % self.capacity
+            count = min(head - tail, self.capacity - start)
+            records = np.frombuffer(self._buffer, dtype=self._dtype, count=count, offset=start * self.record_size)
+            # Decoding copies the columns out, so the slots can be reused right after
+            self._append(records)
+            del records
+            tail += count
+            self._tail = tail
+        self._write_pending()
+
+    def _append(self, records):
+        records = records[(records["msg_type"] & _SKIPPED_TYPES) == 0]
+        if not len(records):
+            return
+        channels = records["channel"]
+        default = np.ones(len(records), dtype=bool)
+        for channel, decoder in self.channel_decoders.items():
+            mask = channels == channel
+            if mask.any():
+                default &= ~mask
+                self._append_decoded(decoder, records[mask], f"ch{channel}_")
+        if default.all():
+            self._append_decoded(self.decoder, records, "")
+        elif default.any():
+            self._append_decoded(self.decoder, records[default], "")
+
+    def _append_decoded(self, decoder, records, prefix):
+        results = decoder.decode(records["timestamp_us"], records["can_id"], records["data"], records["dlc"],
+                                 channels=records["channel"])
+        for name, columns in results.items():
+            key = prefix + name
+            rows = len(columns["timestamp"])
+            self._pending.setdefault(key, []).append(columns)
+            self._pending_rows[key] = self._pending_rows.get(key, 0) + rows
+            self._total_pending += rows
+
+    def _write_pending(self, force=False):
+        for key in list(self._pending):
+            if force or self._pending_rows[key] >= self.row_group_size:
+                self._write(key, force)
+        # Bound the memory held by partly filled row groups
+        while self._total_pending > self.max_pending_rows:
+            self._write(max(self._pending_rows, key=self._pending_rows.get), True)
+
+    def _write(self, key, partial):
+        chunks = self._pending.pop(key)
+        rows = self._pending_rows.pop(key)
+        columns = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+        self._total_pending -= rows
+        written = rows if partial else rows - rows % self.row_group_size
+        for start in range(0, written, self.row_group_size):
+            self._writer.write(key, {name: values[start:start + self.row_group_size]
+                                     for name, values in columns.items()})
+            self.row_groups += 1
+        self.exported += written
+        if written < rows:
+            self._pending[key] = [{name: values[written:] for name, values in columns.items()}]
+            self._pending_rows[key] = rows - written
+            self._total_pending += rows - written
+
+    def _open_next_file(self):
+        # Raises ImportError without pyarrow / h5py and OSError when the output cannot be created
+        if self.fmt == "hdf5":
+            self._writer = _HDF5Writer(self.path, self.row_group_size)
+        else:
+            self._writer = _ParquetWriter(self.path)
+        self.files.append(self.path)
+
+    def _close_file(self):
+        if self._writer is not None:
+            self._write_pending(force=True)
+            self._writer.close()
+            self._writer = None
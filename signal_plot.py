@@ -0,0 +1,199 @@
+import threading
+from array import array
+
+
+# Live plot data for selected signals.
+# The plotter is a raw frame consumer like capture and export, so it sees every frame (also with
+# the decode pipeline running) and decodes only the plotted IDs with the precompiled DecoderTable;
+# frames of other IDs cost one dict lookup. Each plotted signal gets a SignalTrace:
+#   - a fixed ring of the last `capacity` samples (hardware timestamp in us, value), so a trace
+#     never grows however long it runs
+#   - a min/max decimation of those samples into `columns` time buckets of span / columns each,
+#     updated per sample in O(1)
+# Drawing reads at most `columns` (min, max) pairs per trace, so its cost follows the plot width
+# in pixels and not the sample rate. Only a new span or plot width rebuilds the buckets, from the
+# raw ring. Samples are pushed from the receive (or merge) thread, the buckets are read by the UI.
+
+DEFAULT_CAPACITY = 1 << 16  # Samples per trace: about 11 minutes of a 100 Hz signal
+
+
+class SignalTrace:
+    __slots__ = ("channel", "can_id", "message_name", "signal_name", "unit", "index", "capacity", "times", "values",
+                 "count", "latest", "bucket_us", "columns", "bucket_ids", "mins", "maxs")
+
+    def __init__(self, channel, can_id, message_name, signal_name, unit, index, capacity, bucket_us, columns):
+        self.channel = channel
+        self.can_id = can_id
+        self.message_name = message_name
+        self.signal_name = signal_name
+        self.unit = unit
+        self.index = index  # Position in the decoder's value tuple; None while the signal is missing from the DBC
+        self.capacity = capacity
+        self.times = array("q", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.count = 0  # Samples pushed so far, the ring holds the last min(count, capacity)
+        self.latest = None
+        self._reset_buckets(bucket_us, columns)
+
+    def _reset_buckets(self, bucket_us, columns):
+        self.bucket_us = bucket_us
+        self.columns = columns
+        self.bucket_ids = array("q", [-1]) * columns  # Bucket number held by each slot
+        self.mins = array("d", bytes(8 * columns))
+        self.maxs = array("d", bytes(8 * columns))
+
+    def push(self, timestamp_us, value):
+        slot = self.count % self.capacity
+        self.times[slot] = timestamp_us
+        self.values[slot] = value
+        self.count += 1
+        self.latest = value
+        bucket = timestamp_us // self.bucket_us
+        slot = bucket % self.columns
+        if self.bucket_ids[slot] != bucket:
+            # First sample of a new bucket; the slot held the bucket one plot width earlier
+            self.bucket_ids[slot] = bucket
+            self.mins[slot] = value
+            self.maxs[slot] = value
+        elif value < self.mins[slot]:
+            self.mins[slot] = value
+        elif value > self.maxs[slot]:
+            self.maxs[slot] = value
+
+    def rebuild(self, bucket_us, columns):
+        # Decimate the ring's samples for a new span / plot width. Only the samples of the last plot width are
+        # replayed, older ones would land in buckets that are overwritten anyway
+        capacity = self.capacity
+        times, values = self.times, self.values
+        end = self.count
+        start = end
+        if end:
+            oldest = end - min(end, capacity)
+            first_us = (times[(end - 1) % capacity] // bucket_us - columns + 1) * bucket_us
+            while start > oldest and times[(start - 1) % capacity] >= first_us:
+                start -= 1
+        latest = self.latest
+        self._reset_buckets(bucket_us, columns)
+        # push() writes every sample back into the slot it is read from
+        self.count = start
+        for n in range(start, end):
+            slot = n % capacity
+            self.push(times[slot], values[slot])
+        self.latest = latest
+
+    def clear(self):
+        self.count = 0
+        self.latest = None
+        self._reset_buckets(self.bucket_us, self.columns)
+
+    def envelope(self, newest_us):
+        # -> [(column, min, max)] of the buckets in the plotted span ending at newest_us, column 0 at the left;
+        # columns without samples are left out
+        columns = self.columns
+        bucket_ids, mins, maxs = self.bucket_ids, self.mins, self.maxs
+        last = newest_us // self.bucket_us
+        first = last - columns + 1
+        points = []
+        for bucket in range(first, last + 1):
+            slot = bucket % columns
+            if bucket_ids[slot] == bucket:
+                points.append((bucket - first, mins[slot], maxs[slot]))
+        return points
+
+
+class SignalPlotter:
+    def __init__(self, lookup, capacity=DEFAULT_CAPACITY, span_us=60_000_000, columns=600):
+        self.lookup = lookup  # lookup(channel, can_id) -> DecoderEntry or None
+        self.capacity = capacity
+        self.span_us = span_us
+        self.columns = columns
+        self.traces = []  # In plot order
+        # channel -> {CAN ID: (decoder entry, [(value index, SignalTrace)])}; replaced as a whole when traces
+        # change, so the receive thread never sees it half updated
+        self._watched = {}
+        self._lock = threading.Lock()  # Pushes against rebuilds
+        self.newest_us = 0  # Newest timestamp of a plotted sample, the right edge of the plot
+        self.decode_errors = 0
+
+    @property
+    def bucket_us(self):
+        return max(1, self.span_us // self.columns)
+
+    def add(self, channel, can_id, signal_name):
+        # -> SignalTrace, the existing one when the signal is already plotted; raises ValueError for unknown signals
+        trace = self.find(channel, can_id, signal_name)
+        if trace is not None:
+            return trace
+        entry = self.lookup(channel, can_id)
+        if entry is None or signal_name not in entry.signal_names:
+            raise ValueError(f"Unknown signal {signal_name} in message {can_id:#x}")
+        signal = entry.signals[entry.signal_names.index(signal_name)]
+        trace = SignalTrace(channel, can_id, entry.name, signal_name, signal.unit or "", None, self.capacity,
+                            self.bucket_us, self.columns)
+        self.traces = self.traces + [trace]
+        self.rebind()
+        return trace
+
+    def remove(self, trace):
+        self.traces = [other for other in self.traces if other is not trace]
+        self.rebind()
+
+    def find(self, channel, can_id, signal_name):
+        return next((trace for trace in self.traces
+                     if trace.channel == channel and trace.can_id == can_id and trace.signal_name == signal_name), None)
+
+    def rebind(self):
+        # Resolves every trace against the current decoder tables, e.g. after a DBC reload
+        watched = {}
+        for trace in self.traces:
+            entry = self.lookup(trace.channel, trace.can_id)
+            if entry is None or trace.signal_name not in entry.signal_names:
+                trace.index = None  # Keeps its samples, gets no new ones
+                continue
+            trace.index = entry.signal_names.index(trace.signal_name)
+            trace.message_name = entry.name
+            ids = watched.setdefault(trace.channel, {})
+            ids.setdefault(trace.can_id, (entry, []))[1].append((trace.index, trace))
+        self._watched = watched
+
+    def set_resolution(self, span_us, columns):
+        if span_us == self.span_us and columns == self.columns:
+            return
+        self.span_us = span_us
+        self.columns = columns
+        with self._lock:
+            for trace in self.traces:
+                trace.rebuild(self.bucket_us, columns)
+
+    def clear(self):
+        with self._lock:
+            for trace in self.traces:
+                trace.clear()
+            self.newest_us = 0
+
+    def record(self, timestamp_us, can_id, msg_type, dlc, data, channel):
+        # Frame sink, called from a receive thread or the merge stage
+        ids = self._watched.get(channel)
+        if ids is None:
+            return
+        watched = ids.get(can_id)
+        if watched is None:
+            return
+        entry, traces = watched
+        try:
+            values = entry.decode(data)
+        except Exception:
+            self.decode_errors += 1
+            return
+        with self._lock:
+            for index, trace in traces:
+                value = values[index]
+                if value is None:
+                    continue  # Inactive multiplexed signal
+                if not isinstance(value, (int, float)):
+                    value = getattr(value, "value", None)  # Value table entry: plot the raw value
+                    if not isinstance(value, (int, float)):
+                        continue
+                trace.push(timestamp_us, value)
+            if timestamp_us > self.newest_us:
+                self.newest_us = timestamp_us
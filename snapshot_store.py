@@ -0,0 +1,110 @@
+import threading
+from cycle_stats import CycleStats, CycleStatsConfig
+
+
+# Latest-value-per-CAN-ID store shared by the receive threads and the UI tick.
+# Snapshots are kept per channel index and CAN ID, so the same ID on two buses stays apart.
+# A receive thread overwrites the snapshot of an ID on every frame and marks it dirty;
+# the UI tick only collects the IDs that changed since the previous tick, so its cost
+# depends on the number of active IDs and not on the frame rate. The per-frame update
+# allocates nothing of its own: one dict per channel avoids a (channel, ID) key tuple and the
+# dirty set holds the snapshot objects themselves.
+# Cycle times are tracked per snapshot in integer microseconds (see cycle_stats.py).
+
+
+class MessageSnapshot:
+    __slots__ = ("can_id", "channel", "msg_type", "length", "data", "decoder", "signal_values", "count",
+                 "last_time", "cycle")
+
+    def __init__(self, can_id, channel=0, cycle=None):
+        self.can_id = can_id
+        self.channel = channel
+        self.msg_type = 0
+        self.length = 0
+        self.data = b""
+        self.decoder = None
+        self.signal_values = ()
+        self.count = 0
+        self.last_time = None  # Timestamp of the last frame in microseconds
+        self.cycle = cycle if cycle is not None else CycleStats(CycleStatsConfig())
+
+    def copy(self):
+        snapshot = MessageSnapshot.__new__(MessageSnapshot)
+        for name in self.__slots__:
+            setattr(snapshot, name, getattr(self, name))
+        snapshot.cycle = self.cycle.copy()
+        return snapshot
+
+
+class SnapshotStore:
+    def __init__(self, cycle_config=None):
+        self.cycle_config = cycle_config or CycleStatsConfig()  # Used for IDs seen from now on
+        self._lock = threading.Lock()
+        self._channels = {}  # channel index -> {CAN ID: MessageSnapshot}
+        self._dirty = set()  # Snapshots changed since the last take_changed()
+
+    def update(self, can_id, msg_type, length, data, decoder, signal_values, timestamp_us, channel=0,
+               expected_us=None):
+        # expected_us: declared cycle time, taken from the decoder (DBC GenMsgCycleTime) when not given
+        with self._lock:
+            snapshots = self._channels.get(channel)
+            if snapshots is None:
+                snapshots = self._channels[channel] = {}
+            snapshot = snapshots.get(can_id)
+            if snapshot is None:
+                if expected_us is None:
+                    expected_us = decoder.cycle_time_us if decoder is not None else 0
+                snapshot = snapshots[can_id] = MessageSnapshot(can_id, channel,
+                                                               CycleStats(self.cycle_config, expected_us))
+
+            snapshot.cycle.add(timestamp_us)
+            snapshot.last_time = timestamp_us
+            snapshot.msg_type = msg_type
+            snapshot.length = length
+            snapshot.data = data
+            snapshot.decoder = decoder
+            snapshot.signal_values = signal_values
+            snapshot.count += 1
+            self._dirty.add(snapshot)
+
+    def replace_many(self, snapshots):
+        # Merge snapshots built elsewhere (decoder processes) with their counts and cycle statistics
+        with self._lock:
+            for snapshot in snapshots:
+                snapshots_by_id = self._channels.get(snapshot.channel)
+                if snapshots_by_id is None:
+                    snapshots_by_id = self._channels[snapshot.channel] = {}
+                self._dirty.discard(snapshots_by_id.get(snapshot.can_id))  # The replaced snapshot is gone
+                snapshots_by_id[snapshot.can_id] = snapshot
+                self._dirty.add(snapshot)
+
+    def take_changed(self):
+        # Copies of every snapshot that changed since the previous call
+        with self._lock:
+            if not self._dirty:
+                return []
+            changed = [snapshot.copy() for snapshot in self._dirty]
+            self._dirty = set()
+        return changed
+
+    def snapshots(self):
+        # Copies of every snapshot, changed or not
+        with self._lock:
+            return [snapshot.copy() for snapshots in self._channels.values() for snapshot in snapshots.values()]
+
+    def get(self, can_id, channel=0):
+        with self._lock:
+            snapshot = self._channels.get(channel, {}).get(can_id)
+            return snapshot.copy() if snapshot else None
+
+    def pending(self):
+        # IDs waiting for the next take_changed()
+        return len(self._dirty)
+
+    def __len__(self):
+        return sum(len(snapshots) for snapshots in list(self._channels.values()))
+
+    def clear(self):
+        with self._lock:
+            self._channels.clear()
+            self._dirty = set()
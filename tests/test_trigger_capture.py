@@ -0,0 +1,70 @@
+import pytest
+
+cantools = pytest.importorskip("cantools")
+pytest.importorskip("PCANBasic")  # PEAK's wrapper or python-can's copy of it, see conftest.py
+
+from PCANBasic import *
+from bus_backend import VirtualBus
+from id_filter import IdFilter
+from monitor_engine import MonitorEngine
+from trigger_capture import TriggerSet
+
+
+# Trigger conditions on a signal with a value table: decoding returns NamedSignalValue for the named raw
+# values, numeric thresholds compare the raw value and name thresholds the value table name.
+# Error triggers on a channel with an ID filter: error frames carry an error code as ID and bypass it.
+
+DBC = """VERSION ""
+BS_:
+BU_: ECU
+BO_ 256 Gearbox: 8 ECU
+ SG_ Gear : 0|4@1+ (1,0) [0|15] "" ECU
+VAL_ 256 Gear 0 "N" 1 "D1" 2 "D2" 15 "R" ;
+"""
+
+
+def gear_frame(db, gear):
+    return db.get_message_by_name("Gearbox").encode({"Gear": gear})
+
+
+def test_numeric_condition_on_named_values():
+    db = cantools.database.load_string(DBC, "dbc")
+    triggers = TriggerSet(["Gear>=2"], db)
+    assert triggers.check(0x100, gear_frame(db, 1)) is None
+    assert triggers.check(0x100, gear_frame(db, 2)) == "Gear>=2"  # Named raw value "D2"
+    assert triggers.check(0x100, gear_frame(db, 15)) is None  # Still true, no new edge
+    assert triggers.check(0x100, gear_frame(db, 0)) is None
+    assert triggers.check(0x100, gear_frame(db, 7)) == "Gear>=2"  # Raw value without a name
+
+
+def test_named_condition():
+    db = cantools.database.load_string(DBC, "dbc")
+    triggers = TriggerSet(["Gear==R"], db)
+    assert triggers.check(0x100, gear_frame(db, 2)) is None
+    assert triggers.check(0x100, gear_frame(db, 15)) == "Gear==R"
+
+
+@pytest.mark.parametrize("filter_spec", [None, "0x100-0x10F"])
+def test_error_trigger_with_id_filter(tmp_path, filter_spec):
+    db = cantools.database.load_string(DBC, "dbc")
+    bus = VirtualBus(rate=0)
+    (_, source), (_, target) = bus.get_available_channels()[:2]
+    engine = MonitorEngine(db, bus)
+    try:
+        engine.initialize(target, PCAN_BAUD_500K)
+        if filter_spec:
+            engine.set_id_filter(IdFilter.parse([filter_spec]))
+        trigger = engine.start_trigger_capture(str(tmp_path / "events.cancap"), ["error"], pre_seconds=0,
+                                               post_seconds=0)
+        state = next(iter(engine.channels.values()))
+        bus.inject(target, 0x04, bytes(4), PCAN_MESSAGE_ERRFRAME.value)
+        bus.inject(target, 0x200, bytes(8))  # Outside the filter
+        for _ in range(2):
+            status, msg, timestamp = bus.Read(target)
+            assert status == PCAN_ERROR_OK
+            engine.process_message(msg, timestamp, state)
+        assert trigger.fired == 1
+        assert trigger.recorded == (2 if filter_spec is None else 1)
+        assert state.metrics.error_frames == 1
+    finally:
+        engine.close()
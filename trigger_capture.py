@@ -0,0 +1,234 @@
+import ctypes
+import operator
+import re
+import struct
+import threading
+import time
+from PCANBasic import *
+from capture import CaptureRecorder, RECORD_HEADER, DATA_OFFSET
+from decoder_table import DecoderTable
+from id_filter import parse_rule
+
+
+# Trigger-based pre/post capture.
+# Every raw frame goes into a fixed ring of capture records, overwritten continuously while
+# nothing has fired. When a trigger fires, the older half of the ring is protected as the
+# pre-trigger buffer and a writer thread dumps every frame from pre_seconds before to
+# post_seconds after the trigger (hardware timestamps) into its own .cancap file, then re-arms.
+# Triggers that fire during a dump are counted as suppressed.
+#
+# Trigger conditions are compiled once into a per-ID table, so a frame whose ID is not watched
+# costs one dict lookup; watched IDs are decoded with the precompiled DecoderTable and compared
+# with operator functions. Signal conditions fire on the edge where they become true.
+#   id:0x123                    any frame with this ID (a trailing x for extended IDs)
+#   error                       an error frame
+#   EngineSpeed>3000            signal condition, also Message.Signal>=value; ops > >= < <= == !=
+#   Gear==D                     non-numeric values compare against the value table name, numbers against
+#                               the raw value of signals with a value table
+
+_OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+              "==": operator.eq, "!=": operator.ne}
+_CONDITION = re.compile(r"^\s*(?:(\w+)\.)?(\w+)\s*(>=|<=|==|!=|>|<)\s*(\S+)\s*$")
+_TIMESTAMP = struct.Struct("<Q")
+
+_MSG_ERRFRAME = PCAN_MESSAGE_ERRFRAME.value
+
+
+class _Condition:
+    __slots__ = ("text", "index", "compare", "threshold", "active")
+
+    def __init__(self, text, index=None, compare=None, threshold=None):
+        self.text = text
+        self.index = index  # Position in the decoder's value tuple; None: fire on every frame of the ID
+        self.compare = compare
+        self.threshold = threshold
+        self.active = False  # Last result, for edge detection
+
+
+class TriggerSet:
+    def __init__(self, conditions, db):
+        # Raises ValueError for conditions that do not parse or name unknown messages/signals
+        self.conditions = list(conditions)
+        self.table = DecoderTable(db)
+        self.by_id = {}  # CAN ID -> (decoder entry, [_Condition])
+        self.on_error = False
+        for text in self.conditions:
+            self._compile(text, db)
+
+    def _compile(self, text, db):
+        stripped = text.strip()
+        if stripped.lower() == "error":
+            self.on_error = True
+            return
+        if stripped.lower().startswith("id:"):
+            rule = parse_rule(stripped[3:])
+            if rule.mask is not None or rule.low != rule.high:
+                raise ValueError(f"ID trigger needs a single ID: {text}")
+            self._watch(rule.low, _Condition(text))
+            return
+        match = _CONDITION.match(stripped)
+        if match is None:
+            raise ValueError(f"Invalid trigger condition: {text}")
+        message_name, signal_name, op, value = match.groups()
+        messages = [message for message in db.messages
+                    if (message_name is None or message.name == message_name)
+                    and any(signal.name == signal_name for signal in message.signals)]
+        if not messages:
+            raise ValueError(f"Unknown signal in trigger condition: {text}")
+        if len(messages) > 1:
+            raise ValueError(f"Ambiguous signal in trigger condition, use Message.Signal: {text}")
+        entry = self.table.lookup(messages[0].frame_id)
+        try:
+            threshold = float(value)
+        except ValueError:
+            threshold = value  # Value table name
+        self._watch(entry.frame_id, _Condition(text, entry.signal_names.index(signal_name), _OPERATORS[op], threshold))
+
+    def _watch(self, can_id, condition):
+        entry, conditions = self.by_id.get(can_id, (self.table.lookup(can_id), []))
+        conditions.append(condition)
+        self.by_id[can_id] = (entry, conditions)
+
+    def check(self, can_id, data):
+        # For watched IDs only; returns the text of the condition that fired, or None
+        entry, conditions = self.by_id[can_id]
+        values = None
+        fired = None
+        for condition in conditions:
+            if condition.index is None:
+                fired = fired or condition.text
+                continue
+            if values is None:
+                if entry is None:
+                    return fired
+                try:
+                    values = entry.decode(bytes(data))
+                except Exception:
+                    return fired
+            value = values[condition.index]
+            threshold = condition.threshold
+            if isinstance(threshold, str):
+                value = str(value)  # Value table name
+            else:
+                value = getattr(value, "value", value)  # Value table entry: compare the raw value
+            try:
+                active = condition.compare(value, threshold)
+            except TypeError:
+                active = False
+            if active and not condition.active:
+                fired = fired or condition.text
+            condition.active = active
+        return fired
+
+
+class TriggerCapture(CaptureRecorder):
+    def __init__(self, path, triggers, pre_seconds=5.0, post_seconds=5.0, capacity=1 << 18, max_files=0,
+                 flush_interval=0.05, fd=False):
+        # capacity: frames in the ring; half of it is available as pre-trigger history
+        super().__init__(path, capacity=capacity, flush_interval=flush_interval, max_bytes=0, max_files=max_files,
+                         fd=fd)
+        self.triggers = triggers
+        self.pre_us = int(pre_seconds * 1_000_000)
+        self.post_us = int(post_seconds * 1_000_000)
+        self.pre_records = capacity // 2
+        self.on_trigger = None  # on_trigger(reason, timestamp_us), called from the receive thread
+        self._capturing = False
+        self._event = None  # (ring position of the trigger frame, its timestamp, reason)
+        self._deadline = 0.0  # Wall-clock end of a dump when the bus goes quiet
+
+        self.fired = 0
+        self.suppressed = 0
+        self.events = []  # (file, reason, trigger timestamp_us)
+
+    def start(self):
+        # Files are only opened when a trigger fires
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, timestamp_us, can_id, msg_type, dlc, data, channel=0):
+        head = self._head
+        if self._capturing and head - self._tail >= self.capacity:
+            self.dropped += 1  # The writer fell behind during a dump
+            return
+        offset = (head % self.capacity) * self.record_size
+        data_size = self.data_size
+        if len(data) >= data_size:
+            RECORD_HEADER.pack_into(self._buffer, offset, timestamp_us, can_id, msg_type, dlc, channel)
+            ctypes.memmove(self._address + offset + DATA_OFFSET, data, data_size)
+        else:
+            self.record_format.pack_into(self._buffer, offset, timestamp_us, can_id, msg_type, dlc, channel,
+                                         bytes(data))
+        self._head = head + 1
+        self.recorded += 1
+
+        triggers = self.triggers
+        if can_id in triggers.by_id:
+            reason = triggers.check(can_id, data)
+        elif msg_type & _MSG_ERRFRAME and triggers.on_error:
+            reason = "error"
+        else:
+            return
+        if reason is None:
+            return
+        if self._capturing:
+            self.suppressed += 1
+            return
+        # Protect the pre-trigger half of the ring before the writer wakes up
+        self._tail = max(0, head + 1 - self.pre_records)
+        self._event = (head, timestamp_us, reason)
+        self._capturing = True
+        self.fired += 1
+        self._wakeup.set()
+        if self.on_trigger is not None:
+            self.on_trigger(reason, timestamp_us)
+
+    def _timestamp(self, position):
+        return _TIMESTAMP.unpack_from(self._buffer, (position % self.capacity) * self.record_size)[0]
+
+    def _flush(self):
+        event = self._event
+        if event is None:
+            return
+        trigger_position, trigger_us, reason = event
+        if self._file is None:
+            # New dump: walk back to the first frame inside the pre-trigger window
+            start = trigger_position
+            while start > self._tail and self._timestamp(start - 1) >= trigger_us - self.pre_us:
+                start -= 1
+            self._tail = start
+            self._open_next_file()
+            self.events.append((self.files[-1], reason, trigger_us))
+            self._deadline = time.monotonic() + self.post_us / 1_000_000 + 1.0
+
+        end_us = trigger_us + self.post_us
+        head = self._head
+        tail = self._tail
+        record_size = self.record_size
+        done = False
+        view = memoryview(self._buffer)
+        while tail < head:
+            # Contiguous run up to the end of the ring or the end of the post-trigger window
+            start = tail % self.capacity
+            stop = tail + min(head - tail, self.capacity - start)
+            end = tail
+            while end < stop and (end <= trigger_position or self._timestamp(end) <= end_us):
+                end += 1
+            chunk = view[start * record_size:(start + end - tail) * record_size]
+            self._file.write(chunk)
+            self._file_bytes += len(chunk)
+            self.bytes_written += len(chunk)
+            tail = end
+            self._tail = tail
+            if end < stop:
+                done = True
+                break
+        view.release()
+        if done or time.monotonic() > self._deadline or not self._running:
+            self._close_file()
+            self._event = None
+            self._capturing = False  # Re-armed: the ring is overwritten freely again
+        elif self._file:
+            self._file.flush()
@@ -0,0 +1,242 @@
+import heapq
+import itertools
+import math
+import platform
+import threading
+import time
+from PCANBasic import PCAN_ERROR_OK
+
+
+# Single-thread cyclic transmit scheduler.
+# All cyclic messages share one thread and one heap of absolute deadlines on
+# time.perf_counter_ns(), so periods do not drift with the time spent sending. The thread
+# sleeps until shortly before the next deadline and spins for the rest, then sends every
+# frame due in the same slot as one burst.
+
+CATCH_UP_SKIP = "skip"  # Drop missed slots and stay on the original phase
+CATCH_UP_BURST = "burst"  # Send every missed slot immediately
+CATCH_UP_RESYNC = "resync"  # Restart the period from the actual send time
+CATCH_UP_POLICIES = (CATCH_UP_SKIP, CATCH_UP_BURST, CATCH_UP_RESYNC)
+
+
+class CyclicJob:
+    __slots__ = ("key", "msg", "period_ns", "due_ns", "active", "sent", "missed",
+                 "last_sent_ns", "period_min", "period_max", "period_mean", "period_m2", "period_samples",
+                 "late_max", "late_total")
+
+    def __init__(self, key, msg, period_ns, due_ns):
+        self.key = key
+        self.msg = msg
+        self.period_ns = period_ns
+        self.due_ns = due_ns
+        self.active = True
+        self.sent = 0
+        self.missed = 0
+        self.last_sent_ns = None
+        # Achieved period (Welford online mean/variance) in nanoseconds
+        self.period_min = 0
+        self.period_max = 0
+        self.period_mean = 0.0
+        self.period_m2 = 0.0
+        self.period_samples = 0
+        # Lateness of the actual send against the deadline in nanoseconds
+        self.late_max = 0
+        self.late_total = 0
+
+    def record(self, sent_ns):
+        late = sent_ns - self.due_ns
+        if late > self.late_max:
+            self.late_max = late
+        self.late_total += late
+
+        if self.last_sent_ns is not None:
+            period = sent_ns - self.last_sent_ns
+            if not self.period_samples or period < self.period_min:
+                self.period_min = period
+            if period > self.period_max:
+                self.period_max = period
+            self.period_samples += 1
+            delta = period - self.period_mean
+            self.period_mean += delta / self.period_samples
+            self.period_m2 += delta * (period - self.period_mean)
+        self.last_sent_ns = sent_ns
+        self.sent += 1
+
+    def stats(self):
+        # Values in milliseconds; jitter is the standard deviation of the achieved period
+        samples = self.period_samples
+        return {
+            "period_ms": self.period_ns / 1e6,
+            "sent": self.sent,
+            "missed": self.missed,
+            "period_mean_ms": self.period_mean / 1e6,
+            "period_min_ms": self.period_min / 1e6,
+            "period_max_ms": self.period_max / 1e6,
+            "jitter_ms": math.sqrt(self.period_m2 / samples) / 1e6 if samples else 0.0,
+            "late_mean_ms": self.late_total / self.sent / 1e6 if self.sent else 0.0,
+            "late_max_ms": self.late_max / 1e6,
+        }
+
+
+class TransmitScheduler:
+    SPIN_NS = 500_000  # Busy-wait the last 500 us before a deadline
+    SLOT_NS = 100_000  # Frames due within 100 us of each other go out in the same burst
+
+    def __init__(self, write, catch_up=CATCH_UP_SKIP, on_error=None):
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch-up policy: {catch_up}")
+        self.write = write  # write(msg) -> TPCANStatus
+        self.catch_up = catch_up
+        self.on_error = on_error  # on_error(key, status), called from the scheduler thread
+        self._jobs = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    # -------------------------------------------------- Control ----------------------------------------------------- #
+    def add(self, key, msg, period_ms):
+        if period_ms <= 0:
+            raise ValueError("Interval must be a positive integer")
+        with self._condition:
+            old_job = self._jobs.get(key)
+            if old_job:
+                old_job.active = False
+            job = CyclicJob(key, msg, int(period_ms * 1_000_000), time.perf_counter_ns())
+            self._jobs[key] = job
+            heapq.heappush(self._heap, (job.due_ns, next(self._sequence), job))
+            self._condition.notify()
+        self.start()
+
+    def remove(self, key):
+        with self._condition:
+            job = self._jobs.pop(key, None)
+            if job:
+                job.active = False
+                self._condition.notify()
+
+    def update_message(self, key, msg):
+        # Swap the frame of a running job; the new frame goes out at the next deadline and
+        # the job keeps its phase and statistics
+        with self._condition:
+            job = self._jobs.get(key)
+            if job is None:
+                return False
+            job.msg = msg
+            return True
+
+    def get_job(self, key):
+        return self._jobs.get(key)
+
+    def stats(self, key):
+        job = self._jobs.get(key)
+        return job.stats() if job else None
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+    # ---------------------------------------------------------------------------------------------------------------- #
+
+    def _run(self):
+        timer_resolution = HighResolutionTimer()
+        try:
+            while True:
+                with self._condition:
+                    # Drop removed jobs from the top of the heap
+                    while self._heap and not self._heap[0][2].active:
+                        heapq.heappop(self._heap)
+                    if not self._running:
+                        return
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    due_ns = self._heap[0][0]
+                    remaining = due_ns - time.perf_counter_ns()
+                    if remaining > self.SPIN_NS:
+                        # Coarse sleep; add/remove/stop wake the thread early
+                        self._condition.wait((remaining - self.SPIN_NS) / 1e9)
+                        continue
+
+                # Spin for the last stretch to hit the deadline precisely
+                while time.perf_counter_ns() < due_ns:
+                    pass
+                self._send_due()
+        finally:
+            timer_resolution.release()
+
+    def _send_due(self):
+        now = time.perf_counter_ns()
+        slot_end = now + self.SLOT_NS
+        burst = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= slot_end:
+                _, _, job = heapq.heappop(self._heap)
+                if job.active:
+                    burst.append(job)
+
+        # Send the whole slot back to back
+        failed = []
+        for job in burst:
+            status = self.write(job.msg)
+            if status != PCAN_ERROR_OK:
+                failed.append((job, status))
+                continue
+            job.record(time.perf_counter_ns())
+
+        now = time.perf_counter_ns()
+        with self._condition:
+            # A failed job stops, like a failed Write stopped the old per-message thread
+            for job, status in failed:
+                job.active = False
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+            for job in burst:
+                if not job.active:
+                    continue
+                job.due_ns = self._next_due(job, now)
+                heapq.heappush(self._heap, (job.due_ns, next(self._sequence), job))
+
+        if self.on_error:
+            for job, status in failed:
+                self.on_error(job.key, status)
+
+    def _next_due(self, job, now):
+        due = job.due_ns + job.period_ns
+        if due > now:
+            return due
+        if self.catch_up == CATCH_UP_BURST:
+            # Missed slots are sent on the following passes, each one as soon as possible
+            return due
+        missed = (now - due) // job.period_ns + 1
+        job.missed += missed
+        if self.catch_up == CATCH_UP_SKIP:
+            return due + missed * job.period_ns
+        return now + job.period_ns
+
+
+class HighResolutionTimer:
+    # Raise the Windows timer resolution to 1 ms while the scheduler thread runs
+    def __init__(self):
+        self._winmm = None
+        if platform.system() == "Windows":
+            import ctypes
+            self._winmm = ctypes.windll.winmm
+            self._winmm.timeBeginPeriod(1)
+
+    def release(self):
+        if self._winmm:
+            self._winmm.timeEndPeriod(1)
+            self._winmm = None
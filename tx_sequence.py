@@ -0,0 +1,426 @@
+import bisect
+import ctypes
+import os
+import threading
+import time
+from array import array
+from PCANBasic import *
+import cantools
+from canfd import FD_DLC, FD_LENGTHS
+from tx_scheduler import HighResolutionTimer
+
+
+# Scripted transmit sequences.
+# A script is compiled once into a TransmitSequence: every frame is encoded up front into a
+# TPCANMsg / TPCANMsgFD (identical frames share one object), and the steps are two flat arrays,
+# the send time in nanoseconds from the start of the pass and the message to send. Repeat
+# blocks and ramps are expanded at compile time, so nothing is encoded or parsed while sending.
+# SequencePlayer sends a sequence from its own thread: it sleeps until shortly before a step is
+# due, spins for the rest and then hands every step due within the same 100 us slot to the
+# backend's WriteMany in one batch. Bursts therefore go out as fast as the driver takes them; a
+# full transmit queue is retried after a short pause and counted, which is what buffer-limit and
+# full-load tests look at.
+#
+# Script syntax, one step per line, "#" starts a comment (except in front of a raw payload):
+#   [TIME] send ID PAYLOAD                      one frame
+#   [TIME] burst COUNT ID PAYLOAD               COUNT copies back to back
+#   [TIME] ramp ID SIGNAL FROM TO STEP EVERY_MS [SIGNAL=VALUE,...]
+#                                               one frame per value FROM, FROM+STEP, ... up to TO, EVERY_MS apart
+#   [TIME] wait MS                              move the time on by MS
+#   repeat COUNT ... end                        repeat the enclosed steps COUNT times; blocks nest
+# TIME is "+MS" after the previous step (the default is +0) or "@MS" from the start of the script or
+#   of the current repeat pass; MS may have decimals, time never runs backwards
+# PAYLOAD is "SIGNAL=VALUE,..." encoded with the DBC, signals left out at their initial value (or 0),
+#   or "#HEX" raw bytes like "#0210030000000000"
+# ID is hex, a trailing "x" marks extended IDs (0x18DA10F1x); IDs above 0x7FF are extended anyway
+#   @0     send 0x100 EngineSpeed=800,Gear=1
+#   +100   ramp 0x100 EngineSpeed 800 6000 100 10 Gear=3
+#   repeat 500
+#   +1     burst 8 0x7E0 #0102030405060708
+#   end
+
+SEQUENCE_FILETYPES = [("Transmit sequence", "*.txt *.seq"), ("All files", "*.*")]
+MAX_STEPS = 1_000_000  # Compiled steps per sequence, about 16 MB of step arrays
+
+_MSG_STANDARD = PCAN_MESSAGE_STANDARD.value
+_MSG_EXTENDED = PCAN_MESSAGE_EXTENDED.value
+_MSG_FD = PCAN_MESSAGE_FD.value
+_MSG_BRS = PCAN_MESSAGE_BRS.value
+
+
+class TransmitSequence:
+    def __init__(self, name, offsets, messages, duration_ns):
+        self.name = name
+        self.offsets = offsets  # array("q"): send time of each step in ns from the start of a pass, never decreasing
+        self.messages = messages  # TPCANMsg / TPCANMsgFD of each step
+        self.duration_ns = duration_ns  # Length of one pass; the next pass starts this long after the previous one
+        self.frames = len({id(msg) for msg in messages})  # Distinct frames
+
+    def __len__(self):
+        return len(self.messages)
+
+
+class _Compiler:
+    def __init__(self, db, fd):
+        self.db = db
+        self.fd = fd  # Build TPCANMsgFD for a CAN FD channel
+        self.offsets = array("q")
+        self.messages = []
+        self._frames = {}  # (ID, extended, payload) -> shared message
+        self._parsed = {}  # (ID text, payload text) -> message, so repeat passes do not encode again
+
+    def compile(self, lines, name):
+        root = []  # [(line number, tokens)] and ("repeat", count, body, line number) blocks
+        stack = [root]
+        opened = []  # Line numbers of the open repeat blocks
+        for number, line in enumerate(lines, 1):
+            tokens = _tokens(line)
+            if not tokens:
+                continue
+            keyword = tokens[0].lower()
+            if keyword == "repeat":
+                count = self._integer(tokens, 1, number)
+                block = ("repeat", count, [], number)
+                stack[-1].append(block)
+                stack.append(block[2])
+                opened.append(number)
+            elif keyword == "end":
+                if len(stack) == 1:
+                    raise ValueError(f"Line {number}: end without repeat")
+                stack.pop()
+                opened.pop()
+            else:
+                stack[-1].append((number, tokens))
+        if len(stack) > 1:
+            raise ValueError(f"Line {opened[-1]}: repeat without end")
+        duration_ns = self._block(root, 0)
+        return TransmitSequence(name, self.offsets, self.messages, duration_ns)
+
+    def _block(self, steps, start_ns):
+        # Emits the steps of one pass starting at start_ns -> time at the end of the pass
+        cursor = start_ns
+        for step in steps:
+            if step[0] == "repeat":
+                _, count, body, number = step
+                for n in range(count):
+                    steps_before = len(self.messages)
+                    pass_start = cursor
+                    cursor = self._block(body, cursor)
+                    if len(self.messages) == steps_before:
+                        cursor += (count - n - 1) * (cursor - pass_start)  # Only waits: skip the remaining passes
+                        break
+                continue
+            number, tokens = step
+            if tokens[0][:1] in ("+", "@"):
+                milliseconds = self._milliseconds(tokens[0][1:], number)
+                target = cursor + milliseconds if tokens[0][0] == "+" else start_ns + milliseconds
+                if target < cursor:
+                    raise ValueError(f"Line {number}: time runs backwards")
+                cursor = target
+                tokens = tokens[1:]
+            if not tokens:
+                raise ValueError(f"Line {number}: missing command")
+            cursor = self._command(tokens[0].lower(), tokens[1:], cursor, number)
+        return cursor
+
+    def _command(self, keyword, arguments, cursor, number):
+        # -> cursor after the command
+        if keyword == "send" and len(arguments) == 2:
+            self._emit(cursor, self._frame(arguments[0], arguments[1], number), number)
+        elif keyword == "burst" and len(arguments) == 3:
+            msg = self._frame(arguments[1], arguments[2], number)
+            for _ in range(self._integer(arguments, 0, number)):
+                self._emit(cursor, msg, number)
+        elif keyword == "ramp" and len(arguments) in (6, 7):
+            can_id, extended, message = self._message(arguments[0], number)
+            signal_name = arguments[1]
+            low, high, step = (self._number(text, number) for text in arguments[2:5])
+            period_ns = self._milliseconds(arguments[5], number)
+            if step == 0 or (high - low) / step < 0:
+                raise ValueError(f"Line {number}: ramp step must lead from {low:g} to {high:g}")
+            values = self._signal_values(message, arguments[6] if len(arguments) == 7 else "", number)
+            if signal_name not in values:
+                raise ValueError(f"Line {number}: unknown signal {signal_name} in {message.name}")
+            for n in range(int((high - low) / step + 1e-9) + 1):
+                values[signal_name] = low + n * step
+                self._emit(cursor, self._build(can_id, extended, self._encode(message, values, number), message, number),
+                           number)
+                cursor += period_ns
+            cursor -= period_ns  # The next step is timed from the last frame of the ramp
+        elif keyword == "wait" and len(arguments) == 1:
+            cursor += self._milliseconds(arguments[0], number)
+        else:
+            raise ValueError(f"Line {number}: invalid step: {' '.join([keyword] + arguments)}")
+        return cursor
+
+    def _emit(self, offset_ns, msg, number):
+        if len(self.messages) >= MAX_STEPS:
+            raise ValueError(f"Line {number}: more than {MAX_STEPS} steps, repeat the whole sequence instead")
+        self.offsets.append(offset_ns)
+        self.messages.append(msg)
+
+    def _frame(self, id_text, payload, number):
+        # "ID" and "SIGNAL=VALUE,..." or "#HEX" -> shared message
+        msg = self._parsed.get((id_text, payload))
+        if msg is None:
+            msg = self._parsed[id_text, payload] = self._parse_frame(id_text, payload, number)
+        return msg
+
+    def _parse_frame(self, id_text, payload, number):
+        if payload.startswith("#"):
+            can_id, extended = _parse_id(id_text, number)
+            try:
+                data = bytes.fromhex(payload[1:])
+            except ValueError:
+                raise ValueError(f"Line {number}: invalid payload {payload}")
+            return self._build(can_id, extended, data, None, number)
+        can_id, extended, message = self._message(id_text, number)
+        values = self._signal_values(message, payload, number)
+        return self._build(can_id, extended, self._encode(message, values, number), message, number)
+
+    def _message(self, id_text, number):
+        can_id, extended = _parse_id(id_text, number)
+        try:
+            message = self.db.get_message_by_frame_id(can_id)
+        except KeyError:
+            raise ValueError(f"Line {number}: ID {can_id:#x} is not in the DBC")
+        return can_id, extended or message.is_extended_frame, message
+
+    def _signal_values(self, message, text, number):
+        values = {signal.name: signal.initial if signal.initial is not None else 0 for signal in message.signals}
+        for item in text.split(","):
+            if not item:
+                continue
+            name, sep, value = item.partition("=")
+            if not sep or name not in values:
+                raise ValueError(f"Line {number}: unknown signal {item} in {message.name}")
+            try:
+                values[name] = float(value)
+            except ValueError:
+                values[name] = value  # Value table name
+        return values
+
+    def _encode(self, message, values, number):
+        try:
+            return message.encode(values)
+        except (cantools.Error, ValueError, KeyError) as e:
+            raise ValueError(f"Line {number}: cannot encode {message.name}: {e}")
+
+    def _build(self, can_id, extended, data, message, number):
+        key = (can_id, extended, data)
+        msg = self._frames.get(key)
+        if msg is not None:
+            return msg
+        fd_frame = len(data) > 8 or (message is not None and message.is_fd)
+        msg_type = _MSG_EXTENDED if extended else _MSG_STANDARD
+        if self.fd:
+            # Like MonitorEngine.build_tx_message: FD frames go out with bit rate switch
+            msg = TPCANMsgFD()
+            if fd_frame:
+                msg_type |= _MSG_FD | _MSG_BRS
+                data = data + bytes(FD_LENGTHS[FD_DLC[len(data)]] - len(data))  # FD lengths come in steps
+            msg.DLC = FD_DLC[len(data)]
+        else:
+            if fd_frame:
+                raise ValueError(f"Line {number}: {len(data)} bytes to {can_id:#x} need a CAN FD channel")
+            msg = TPCANMsg()
+            msg.LEN = len(data)
+        msg.ID = can_id
+        msg.MSGTYPE = msg_type
+        ctypes.memmove(msg.DATA, data, len(data))
+        self._frames[key] = msg
+        return msg
+
+    @staticmethod
+    def _integer(tokens, index, number):
+        try:
+            value = int(tokens[index], 0)
+        except (IndexError, ValueError):
+            raise ValueError(f"Line {number}: expected a count")
+        if value < 0:
+            raise ValueError(f"Line {number}: count must not be negative")
+        return value
+
+    @staticmethod
+    def _number(text, number):
+        try:
+            return float(text)
+        except ValueError:
+            raise ValueError(f"Line {number}: expected a number, got {text}")
+
+    @classmethod
+    def _milliseconds(cls, text, number):
+        milliseconds = cls._number(text, number)
+        if milliseconds < 0:
+            raise ValueError(f"Line {number}: time must not be negative")
+        return int(round(milliseconds * 1_000_000))
+
+
+def _parse_id(text, number):
+    extended = text[-1:] in ("x", "X")
+    try:
+        can_id = int(text[:-1] if extended else text, 16)
+    except ValueError:
+        raise ValueError(f"Line {number}: invalid ID {text}")
+    if not 0 <= can_id <= 0x1FFFFFFF:
+        raise ValueError(f"Line {number}: ID out of range: {text}")
+    return can_id, extended or can_id > 0x7FF
+
+
+def _tokens(line):
+    # Words up to the comment; a "#" word is a raw payload when hex follows it directly
+    tokens = []
+    for part in line.split():
+        if part.startswith("#") and (not tokens or not _is_hex(part[1:]) or not part[1:]):
+            break
+        tokens.append(part)
+    return tokens
+
+
+def _is_hex(text):
+    try:
+        bytes.fromhex(text)
+    except ValueError:
+        return False
+    return True
+
+
+def compile_sequence(text, db, fd=False, name="sequence"):
+    # Script text -> TransmitSequence; raises ValueError with the line number of the first bad step
+    return _Compiler(db, fd).compile(text.splitlines(), name)
+
+
+def load_sequence(path, db, fd=False):
+    with open(path, "r") as file:
+        return compile_sequence(file.read(), db, fd, os.path.basename(path))
+
+
+class SequencePlayer:
+    SPIN_NS = 500_000  # Busy-wait the last 500 us before a step is due
+    SLOT_NS = 100_000  # Steps due within 100 us of each other go out in one WriteMany call
+    MAX_BATCH = 256
+    TX_FULL_WAIT_NS = 50_000  # Retry after 50 us when the driver's transmit queue is full
+
+    def __init__(self, write_many, sequence, repeat=1, on_done=None):
+        # repeat: passes over the sequence, 0 = until stopped
+        if repeat < 0:
+            raise ValueError("Repeat count must not be negative")
+        self.write_many = write_many  # write_many(msgs) -> (TPCANStatus, frames written)
+        self.sequence = sequence
+        self.repeat = repeat
+        self.on_done = on_done  # on_done(player), called from the sequence thread
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.sent = 0
+        self.errors = 0  # Frames the driver refused, skipped
+        self.tx_full = 0  # Transmit queue full, retried
+        self.batches = 0
+        self.passes = 0
+        self.late_max_ns = 0
+        self.late_total_ns = 0
+        self.error = None
+        self._start_ns = 0
+        self._end_ns = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._end_ns
+
+    @property
+    def late_mean_ns(self):
+        return self.late_total_ns / self.batches if self.batches else 0
+
+    @property
+    def frames_per_s(self):
+        end_ns = self._end_ns or time.perf_counter_ns()
+        return self.sent * 1e9 / (end_ns - self._start_ns) if self._start_ns and end_ns > self._start_ns else 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def stats(self):
+        return {
+            "name": self.sequence.name,
+            "running": self.running,
+            "passes": self.passes,
+            "sent": self.sent,
+            "errors": self.errors,
+            "tx_full": self.tx_full,
+            "frames_per_s": round(self.frames_per_s, 1),
+            "late_mean_ms": round(self.late_mean_ns / 1e6, 3),
+            "late_max_ms": round(self.late_max_ns / 1e6, 3),
+        }
+
+    def _run(self):
+        timer_resolution = HighResolutionTimer()
+        try:
+            self._play()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._end_ns = time.perf_counter_ns()
+            timer_resolution.release()
+            if self.on_done:
+                self.on_done(self)
+
+    def _play(self):
+        offsets = self.sequence.offsets
+        messages = self.sequence.messages
+        count = len(messages)
+        duration_ns = self.sequence.duration_ns
+        write_many = self.write_many
+        stop = self._stop
+        perf_counter_ns = time.perf_counter_ns
+        spin_ns = self.SPIN_NS
+        slot_ns = self.SLOT_NS
+        max_batch = self.MAX_BATCH
+        if not count:
+            return
+
+        self._start_ns = pass_start = perf_counter_ns()
+        while not self.repeat or self.passes < self.repeat:
+            index = 0
+            while index < count:
+                due_ns = pass_start + offsets[index]
+                remaining = due_ns - perf_counter_ns()
+                if remaining > spin_ns and stop.wait((remaining - spin_ns) / 1e9):
+                    return
+                while perf_counter_ns() < due_ns:
+                    pass
+                if stop.is_set():
+                    return
+
+                # Every step due in this slot, in one call
+                now = perf_counter_ns()
+                end = bisect.bisect_right(offsets, now + slot_ns - pass_start, index + 1, min(count, index + max_batch))
+                late_ns = now - due_ns
+                self.batches += 1
+                self.late_total_ns += late_ns
+                if late_ns > self.late_max_ns:
+                    self.late_max_ns = late_ns
+                while index < end:
+                    status, written = write_many(messages[index:end])
+                    index += written
+                    self.sent += written
+                    if status == PCAN_ERROR_OK:
+                        break
+                    if status == PCAN_ERROR_QXMTFULL:
+                        self.tx_full += 1
+                        retry_ns = perf_counter_ns() + self.TX_FULL_WAIT_NS
+                        while perf_counter_ns() < retry_ns:
+                            pass
+                        if stop.is_set():
+                            return
+                    else:
+                        self.errors += 1
+                        index += 1  # Skip the refused frame
+            self.passes += 1
+            # The next pass keeps the timing grid; a pass without a length starts right away
+            pass_start = pass_start + duration_ns if duration_ns else perf_counter_ns()